@@ -1,18 +1,64 @@
-from flask import Flask, request, send_file, jsonify, url_for
+from flask import Flask, Request, Response, redirect, request, send_from_directory, stream_with_context, jsonify, url_for
 import os
-from werkzeug.utils import secure_filename
+import uuid
+from werkzeug.utils import safe_join, secure_filename
 import datetime
+import json
+import queue
+import threading
+import time
 
-# Import the analyze_video function from main.py
-from main import analyze_video
+# Import the analysis settings from main.py
+from batch import batch_summary
+from main import analysis_params, reanalyze, BATCH_SIZE, OUTPUT_MODE, OUTPUT_MODES
+from metrics import metrics
+from models import MODEL_WEIGHTS, registry as model_registry
+from parallel import analyze_video_parallel
+from live import LiveAnalysis, display_source, is_stream_url
+from jobs import JobStore, JobQueue, QUEUED, RUNNING, DONE, FAILED
+from result_cache import ResultCache, cache_key
+from shots import ShotStore, parse_timestamp
+from track_store import track_path_for, TRACK_FILE_SUFFIX, TRACK_STORE
+from uploads import HashingWriter, ResumableUploads, UploadRejected, probe_video, BATCH_MAX_VIDEOS, BATCH_UPLOAD_MAX_BYTES, UPLOAD_MAX_BYTES
+from video_output import progressive_output
 
 UPLOAD_FOLDER = 'uploads'
 OUTPUT_FOLDER = 'outputs'
 ALLOWED_EXTENSIONS = {'mp4', 'avi', 'mov', 'mkv'}
+JOBS_DB = os.environ.get('JOBS_DB', 'jobs.db')
+SHOTS_DB = os.environ.get('SHOTS_DB', 'shots.db')
+# Number of videos analysed at once by each app process
+ANALYSIS_CONCURRENCY = int(os.environ.get('ANALYSIS_CONCURRENCY', 1))
+RESULT_CACHE_DIR = os.environ.get('RESULT_CACHE_DIR', os.path.join('cache', 'results'))
+RESULT_CACHE_MAX_BYTES = int(os.environ.get('RESULT_CACHE_MAX_BYTES', 5 * 1024 ** 3))  # Includes the cached processed videos
+# Load the models in the gunicorn master before forking (see gunicorn.conf.py) instead of lazily per worker
+PRELOAD_MODELS = os.environ.get('PRELOAD_MODELS', '0') == '1'
+WARMUP_ON_START = os.environ.get('WARMUP_ON_START', '1') == '1'
+STREAM_CHUNK_SIZE = 64 * 1024  # Bytes sent per chunk when streaming a video that is still being written
+STREAM_POLL_SECONDS = 0.5  # How often a live stream checks for newly written bytes
+VIDEO_MAX_AGE = 3600  # Cache-Control max-age for processed videos; they never change once written
+LIVE_MAX_STREAMS = int(os.environ.get('LIVE_MAX_STREAMS', 2))  # Live sources analysed at once by each app process
+LIVE_RETAIN_SECONDS = 600  # Ended live streams stay queryable this long
+LIVE_HEARTBEAT_SECONDS = 15  # Keep-alive comment interval on idle event streams
+
+class UploadRequest(Request):
+    """Writes uploaded file parts straight to UPLOAD_FOLDER through a HashingWriter instead of Werkzeug's spooled temp files."""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.upload_writers = []
+
+    def _get_file_stream(self, total_content_length, content_type, filename=None, content_length=None):
+        writer = HashingWriter(os.path.join(UPLOAD_FOLDER, f"incoming_{uuid.uuid4().hex}.part"))
+        self.upload_writers.append(writer)
+        return writer
 
 app = Flask(__name__)
+app.request_class = UploadRequest
 app.config['UPLOAD_FOLDER'] = UPLOAD_FOLDER
 app.config['OUTPUT_FOLDER'] = OUTPUT_FOLDER
+MULTIPART_OVERHEAD_BYTES = 1024 * 1024  # Room for the multipart framing around the uploaded files
+app.config['MAX_CONTENT_LENGTH'] = UPLOAD_MAX_BYTES + MULTIPART_OVERHEAD_BYTES  # Refused up front from Content-Length
 
 # Ensure the upload and output directories exist
 os.makedirs(UPLOAD_FOLDER, exist_ok=True)
@@ -21,9 +67,165 @@ os.makedirs(OUTPUT_FOLDER, exist_ok=True)
 def allowed_file(filename):
     return '.' in filename and filename.rsplit('.', 1)[1].lower() in ALLOWED_EXTENSIONS
 
+def upload_paths(filename):
+    """
+    (input_path, output_filename) for an uploaded `filename`: timestamped for readability and
+    with a random prefix, so uploads of the same name in the same second do not collide.
+    """
+    prefix = f"{datetime.datetime.now().strftime('%Y%m%d%H%M%S')}_{uuid.uuid4().hex}"
+    original_filename = secure_filename(filename)
+    input_path = os.path.join(app.config['UPLOAD_FOLDER'], f"{prefix}_{original_filename}")
+    return input_path, f"{prefix}_processed_{original_filename}"
+
+def output_exists(filename):
+    """Whether `filename` is still in the output folder; the result cache evicts old outputs."""
+    return bool(filename) and os.path.isfile(os.path.join(app.config['OUTPUT_FOLDER'], filename))
+
+def processed_video_url(output_filename):
+    """Download URL for a result's video, or None if the analysis wrote none or it was evicted since."""
+    return url_for('get_processed_video', filename=output_filename, _external=True) if output_exists(output_filename) else None
+
+def reanalyze_url(result):
+    """URL for re-scoring a result from its stored detections, or None if it has no (remaining) track file."""
+    track_filename = result.get('track_filename')
+    return url_for('reanalyze_tracks', filename=track_filename, _external=True) if output_exists(track_filename) else None
+
+def session_tags():
+    """
+    Optional tags for the shot database from the request: `player`, `session` (a free-form
+    label) and `recorded_at` (ISO 8601 or epoch seconds; defaults to when the analysis finishes).
+    Raises ValueError for a malformed recorded_at.
+    """
+    fields = request.get_json(silent=True) or request.form
+    return {
+        'player': fields.get('player') or None,
+        'session_tag': fields.get('session') or None,
+        'recorded_at': parse_timestamp(fields.get('recorded_at')),
+    }
+
+def run_analysis_job(payload, progress, job_id):
+    """Job handler: analyse one uploaded video and return its stats and output filename."""
+    output_path = os.path.join(app.config['OUTPUT_FOLDER'], payload['output_filename'])
+    track_path = track_path_for(output_path) if TRACK_STORE else None  # The detections, for /tracks/<file>/reanalyze
+    # Splits long videos across ANALYSIS_PARALLEL_WORKERS processes; sequential by default
+    analysis_stats = analyze_video_parallel(payload['input_path'], output_path, progress_callback=progress,
+                                            camera_id=payload.get('camera_id'), output_mode=payload.get('output_mode'),
+                                            track_path=track_path)
+    # "stats" mode, and "highlights" without any impacts, produce no video
+    written = analysis_stats['output']['written']
+    if written and not os.path.exists(output_path):
+        raise RuntimeError('Analysis ran, but the output file was not created.')
+    session_id = shot_store.record(analysis_stats, camera_id=payload.get('camera_id'), video=payload.get('video'),
+                                   source_id=f"job:{job_id}", **payload.get('tags', {}))
+    result = {'output_filename': payload['output_filename'] if written else None,
+              'track_filename': os.path.basename(track_path) if track_path else None,
+              'session_id': session_id,
+              'analysis_data': analysis_stats}
+    if payload.get('cache_key'):
+        result_cache.put(payload['cache_key'], result)
+    return result
+
+# --- Shot Database ---
+# Every finished analysis is recorded for the /shots and /sessions queries.
+shot_store = ShotStore(SHOTS_DB)
+
+# --- Result Cache ---
+# Re-uploads of the same clip with the same weights and settings reuse the stored result.
+result_cache = ResultCache(RESULT_CACHE_DIR, OUTPUT_FOLDER, RESULT_CACHE_MAX_BYTES)
+
+# --- Background Analysis Jobs ---
+job_queue = JobQueue(JobStore(JOBS_DB), run_analysis_job, concurrency=ANALYSIS_CONCURRENCY)
+
+def load_models():
+    try:
+        model_registry.load_all()
+    except Exception as e:
+        print(f"Error loading models: {e}")
+
+def start_worker():
+    """
+    Per-process startup: start the analysis job threads and warm the models in the
+    background (or, with WARMUP_ON_START=0, just load them), so the worker answers
+    requests while the models load.
+    Threads do not survive fork, so with --preload this runs from gunicorn's post_fork hook.
+    """
+    job_queue.start()
+    if WARMUP_ON_START and not model_registry.warm:
+        threading.Thread(target=model_registry.warm_up, kwargs={'batch_size': BATCH_SIZE},
+                         name='model-warmup', daemon=True).start()
+    elif not model_registry.loaded:
+        threading.Thread(target=load_models, name='model-load', daemon=True).start()
+
+if PRELOAD_MODELS:
+    model_registry.load_all()  # Runs once in the master; workers share the weights copy-on-write
+else:
+    start_worker()
+
+# --- Uploads ---
+# Chunked uploads that survive dropped connections: POST /uploads, PATCH chunks, then POST .../complete.
+resumable_uploads = ResumableUploads(os.path.join(UPLOAD_FOLDER, 'resumable'))
+
+@app.errorhandler(UploadRejected)
+def upload_rejected(e):
+    metrics.counter('uploads_rejected_total', 'Uploads refused before analysis', status=str(e.status)).inc()
+    return jsonify({'error': str(e)}), e.status
+
+@app.teardown_request
+def discard_unclaimed_uploads(exc):
+    """Deletes file parts of this request that were not moved into place, e.g. after a rejection."""
+    for writer in request.upload_writers:
+        writer.discard()
+
+def queue_analysis(input_path, output_filename, content_digest, video_info, video_name):
+    """Queues an uploaded video for analysis, or returns the cached result; options come from the request form."""
+    # Optional: identifies a fixed camera so its scale calibration can be reused
+    camera_id = request.form.get('camera_id') or None
+    # Optional: "full" annotated video, "highlights" clips around impacts, or "stats" only
+    output_mode = request.form.get('output_mode') or OUTPUT_MODE
+    if output_mode not in OUTPUT_MODES:
+        os.remove(input_path)
+        return jsonify({'error': f"output_mode must be one of {', '.join(OUTPUT_MODES)}"}), 400
+    try:
+        tags = session_tags()
+    except ValueError as e:
+        os.remove(input_path)
+        return jsonify({'error': str(e)}), 400
+
+    key = cache_key(content_digest, MODEL_WEIGHTS, dict(analysis_params(), camera_id=camera_id, output_mode=output_mode))
+    cached = result_cache.get(key)
+    if cached:
+        os.remove(input_path)  # Not needed; the stored result is returned without any inference
+        # A new session: this upload may be another player's, or the same clip under other tags
+        session_id = shot_store.record(cached['analysis_data'], camera_id=camera_id, video=video_name, **tags)
+        response_data = {
+            'message': 'Analysis complete',
+            'cached': True,
+            'video': video_info,
+            'processed_video_url': processed_video_url(cached['output_filename']),
+            'reanalyze_url': reanalyze_url(cached),
+            'session_id': session_id,
+            'analysis_data': cached['analysis_data']
+        }
+        return jsonify(response_data), 200
+
+    job_id = job_queue.submit({'input_path': input_path, 'output_filename': output_filename, 'video': video_name,
+                               'camera_id': camera_id, 'output_mode': output_mode, 'cache_key': key, 'tags': tags})
+
+    response_data = {
+        'message': 'Analysis queued',
+        'job_id': job_id,
+        'status': QUEUED,
+        'video': video_info,
+        'status_url': url_for('get_job_status', job_id=job_id, _external=True)
+    }
+    return jsonify(response_data), 202
+
 @app.route('/analyze', methods=['POST'])
 def handle_analysis_request():
-    """Handles the video upload, analysis, and returns stats and video URL."""
+    """
+    Handles the video upload and queues it for analysis; poll the returned job's status URL for results.
+    The upload is hashed as it is written to disk, and refused (413/422) as soon as it breaks a limit.
+    """
     if 'video' not in request.files:
         return jsonify({'error': 'No video file provided'}), 400
     
@@ -35,51 +237,445 @@ def handle_analysis_request():
     if not video.filename or not allowed_file(video.filename):
         return jsonify({'error': 'Unsupported file type'}), 400
     
-    # Create a unique filename to avoid conflicts
-    timestamp = datetime.datetime.now().strftime("%Y%m%d%H%M%S")
-    original_filename = secure_filename(video.filename)
-    input_filename = f"{timestamp}_{original_filename}"
-    output_filename = f"{timestamp}_processed_{original_filename}"
-    
-    input_path = os.path.join(app.config['UPLOAD_FOLDER'], input_filename)
-    output_path = os.path.join(app.config['OUTPUT_FOLDER'], output_filename)
-    
-    video.save(input_path)
-    
+    video_info = probe_video(video.stream.path)
+    input_path, output_filename = upload_paths(video.filename)
+    video.stream.close()
+    os.replace(video.stream.path, input_path)
+    return queue_analysis(input_path, output_filename, video.stream.hexdigest(), video_info, video.filename)
+
+@app.route('/analyze/batch', methods=['POST'])
+def handle_batch_analysis_request():
+    """
+    Queues several uploaded videos (form field `videos`, repeated, at most BATCH_MAX_VIDEOS
+    and BATCH_UPLOAD_MAX_BYTES in all) as one job each, sharing a batch ID. Takes the same
+    options as /analyze. Videos with a cached result are recorded as finished jobs. Poll each
+    job's status URL, or the batch's for every job plus a shot and speed summary so far.
+    """
+    request.max_content_length = BATCH_UPLOAD_MAX_BYTES + MULTIPART_OVERHEAD_BYTES
+    videos = [video for video in request.files.getlist('videos') if video.filename]
+    if not videos:
+        return jsonify({'error': 'No video files provided'}), 400
+    if len(videos) > BATCH_MAX_VIDEOS:
+        return jsonify({'error': f"A batch takes at most {BATCH_MAX_VIDEOS} videos"}), 413
+    unsupported = [video.filename for video in videos if not allowed_file(video.filename)]
+    if unsupported:
+        return jsonify({'error': f"Unsupported file type: {', '.join(unsupported)}"}), 400
+    camera_id = request.form.get('camera_id') or None
+    output_mode = request.form.get('output_mode') or OUTPUT_MODE
+    if output_mode not in OUTPUT_MODES:
+        return jsonify({'error': f"output_mode must be one of {', '.join(OUTPUT_MODES)}"}), 400
     try:
-        # Call the refactored analysis function
-        analysis_stats = analyze_video(input_path, output_path)
-    except Exception as e:
-        # Log the full error for debugging
-        print(f"Error during video processing: {e}")
-        return jsonify({'error': f'Processing failed: {str(e)}'}), 500
-    
-    if not os.path.exists(output_path):
-        return jsonify({'error': 'Analysis ran, but the output file was not created.'}), 500
-        
-    # Generate the full URL for the processed video
-    video_url = url_for('get_processed_video', filename=output_filename, _external=True)
+        tags = session_tags()
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+
+    video_infos = [probe_video(video.stream.path) for video in videos]  # Refuse the whole batch before queuing any of it
+    params = dict(analysis_params(), camera_id=camera_id, output_mode=output_mode)
+    batch_id = uuid.uuid4().hex
+    jobs = []
+    for i, (video, video_info) in enumerate(zip(videos, video_infos)):
+        input_path, output_filename = upload_paths(f"{i}_{video.filename}")
+        video.stream.close()
+        os.replace(video.stream.path, input_path)
+        key = cache_key(video.stream.hexdigest(), MODEL_WEIGHTS, params)
+        payload = {'input_path': input_path, 'output_filename': output_filename, 'video': video.filename,
+                   'camera_id': camera_id, 'output_mode': output_mode, 'cache_key': key, 'tags': tags}
+        cached = result_cache.get(key)
+        if cached:
+            os.remove(input_path)  # Not needed; the job is answered from the stored result
+            session_id = shot_store.record(cached['analysis_data'], camera_id=camera_id, video=video.filename, **tags)
+            job_id = job_queue.store.create(payload, batch_id=batch_id, result=dict(cached, session_id=session_id))
+        else:
+            job_id = job_queue.submit(payload, batch_id=batch_id)
+        jobs.append({'video': video.filename, 'job_id': job_id, 'status': DONE if cached else QUEUED,
+                     'cached': bool(cached), 'video_info': video_info,
+                     'status_url': url_for('get_job_status', job_id=job_id, _external=True)})
 
-    # Combine stats and video URL into a single response
     response_data = {
-        'message': 'Analysis complete',
-        'processed_video_url': video_url,
-        'analysis_data': analysis_stats
+        'message': 'Batch queued',
+        'batch_id': batch_id,
+        'status_url': url_for('get_batch_status', batch_id=batch_id, _external=True),
+        'jobs': jobs
     }
-    
+    return jsonify(response_data), 202
+
+@app.route('/batches/<batch_id>')
+def get_batch_status(batch_id):
+    """Reports the status of every job in a batch and a shot and speed summary of the finished ones."""
+    jobs = job_queue.store.batch(batch_id)
+    if not jobs:
+        return jsonify({'error': 'Unknown batch'}), 404
+    finished = [job for job in jobs if job['status'] in (DONE, FAILED)]
+    complete = len(finished) == len(jobs)
+    results = [{'video': job['payload']['video'], 'status': job['status'], 'error': job['error'],
+                'analysis_data': job['result']['analysis_data'] if job['result'] else None} for job in finished]
+    wall_seconds = max(job['finished_at'] for job in jobs) - min(job['created_at'] for job in jobs) if complete else None
+    response_data = {
+        'batch_id': batch_id,
+        'complete': complete,
+        'counts': {status: sum(job['status'] == status for job in jobs) for status in (QUEUED, RUNNING, DONE, FAILED)},
+        'jobs': [{'video': job['payload']['video'], 'job_id': job['id'], 'status': job['status'],
+                  'status_url': url_for('get_job_status', job_id=job['id'], _external=True)} for job in jobs],
+        'summary': batch_summary(results, wall_seconds)
+    }
+    return jsonify(response_data), 200
+
+# --- Live Streams ---
+# Held in this process's memory, so with several app processes, live clients need sticky routing.
+live_streams = {}
+live_streams_lock = threading.Lock()
+
+@app.route('/live', methods=['POST'])
+def start_live_stream():
+    """
+    Starts analysing a live `source` (an rtsp/rtmp/http(s) stream URL), or, for testing,
+    an uploaded `video` played at real-time pace. Impacts are pushed as they happen to
+    the returned events_url (Server-Sent Events); optional `camera_id` and `max_latency` (seconds).
+    """
+    fields = request.get_json(silent=True) or request.form
+    try:
+        max_latency = float(fields['max_latency']) if fields.get('max_latency') else None
+    except ValueError:
+        return jsonify({'error': 'max_latency must be a number of seconds'}), 400
+    try:
+        tags = session_tags()
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    camera_id = fields.get('camera_id') or None
+    video = request.files.get('video')
+    uploaded = bool(video and video.filename)
+    if uploaded:
+        if not allowed_file(video.filename):
+            return jsonify({'error': 'Unsupported file type'}), 400
+        probe_video(video.stream.path)
+        source, _ = upload_paths(video.filename)
+        video.stream.close()
+        os.replace(video.stream.path, source)
+    else:
+        source = fields.get('source') or ''
+        if not is_stream_url(source):
+            return jsonify({'error': 'Provide a stream URL as `source` or upload a `video`'}), 400
+
+    with live_streams_lock:
+        now = time.time()
+        for stream_id, stream in list(live_streams.items()):
+            if not stream.active and now - stream.ended_at > LIVE_RETAIN_SECONDS:
+                del live_streams[stream_id]
+        if sum(stream.active for stream in live_streams.values()) >= LIVE_MAX_STREAMS:
+            if uploaded:
+                os.remove(source)
+            return jsonify({'error': f"Already analysing {LIVE_MAX_STREAMS} live streams"}), 429
+        # An uploaded video is only a test source; it is deleted when the stream ends
+        stream = LiveAnalysis(source, camera_id=camera_id, max_latency=max_latency, remove_source=uploaded)
+        tags['recorded_at'] = tags['recorded_at'] or stream.started_at
+        stream.on_finish = lambda stats: shot_store.record(stats, camera_id=camera_id, video=display_source(source),
+                                                           source_id=f"live:{stream.id}", **tags)
+        live_streams[stream.id] = stream.start()
+
+    response_data = dict(stream.status(),
+                         status_url=url_for('get_live_stream', stream_id=stream.id, _external=True),
+                         events_url=url_for('live_stream_events', stream_id=stream.id, _external=True))
+    return jsonify(response_data), 202
+
+@app.route('/live/<stream_id>')
+def get_live_stream(stream_id):
+    """Reports a live stream's state, frame counts (read, analysed, dropped) and latest latency."""
+    stream = live_streams.get(stream_id)
+    if stream is None:
+        return jsonify({'error': 'Unknown live stream'}), 404
+    return jsonify(stream.status()), 200
+
+@app.route('/live/<stream_id>', methods=['DELETE'])
+def stop_live_stream(stream_id):
+    """Stops a live stream; its event stream ends with an "end" event."""
+    stream = live_streams.get(stream_id)
+    if stream is None:
+        return jsonify({'error': 'Unknown live stream'}), 404
+    stream.stop()
+    return jsonify(stream.status()), 202
+
+@app.route('/live/<stream_id>/events')
+def live_stream_events(stream_id):
+    """
+    Server-Sent Events of a live stream: "impact" (frame, speed_kmh, category, latency_ms),
+    "ball_exit", periodic "status" and a final "end". Recent impacts are replayed on connect.
+    Each open connection holds a worker thread until the stream ends or the client leaves,
+    so this needs gunicorn's gthread workers (see gunicorn.conf.py): GUNICORN_THREADS caps
+    the concurrent event streams, and other requests, per worker process.
+    """
+    stream = live_streams.get(stream_id)
+    if stream is None:
+        return jsonify({'error': 'Unknown live stream'}), 404
+
+    def generate():
+        events = stream.subscribe()
+        try:
+            yield 'retry: 2000\n\n'
+            while True:
+                try:
+                    event = events.get(timeout=LIVE_HEARTBEAT_SECONDS)
+                except queue.Empty:
+                    yield ': keep-alive\n\n'
+                    continue
+                yield f"event: {event['event']}\ndata: {json.dumps(event)}\n\n"
+                if event['event'] == 'end':
+                    return
+        finally:
+            stream.unsubscribe(events)
+
+    return Response(generate(), mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-store', 'X-Accel-Buffering': 'no'})
+
+@app.route('/uploads', methods=['POST'])
+def create_upload():
+    """Starts a resumable upload from `filename` and an optional total `size` in bytes (form fields or JSON)."""
+    fields = request.get_json(silent=True) or request.form
+    filename = fields.get('filename') or ''
+    if not allowed_file(filename):
+        return jsonify({'error': 'Unsupported file type'}), 400
+    try:
+        size = int(fields['size']) if fields.get('size') is not None else None
+    except (TypeError, ValueError):
+        return jsonify({'error': 'size must be a number of bytes'}), 400
+
+    upload_id = resumable_uploads.create(filename, size)
+    response_data = {
+        'upload_id': upload_id,
+        'upload_url': url_for('get_upload', upload_id=upload_id, _external=True),
+        'complete_url': url_for('complete_upload', upload_id=upload_id, _external=True),
+        'offset': 0,
+        'max_bytes': UPLOAD_MAX_BYTES
+    }
+    return jsonify(response_data), 201
+
+@app.route('/uploads/<upload_id>')
+def get_upload(upload_id):
+    """Reports how many bytes have arrived (also as an Upload-Offset header, for HEAD); resume from there."""
+    upload = resumable_uploads.get(upload_id)
+    if upload is None:
+        return jsonify({'error': 'Unknown upload'}), 404
+    response_data = {'upload_id': upload_id, 'offset': upload['offset'], 'total_bytes': upload['total_bytes']}
+    return jsonify(response_data), 200, {'Upload-Offset': str(upload['offset']), 'Cache-Control': 'no-store'}
+
+@app.route('/uploads/<upload_id>', methods=['PATCH'])
+def upload_chunk(upload_id):
+    """
+    Appends the raw request body to the upload. The Upload-Offset header must equal the
+    bytes received so far (409 otherwise); bytes that arrived before a dropped connection are kept.
+    """
+    offset = request.headers.get('Upload-Offset', type=int)
+    if offset is None:
+        return jsonify({'error': 'Upload-Offset header required'}), 400
+    new_offset = resumable_uploads.append(upload_id, offset, request.stream)
+    return jsonify({'upload_id': upload_id, 'offset': new_offset}), 200, {'Upload-Offset': str(new_offset)}
+
+@app.route('/uploads/<upload_id>/complete', methods=['POST'])
+def complete_upload(upload_id):
+    """Checks the finished upload and queues it for analysis; takes the same form options as /analyze."""
+    upload = resumable_uploads.get(upload_id)
+    if upload is None:
+        return jsonify({'error': 'Unknown upload'}), 404
+    input_path, output_filename = upload_paths(upload['filename'])
+    content_digest, video_info = resumable_uploads.complete(upload_id, input_path)
+    return queue_analysis(input_path, output_filename, content_digest, video_info, upload['filename'])
+
+@app.route('/jobs/<job_id>')
+def get_job_status(job_id):
+    """Reports a job's status and progress, plus stats and the video URL once it is done."""
+    job = job_queue.store.get(job_id)
+    if job is None:
+        return jsonify({'error': 'Unknown job'}), 404
+
+    total = job['total_frames']
+    response_data = {
+        'job_id': job_id,
+        'status': job['status'],
+        'progress': {
+            'frames_done': job['frames_done'],
+            'total_frames': total,
+            'percent': min(100.0, round(100.0 * job['frames_done'] / total, 1)) if total else None
+        }
+    }
+    if job['status'] == DONE:
+        result = job['result']
+        response_data['message'] = 'Analysis complete'
+        response_data['processed_video_url'] = processed_video_url(result['output_filename'])
+        response_data['reanalyze_url'] = reanalyze_url(result)
+        response_data['output_expired'] = bool(result['output_filename']) and response_data['processed_video_url'] is None
+        response_data['session_id'] = result.get('session_id')
+        response_data['analysis_data'] = result['analysis_data']
+    elif job['status'] == FAILED:
+        response_data['error'] = f"Processing failed: {job['error']}"
+    elif progressive_output() and job['payload'].get('output_mode') != 'stats':
+        response_data['stream_url'] = url_for('stream_job_video', job_id=job_id, _external=True)
     return jsonify(response_data), 200
 
+@app.route('/jobs/<job_id>/stream')
+def stream_job_video(job_id):
+    """
+    Streams the annotated video while the job is still writing it, so playback can start
+    before analysis finishes. Needs fragmented MP4 output (ffmpeg installed); finished jobs
+    redirect to the processed video. Each open stream holds a worker thread until the job ends,
+    so this needs gunicorn's gthread workers (see gunicorn.conf.py).
+    """
+    job = job_queue.store.get(job_id)
+    if job is None:
+        return jsonify({'error': 'Unknown job'}), 404
+    if job['status'] == DONE:
+        if not job['result']['output_filename']:
+            return jsonify({'error': 'This analysis produced no video'}), 404
+        if not output_exists(job['result']['output_filename']):
+            return jsonify({'error': 'The processed video has expired'}), 410
+        return redirect(url_for('get_processed_video', filename=job['result']['output_filename']))
+    if job['status'] == FAILED:
+        return jsonify({'error': f"Processing failed: {job['error']}"}), 409
+    if job['payload'].get('output_mode') == 'stats' or not progressive_output():
+        return jsonify({'error': 'Live streaming needs fragmented MP4 output (ffmpeg) and a video output mode'}), 409
+
+    path = os.path.join(app.config['OUTPUT_FOLDER'], job['payload']['output_filename'])
+
+    def generate():
+        f = None
+        try:
+            while True:
+                if f is None and os.path.exists(path):
+                    f = open(path, 'rb')
+                chunk = f.read(STREAM_CHUNK_SIZE) if f else b''
+                if chunk:
+                    yield chunk
+                    continue
+                current = job_queue.store.get(job_id)
+                if current['status'] not in (QUEUED, RUNNING):
+                    if f:  # Anything written between the last read and the status check
+                        for chunk in iter(lambda: f.read(STREAM_CHUNK_SIZE), b''):
+                            yield chunk
+                    return
+                time.sleep(STREAM_POLL_SECONDS)
+        finally:
+            if f:
+                f.close()
+
+    return Response(stream_with_context(generate()), mimetype='video/mp4', headers={'Cache-Control': 'no-store'})
+
 @app.route('/videos/<filename>')
 def get_processed_video(filename):
-    """Serves the processed video files."""
-    return send_file(os.path.join(app.config['OUTPUT_FOLDER'], filename), as_attachment=True)
+    """
+    Serves the processed video files inline (add ?download=1 for an attachment), with
+    Range requests for seeking and progressive playback, and ETag / If-None-Match revalidation.
+    """
+    return send_from_directory(app.config['OUTPUT_FOLDER'], filename, as_attachment=request.args.get('download') == '1',
+                               conditional=True, etag=True, max_age=VIDEO_MAX_AGE)
+
+@app.route('/tracks/<filename>/reanalyze', methods=['POST'])
+def reanalyze_tracks(filename):
+    """
+    Recomputes impacts and stats from a finished analysis's stored detections, with the
+    impact settings in the JSON body (see main.REANALYSIS_PARAMS) overriding the defaults.
+    No model runs, so the answer is immediate and nothing is queued or cached.
+    """
+    path = safe_join(app.config['OUTPUT_FOLDER'], filename)
+    if path is None or not filename.endswith(TRACK_FILE_SUFFIX) or not os.path.isfile(path):
+        return jsonify({'error': 'Unknown track file'}), 404
+    params = request.get_json(silent=True) or {}
+    if not isinstance(params, dict):
+        return jsonify({'error': 'Send the parameters as a JSON object'}), 400
+    try:
+        analysis_stats = reanalyze(path, params)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    return jsonify({'message': 'Reanalysis complete', 'analysis_data': analysis_stats}), 200
+
+# --- Shot Queries ---
+# `player`, `since` and `until` (ISO 8601 or epoch seconds, until exclusive) filter every query.
+
+def shot_filters():
+    return {
+        'player': request.args.get('player') or None,
+        'since': parse_timestamp(request.args.get('since')),
+        'until': parse_timestamp(request.args.get('until')),
+    }
+
+def query_limit(default):
+    """The ?limit= argument; raises ValueError unless it is a positive integer."""
+    limit = request.args.get('limit', default, type=int)
+    if limit < 1:
+        raise ValueError('limit must be a positive integer')
+    return limit
+
+@app.route('/shots/leaderboard')
+def shots_leaderboard():
+    """Players ranked by their fastest shot, or with ?by=shot the fastest individual shots (filterable by player)."""
+    by = request.args.get('by', 'player')
+    if by not in ('player', 'shot'):
+        return jsonify({'error': 'by must be "player" or "shot"'}), 400
+    try:
+        filters = shot_filters()
+        limit = query_limit(10)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    if by == 'shot':
+        rows = shot_store.top_shots(limit=limit, **filters)
+    else:
+        filters.pop('player')
+        rows = shot_store.leaderboard(limit=limit, **filters)
+    return jsonify({'by': by, 'leaderboard': rows}), 200
+
+@app.route('/shots/percentiles')
+def shots_percentiles():
+    """Shot speed percentiles (?p=50,90,99; default 50,75,90,95,99), count, mean and max."""
+    try:
+        filters = shot_filters()
+        kwargs = {'percentiles': [float(p) for p in request.args['p'].split(',')]} if request.args.get('p') else {}
+        return jsonify(shot_store.percentiles(**filters, **kwargs)), 200
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+
+@app.route('/shots/trends')
+def shots_trends():
+    """Shots, average and max speed per ?bucket=day, week (default) or month."""
+    try:
+        filters = shot_filters()
+        bucket = request.args.get('bucket', 'week')
+        return jsonify({'bucket': bucket, 'trends': shot_store.trends(bucket=bucket, **filters)}), 200
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+
+@app.route('/sessions')
+def list_sessions():
+    """Recorded sessions, most recent first (?limit=, default 50)."""
+    try:
+        filters = shot_filters()
+        limit = query_limit(50)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    return jsonify({'sessions': shot_store.sessions(limit=limit, **filters)}), 200
+
+@app.route('/sessions/<session_id>')
+def get_session(session_id):
+    """A recorded session with all of its impacts."""
+    session = shot_store.get_session(session_id)
+    if session is None:
+        return jsonify({'error': 'Unknown session'}), 404
+    return jsonify(session), 200
+
+@app.route('/ready')
+def readiness():
+    """Readiness probe: 200 once the models are loaded and warm (only loaded with WARMUP_ON_START=0), 503 until then."""
+    status = model_registry.status(require_warm=WARMUP_ON_START)
+    return jsonify(status), 200 if status['ready'] else 503
+
+@app.route('/metrics')
+def prometheus_metrics():
+    """Per-stage latency histograms and throughput counters for this process, in the Prometheus text format."""
+    return Response(metrics.render(), mimetype='text/plain; version=0.0.4')
 
 @app.route('/')
 def index():
-    return 'Cricket Ball Tracking API. POST a video to /analyze.'
+    return 'Cricket Ball Tracking API. POST a video to /analyze (or upload it in chunks via /uploads), then poll /jobs/<job_id>. POST several to /analyze/batch.'
 
 if __name__ == '__main__':
     # Use 0.0.0.0 to make the app accessible on your local network
     # use_reloader=False is important to prevent the server from restarting
     # due to the AI model loading, which can cause connection issues.
+    start_worker()  # No-op if already started at import
     app.run(host='0.0.0.0', port=5000, debug=True, use_reloader=False) 
\ No newline at end of file
@@ -0,0 +1,197 @@
+"""
+Batch analysis of many videos, e.g. a day's folder of net-session clips, across a
+process pool sized to the cores. Results are yielded as each video finishes, and
+batch_summary() condenses them into per-clip and overall shot and speed figures.
+
+Short clips are packed: up to PACK_CLIPS of them run side by side in one worker, and
+their concurrent model calls are merged into shared inference batches (see
+ModelRegistry.pack). That pays off on a GPU, where a bigger batch costs little more
+than a small one; on a CPU it only adds contention, so "auto" packs only with CUDA.
+
+    python batch.py sessions/2026-10-17 --output-dir outputs --output-mode highlights
+    python batch.py a.mp4 b.mp4 --workers 2 --json report.json
+"""
+import argparse
+import concurrent.futures
+import json
+import multiprocessing
+import os
+import threading
+import time
+
+import cv2
+
+from main import analyze_video, impact_summary, BATCH_SIZE, OUTPUT_MODES
+from parallel import _init_worker
+from track_store import track_path_for, TRACK_STORE
+
+VIDEO_EXTENSIONS = ('.mp4', '.avi', '.mov', '.mkv')
+BATCH_WORKERS = int(os.environ.get('ANALYSIS_BATCH_WORKERS', 0)) or os.cpu_count() or 1
+PACK_CLIPS = os.environ.get('ANALYSIS_BATCH_PACK_CLIPS', 'auto')  # Clips per packed worker task, or "auto"
+PACK_MAX_FRAMES = int(os.environ.get('ANALYSIS_BATCH_PACK_MAX_FRAMES', 900))  # Longer clips run on their own
+
+
+def default_pack_clips():
+    if PACK_CLIPS != 'auto':
+        return max(1, int(PACK_CLIPS))
+    import torch
+    return 4 if torch.cuda.is_available() else 1
+
+
+def find_videos(paths):
+    """Expand files and folders (not recursively) into a sorted list of video files."""
+    videos = []
+    for path in paths:
+        if os.path.isdir(path):
+            videos.extend(sorted(os.path.join(path, name) for name in os.listdir(path)
+                                 if name.lower().endswith(VIDEO_EXTENSIONS)))
+        else:
+            videos.append(path)
+    return videos
+
+
+def frame_count(path):
+    cap = cv2.VideoCapture(path)
+    try:
+        return max(0, int(cap.get(cv2.CAP_PROP_FRAME_COUNT)))
+    finally:
+        cap.release()
+
+
+def plan_tasks(clips, pack_clips, max_frames=PACK_MAX_FRAMES):
+    """
+    Group clips into worker tasks, longest first so the pool finishes evenly. Clips of at
+    most `max_frames` frames are packed `pack_clips` to a task, alongside clips of similar
+    length so the threads of a task finish together.
+    """
+    clips = sorted(clips, key=lambda clip: clip["frames"], reverse=True)
+    tasks = [[clip] for clip in clips if clip["frames"] > max_frames or pack_clips == 1]
+    short = [clip for clip in clips if clip["frames"] <= max_frames and pack_clips > 1]
+    tasks.extend(short[i:i + pack_clips] for i in range(0, len(short), pack_clips))
+    return tasks
+
+
+def _analyze_clip(clip, kwargs):
+    started = time.perf_counter()
+    result = {"video": os.path.basename(clip["input_path"]), "input_path": clip["input_path"]}
+    try:
+        stats = analyze_video(clip["input_path"], clip["output_path"], track_path=clip.get("track_path"), **kwargs)
+    except Exception as e:
+        print(f"Error analysing {clip['input_path']}: {e}")
+        return dict(result, status="failed", error=str(e), output_path=None, track_path=None, analysis_data=None,
+                    seconds=round(time.perf_counter() - started, 3))
+    return dict(result, status="done", error=None,
+                output_path=clip["output_path"] if stats["output"]["written"] else None,
+                track_path=clip.get("track_path"), analysis_data=stats, seconds=round(time.perf_counter() - started, 3))
+
+
+def _analyze_task(task, kwargs):
+    """Worker entry point: analyse a task's clips, side by side with packed inference if there are several."""
+    if len(task) == 1:
+        return [_analyze_clip(task[0], kwargs)]
+    from models import registry
+    registry.pack(len(task) * int(kwargs.get("batch_size") or BATCH_SIZE))
+    results = [None] * len(task)
+
+    def run(i):
+        results[i] = _analyze_clip(task[i], kwargs)
+
+    threads = [threading.Thread(target=run, args=(i,), name=f"clip-{i}") for i in range(len(task))]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return results
+
+
+def analyze_batch(clips, workers=None, pack_clips=None, **kwargs):
+    """
+    Analyse `clips` ({input_path, output_path, track_path (optional)} dicts) in a pool of
+    `workers` processes (default BATCH_WORKERS) and yield one result dict per clip as its
+    task finishes: {video, input_path, status ("done" or "failed"), error, output_path
+    (None if no video was written), track_path, analysis_data, seconds}.
+    A failing clip does not stop the others. Other keyword arguments go to analyze_video.
+    """
+    clips = [dict(clip, frames=frame_count(clip["input_path"])) for clip in clips]
+    if not clips:
+        return
+    pack_clips = max(1, int(pack_clips or default_pack_clips()))
+    tasks = plan_tasks(clips, pack_clips)
+    workers = max(1, min(int(workers or BATCH_WORKERS), len(tasks)))
+    threads = max(1, (os.cpu_count() or 1) // workers)
+    print(f"--- Analysing {len(clips)} videos as {len(tasks)} tasks on {workers} processes ---")
+    with concurrent.futures.ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context('spawn'),
+                                                initializer=_init_worker, initargs=(threads,)) as pool:
+        futures = [pool.submit(_analyze_task, task, kwargs) for task in tasks]
+        for future in concurrent.futures.as_completed(futures):
+            yield from future.result()
+
+
+def batch_summary(results, wall_seconds=None):
+    """Per-clip shots and speeds, plus the same figures over every impact in the batch."""
+    results = list(results)
+    clips = []
+    all_impacts = []
+    for result in results:
+        stats = result["analysis_data"]
+        clip = {"video": result["video"], "status": result["status"]}
+        if stats:
+            all_impacts.extend(stats["impacts"])
+            clip.update({"total_frames": stats["total_frames"], "shots": stats["total_shots"]})
+            clip.update(impact_summary(stats["impacts"]))
+        else:
+            clip["error"] = result["error"]
+        clips.append(clip)
+    summary = {
+        "videos": len(results),
+        "failed": sum(result["status"] == "failed" for result in results),
+        "total_frames": sum(clip.get("total_frames", 0) for clip in clips),
+        "total_shots": len(all_impacts),
+        "wall_seconds": round(wall_seconds, 3) if wall_seconds is not None else None,
+        "clips": clips,
+    }
+    summary.update(impact_summary(all_impacts))
+    return summary
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Analyse a batch of cricket videos.")
+    parser.add_argument('paths', nargs='+', help="Video files and/or folders of videos")
+    parser.add_argument('--output-dir', default='outputs')
+    parser.add_argument('--workers', type=int, help=f"Processes (default {BATCH_WORKERS})")
+    parser.add_argument('--pack-clips', type=int, help="Short clips per packed worker task (default: 4 with CUDA, else 1)")
+    parser.add_argument('--output-mode', choices=OUTPUT_MODES)
+    parser.add_argument('--camera-id', help="Fixed camera setup shared by every clip, to reuse its calibration")
+    parser.add_argument('--no-tracks', action='store_true', help="Do not save track files for reanalysis")
+    parser.add_argument('--json', help="Write every result and the summary to this file")
+    args = parser.parse_args()
+
+    os.makedirs(args.output_dir, exist_ok=True)
+    clips = []
+    for path in find_videos(args.paths):
+        output_path = os.path.join(args.output_dir, f"{os.path.splitext(os.path.basename(path))[0]}_processed.mp4")
+        clips.append({"input_path": path, "output_path": output_path,
+                      "track_path": track_path_for(output_path) if TRACK_STORE and not args.no_tracks else None})
+    if not clips:
+        parser.error("no videos found")
+
+    started = time.perf_counter()
+    results = []
+    for result in analyze_batch(clips, workers=args.workers, pack_clips=args.pack_clips,
+                                output_mode=args.output_mode, camera_id=args.camera_id):
+        results.append(result)
+        stats = result["analysis_data"] or {}
+        print(json.dumps({"event": "video_done", "video": result["video"], "status": result["status"],
+                          "error": result["error"], "shots": stats.get("total_shots"),
+                          "max_speed_kmh": stats.get("max_speed_kmh"), "output_path": result["output_path"],
+                          "seconds": result["seconds"]}))
+    summary = batch_summary(results, time.perf_counter() - started)
+    print("\n--- Batch Summary ---")
+    print(json.dumps(summary, indent=4))
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump({"results": results, "summary": summary}, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,330 @@
+"""
+Benchmark analyze_video throughput without real footage or weight files.
+
+Generates a synthetic clip (grass, stumps, a swinging bat and incoming balls) and runs
+the pipeline under each mode with either colour-threshold stub detectors that sleep
+for a configurable fake latency, or the real models when their weights are present.
+Reports frames/sec, per-stage latency percentiles and peak RSS per mode as JSON, so
+runs can be compared across commits.
+
+    python benchmark.py --width 1280 --height 720 --seconds 10 --json bench.json
+    python benchmark.py --detectors real --video clip.mp4 --modes batched strided
+    python benchmark.py --baseline bench.json    # Print fps change against an earlier run
+"""
+import argparse
+import datetime
+import json
+import os
+import platform
+import resource
+import statistics
+import subprocess
+import tempfile
+import threading
+import time
+
+import cv2
+import numpy as np
+
+import main as pipeline
+from metrics import StageTimer
+from models import MODEL_WEIGHTS, registry
+
+# --- Synthetic Scene Colours (BGR) ---
+GRASS_COLOR = (40, 120, 40)
+PITCH_COLOR = (140, 190, 210)
+STUMP_COLOR = (255, 255, 255)
+BAT_COLOR = (30, 100, 200)
+BALL_COLOR = (0, 0, 255)
+COLOR_TOLERANCE = 40  # Per-channel slack when the stubs threshold compressed frames
+SWING_PERIOD_SECONDS = 1.5  # One bat swing and one delivery per period
+SWING_PHASES = (0.4, 0.6)  # The bat sweeps across the crease between these fractions of the period...
+SWING_FROM, SWING_TO = 0.35, 0.65  # ...from and to these fractions of the width, peaking at ~34 km/h
+
+# analyze_video keyword arguments per mode. Every mode runs the threaded
+# decode/inference/encode pipeline; "single" is the unbatched reference.
+MODES = {
+    "single": {"batch_size": 1, "frame_stride": 1, "cascade": "", "roi": False},
+    "batched": {"batch_size": pipeline.BATCH_SIZE, "frame_stride": 1, "cascade": "", "roi": False},
+    "strided": {"batch_size": pipeline.BATCH_SIZE, "frame_stride": 3, "cascade": "", "roi": False},
+    "roi": {"batch_size": pipeline.BATCH_SIZE, "frame_stride": 1, "cascade": "", "roi": True},
+    "cascade": {"batch_size": pipeline.BATCH_SIZE, "frame_stride": 1, "cascade": pipeline.CASCADE, "roi": False},
+    "highlights": {"batch_size": pipeline.BATCH_SIZE, "frame_stride": 1, "cascade": "", "roi": False, "output_mode": "highlights"},
+    "stats": {"batch_size": pipeline.BATCH_SIZE, "frame_stride": 1, "cascade": "", "roi": False, "output_mode": "stats"},
+}
+
+# --- Synthetic Video ---
+
+def scene_geometry(index, fps, width, height):
+    """
+    Stump, bat and ball positions in pixels for frame `index`. The ball comes in, meets
+    the bat mid-swing at half period, and flies off up and to the left.
+    """
+    t = index / fps
+    phase = (t % SWING_PERIOD_SECONDS) / SWING_PERIOD_SECONDS
+    stump = (int(0.49 * width), int(0.55 * height), int(0.51 * width), int(0.75 * height))
+    bat_w, bat_h = int(0.03 * width), int(0.15 * height)
+    swing = np.clip((phase - SWING_PHASES[0]) / (SWING_PHASES[1] - SWING_PHASES[0]), 0.0, 1.0)
+    swing = swing * swing * (3 - 2 * swing)  # Smoothstep: at rest, then a fast sweep
+    bat_cx = int((SWING_FROM + (SWING_TO - SWING_FROM) * swing) * width)
+    bat_cy = int(0.6 * height)
+    bat = (bat_cx - bat_w // 2, bat_cy - bat_h // 2, bat_cx + bat_w // 2, bat_cy + bat_h // 2)
+    if phase < 0.5:
+        ball = (int((0.9 - 0.8 * phase) * width), int((0.45 + 0.3 * phase) * height))
+    else:
+        ball = (int((0.5 - 0.8 * (phase - 0.5)) * width), int((0.6 - 1.0 * (phase - 0.5)) * height))
+    return stump, bat, ball
+
+def make_synthetic_video(path, width=1280, height=720, fps=30.0, seconds=10.0):
+    """Write a synthetic net-session clip to `path` and return its frame count."""
+    out = cv2.VideoWriter(path, cv2.VideoWriter_fourcc(*'mp4v'), fps, (width, height))
+    background = np.empty((height, width, 3), dtype=np.uint8)
+    background[:] = GRASS_COLOR
+    cv2.rectangle(background, (int(0.3 * width), int(0.2 * height)), (int(0.7 * width), height), PITCH_COLOR, -1)
+    frame = np.empty_like(background)
+    count = int(round(seconds * fps))
+    for index in range(count):
+        stump, bat, ball = scene_geometry(index, fps, width, height)
+        frame[:] = background
+        cv2.rectangle(frame, stump[:2], stump[2:], STUMP_COLOR, -1)
+        cv2.rectangle(frame, bat[:2], bat[2:], BAT_COLOR, -1)
+        cv2.circle(frame, ball, max(3, int(0.008 * width)), BALL_COLOR, -1)
+        out.write(frame)
+    out.release()
+    return count
+
+# --- Stub Detectors ---
+# Minimal stand-ins for ultralytics results: just the attributes main.py reads.
+
+class _Tensor:
+    def __init__(self, array):
+        self._array = array
+
+    def cpu(self):
+        return self
+
+    def numpy(self):
+        return self._array
+
+class _Boxes:
+    def __init__(self, data):
+        self.data = _Tensor(data)
+
+    def __len__(self):
+        return len(self.data.numpy())
+
+class _Keypoints(_Boxes):
+    pass
+
+class _Result:
+    def __init__(self, boxes, keypoints=None):
+        self.boxes = _Boxes(boxes)
+        self.keypoints = _Keypoints(keypoints) if keypoints is not None else None
+
+def _color_box(frame, color):
+    """
+    Bounding box (x1, y1, x2, y2) of the largest blob of pixels close to `color`, or None.
+    The opening drops thin fringes, e.g. where the red ball blends into the pitch as bat colour.
+    """
+    lower = np.clip(np.array(color) - COLOR_TOLERANCE, 0, 255).astype(np.uint8)
+    upper = np.clip(np.array(color) + COLOR_TOLERANCE, 0, 255).astype(np.uint8)
+    mask = cv2.morphologyEx(cv2.inRange(frame, lower, upper), cv2.MORPH_OPEN, np.ones((3, 3), np.uint8))
+    count, _, stats, _ = cv2.connectedComponentsWithStats(mask)
+    if count < 2:
+        return None
+    label = 1 + int(np.argmax(stats[1:, cv2.CC_STAT_AREA]))
+    x, y, w, h, area = stats[label]
+    if area < 4:
+        return None
+    return (int(x), int(y), int(x + w), int(y + h))
+
+class StubDetector:
+    """
+    Finds one object of a fixed colour per image and sleeps `call_ms` per call plus
+    `image_ms` per image to stand in for model latency. Pose stubs report a person
+    whose wrists sit at the top corners of the bat.
+    """
+
+    def __init__(self, name, color, call_ms=5.0, image_ms=10.0, pose=False):
+        self.names = {0: name}
+        self.color = color
+        self.call_ms = call_ms
+        self.image_ms = image_ms
+        self.pose = pose
+
+    def _detect(self, frame):
+        box = _color_box(frame, self.color)
+        if box is None:
+            keypoints = np.zeros((0, 17, 3), dtype=np.float32) if self.pose else None
+            return _Result(np.zeros((0, 6), dtype=np.float32), keypoints)
+        boxes = np.array([[*box, 0.9, 0]], dtype=np.float32)
+        if not self.pose:
+            return _Result(boxes)
+        keypoints = np.zeros((1, 17, 3), dtype=np.float32)
+        keypoints[0, 9] = (box[0], box[1], 0.9)  # Left wrist
+        keypoints[0, 10] = (box[2], box[1], 0.9)  # Right wrist
+        return _Result(boxes, keypoints)
+
+    def __call__(self, source, verbose=False, **kwargs):
+        frames = source if isinstance(source, list) else [source]
+        time.sleep((self.call_ms + self.image_ms * len(frames)) / 1000)
+        return [self._detect(frame) for frame in frames]
+
+def install_stub_detectors(call_ms, image_ms):
+    registry.install("bat", StubDetector("bat", BAT_COLOR, call_ms, image_ms))
+    registry.install("ball", StubDetector("ball", BALL_COLOR, call_ms, image_ms))
+    registry.install("stump", StubDetector("stumps", STUMP_COLOR, call_ms, image_ms))
+    registry.install("pose", StubDetector("person", BAT_COLOR, call_ms, image_ms, pose=True))
+
+def real_models_available():
+    return all(os.path.exists(path) for path in MODEL_WEIGHTS.values())
+
+# --- Measurement ---
+
+class PeakRSS:
+    """Samples the process resident set size on a background thread; peak_mb is the growth over the baseline."""
+
+    def __init__(self, interval=0.02):
+        self.interval = interval
+        self.peak_mb = 0.0
+        self.peak_rss_mb = 0.0
+        self._stop = threading.Event()
+        self._thread = None
+
+    @staticmethod
+    def current_mb():
+        try:
+            with open('/proc/self/statm') as f:
+                return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE') / 2 ** 20
+        except OSError:
+            return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024  # Peak, not current, off Linux
+
+    def _sample(self):
+        while not self._stop.wait(self.interval):
+            self._peak = max(self._peak, self.current_mb())
+
+    def __enter__(self):
+        self._baseline = self._peak = self.current_mb()
+        self._thread = threading.Thread(target=self._sample, daemon=True)
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._stop.set()
+        self._thread.join()
+        self._peak = max(self._peak, self.current_mb())
+        self.peak_mb = round(self._peak - self._baseline, 1)
+        self.peak_rss_mb = round(self._peak, 1)
+
+def run_mode(video_path, workdir, name, kwargs, repeat=1):
+    """
+    Run analyze_video `repeat` times in one mode; fps is the median run, stages (exact
+    percentiles of the raw per-call timings) come from the last.
+    """
+    runs = []
+    for i in range(repeat):
+        output_path = os.path.join(workdir, f"{name}_{i}.mp4")
+        with PeakRSS() as memory:
+            stats = pipeline.analyze_video(video_path, output_path, timer=StageTimer(keep_samples=True), **kwargs)
+        if os.path.exists(output_path):
+            os.remove(output_path)
+        runs.append((stats, memory))
+    stats, memory = runs[-1]
+    return {
+        "settings": kwargs,
+        "fps": statistics.median(s["timings"]["frames_per_second"] for s, _ in runs),
+        "fps_runs": [s["timings"]["frames_per_second"] for s, _ in runs],
+        "wall_seconds": stats["timings"]["wall_seconds"],
+        "total_frames": stats["total_frames"],
+        "frames_inferred": stats["frames_inferred"],
+        "impacts": stats["total_shots"],
+        "model_invocations": stats["model_invocations"],
+        "peak_rss_growth_mb": max(m.peak_mb for _, m in runs),
+        "peak_rss_mb": max(m.peak_rss_mb for _, m in runs),
+        "stages": stats["timings"]["stages"],
+    }
+
+def git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                              check=True, cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def benchmark(modes, detectors='auto', video=None, width=1280, height=720, fps=30.0, seconds=10.0,
+              repeat=1, stub_call_ms=5.0, stub_image_ms=10.0):
+    if detectors == 'auto':
+        detectors = 'real' if real_models_available() else 'stub'
+    if detectors == 'stub':
+        install_stub_detectors(stub_call_ms, stub_image_ms)
+
+    with tempfile.TemporaryDirectory(prefix='cricket-bench-') as workdir:
+        # Keep calibration uncached so every mode pays the same calibration cost
+        pipeline.CALIBRATION_CACHE_PATH = os.path.join(workdir, 'calibration_cache.json')
+        if video is None:
+            video_path = os.path.join(workdir, 'synthetic.mp4')
+            make_synthetic_video(video_path, width, height, fps, seconds)
+            source = {"synthetic": True, "width": width, "height": height, "fps": fps, "seconds": seconds}
+        else:
+            video_path = video
+            source = {"synthetic": False, "path": video}
+        registry.warm_up(batch_size=pipeline.BATCH_SIZE, frame_size=(width, height))
+
+        report = {
+            "commit": git_commit(),
+            "timestamp": datetime.datetime.now().isoformat(timespec='seconds'),
+            "python": platform.python_version(),
+            "cpu_count": os.cpu_count(),
+            "detectors": detectors,
+            "stub_latency_ms": {"call": stub_call_ms, "image": stub_image_ms} if detectors == 'stub' else None,
+            "video": source,
+            "modes": {},
+        }
+        for name in modes:
+            print(f"--- Benchmarking mode '{name}' ---")
+            report["modes"][name] = run_mode(video_path, workdir, name, MODES[name], repeat)
+            if source["synthetic"] and detectors == 'stub' and not report["modes"][name]["impacts"]:
+                # Otherwise the impact and ball-following stages silently drop out of the timings
+                raise RuntimeError(f"Mode '{name}' found no impacts in the synthetic clip")
+    return report
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the cricket analysis pipeline.")
+    parser.add_argument('--modes', nargs='+', default=list(MODES), choices=list(MODES))
+    parser.add_argument('--detectors', default='auto', choices=['auto', 'stub', 'real'],
+                        help="'auto' uses the real models when all weight files exist")
+    parser.add_argument('--video', help="Benchmark this video instead of a synthetic one")
+    parser.add_argument('--width', type=int, default=1280)
+    parser.add_argument('--height', type=int, default=720)
+    parser.add_argument('--fps', type=float, default=30.0)
+    parser.add_argument('--seconds', type=float, default=10.0)
+    parser.add_argument('--repeat', type=int, default=1, help="Runs per mode; fps is the median")
+    parser.add_argument('--stub-call-ms', type=float, default=5.0, help="Fake latency per stub model call")
+    parser.add_argument('--stub-image-ms', type=float, default=10.0, help="Fake latency per image in a stub call")
+    parser.add_argument('--json', help="Write the report to this file")
+    parser.add_argument('--baseline', help="Earlier report to compare fps against")
+    args = parser.parse_args()
+
+    report = benchmark(args.modes, args.detectors, args.video, args.width, args.height, args.fps,
+                       args.seconds, max(1, args.repeat), args.stub_call_ms, args.stub_image_ms)
+    baseline = {}
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f).get("modes", {})
+
+    print(f"\n--- Benchmark ({report['detectors']} detectors, commit {report['commit']}) ---")
+    for name, r in report["modes"].items():
+        line = (f"{name}: {r['fps']:.1f} fps, {r['frames_inferred']}/{r['total_frames']} frames inferred, "
+                f"peak RSS +{r['peak_rss_growth_mb']:.0f} MB, {r['impacts']} impacts")
+        if name in baseline:
+            line += f" ({(r['fps'] / baseline[name]['fps'] - 1) * 100:+.1f}% vs baseline)"
+        print(line)
+        for stage, s in r["stages"].items():
+            print(f"  {stage}: mean {s['mean_ms']} ms, p50 {s['p50_ms']} ms, p95 {s['p95_ms']} ms ({s['count']} calls)")
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(report, f, indent=4)
+
+
+if __name__ == "__main__":
+    main()
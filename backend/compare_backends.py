@@ -0,0 +1,154 @@
+"""
+Compare an exported inference backend against the PyTorch weights.
+
+For every model in MODEL_WEIGHTS, runs the PyTorch reference and each candidate backend
+on frames sampled from a video and reports per-frame latency and detection parity
+(boxes matched at IoU >= 0.5 with the same class, mean IoU, confidence drift, and for
+pose models the keypoint offset between matched people). Each model runs at the
+confidence threshold the analysis uses, so parity is measured on the detections that count.
+
+    python compare_backends.py clip.mp4 --backends onnx openvino --int8 --json parity.json
+"""
+import argparse
+import json
+import time
+
+import cv2
+import numpy as np
+
+from main import DETECTORS, STUMP_DETECTOR, extract_boxes, extract_keypoints
+from models import MODEL_TASKS, MODEL_WEIGHTS, load_model
+from tracking import box_iou
+
+PARITY_IOU = 0.5  # Minimum IoU for a candidate box to count as the same detection
+KEYPOINT_TOLERANCE_PX = 5.0  # A candidate keypoint within this distance of the reference one counts as matching
+WARMUP_RUNS = 3
+PREDICT_KWARGS = dict(DETECTORS, stump=STUMP_DETECTOR)  # The thresholds each model runs at in the analysis
+
+
+def sample_frames(video_path, count):
+    """Decode `count` frames spread evenly over the video."""
+    cap = cv2.VideoCapture(video_path)
+    if not cap.isOpened():
+        raise RuntimeError(f"ERROR: Could not open video file {video_path}")
+    total = int(cap.get(cv2.CAP_PROP_FRAME_COUNT)) or count
+    wanted = set(np.linspace(0, max(0, total - 1), num=count, dtype=int).tolist())
+    frames = []
+    index = 0
+    while len(frames) < len(wanted):
+        success, frame = cap.read()
+        if not success:
+            break
+        if index in wanted:
+            frames.append(frame)
+        index += 1
+    cap.release()
+    return frames
+
+
+def run_model(model, frames, predict_kwargs=None):
+    """
+    Run a model frame by frame with `predict_kwargs` (e.g. a DETECTORS entry); returns
+    (latencies in ms, [(xyxy, conf, cls, keypoints)] per frame).
+    """
+    predict_kwargs = predict_kwargs or {}
+    for frame in frames[:WARMUP_RUNS]:
+        model(frame, verbose=False, **predict_kwargs)
+    latencies, detections = [], []
+    for frame in frames:
+        start = time.perf_counter()
+        result = model(frame, verbose=False, **predict_kwargs)[0]
+        latencies.append((time.perf_counter() - start) * 1000)
+        detections.append(extract_boxes(result) + (extract_keypoints(result),))
+    return latencies, detections
+
+
+def parity(reference, candidate):
+    """
+    Greedy same-class IoU matching of candidate detections against the reference. For
+    matched people, keypoints are compared too: mean distance and the share within
+    KEYPOINT_TOLERANCE_PX (None for models without keypoints).
+    """
+    ref_total = cand_total = matched = 0
+    ious, conf_diffs, keypoint_offsets = [], [], []
+    for (ref_xyxy, ref_conf, ref_cls, ref_kps), (cand_xyxy, cand_conf, cand_cls, cand_kps) in zip(reference, candidate):
+        ref_total += len(ref_xyxy)
+        cand_total += len(cand_xyxy)
+        iou = box_iou(ref_xyxy, cand_xyxy)
+        if iou.size:
+            iou[ref_cls[:, None] != cand_cls[None, :]] = 0
+        while iou.size and iou.max() >= PARITY_IOU:
+            i, j = np.unravel_index(np.argmax(iou), iou.shape)
+            matched += 1
+            ious.append(float(iou[i, j]))
+            conf_diffs.append(abs(float(ref_conf[i]) - float(cand_conf[j])))
+            if i < len(ref_kps) and j < len(cand_kps):
+                offsets = ref_kps[i, :, :2] - cand_kps[j, :, :2]
+                keypoint_offsets.extend(np.hypot(offsets[:, 0], offsets[:, 1]).tolist())
+            iou[i, :] = 0
+            iou[:, j] = 0
+    return {
+        "recall": round(matched / ref_total, 4) if ref_total else 1.0,
+        "precision": round(matched / cand_total, 4) if cand_total else 1.0,
+        "mean_iou": round(float(np.mean(ious)), 4) if ious else None,
+        "mean_conf_diff": round(float(np.mean(conf_diffs)), 4) if conf_diffs else None,
+        "keypoint_mean_px": round(float(np.mean(keypoint_offsets)), 2) if keypoint_offsets else None,
+        "keypoint_within_tolerance": (round(float(np.mean(np.array(keypoint_offsets) <= KEYPOINT_TOLERANCE_PX)), 4)
+                                      if keypoint_offsets else None),
+    }
+
+
+def latency_summary(latencies):
+    return {
+        "mean_ms": round(float(np.mean(latencies)), 2),
+        "p50_ms": round(float(np.percentile(latencies, 50)), 2),
+        "p95_ms": round(float(np.percentile(latencies, 95)), 2),
+    }
+
+
+def compare(video_path, backends, int8=False, frame_count=100, model_names=None):
+    frames = sample_frames(video_path, frame_count)
+    if not frames:
+        raise RuntimeError(f"No frames could be read from {video_path}")
+    report = {"video": video_path, "frames": len(frames), "int8": int8, "models": {}}
+    for name in model_names or MODEL_WEIGHTS:
+        weights, task, predict_kwargs = MODEL_WEIGHTS[name], MODEL_TASKS[name], PREDICT_KWARGS[name]
+        ref_latencies, ref_detections = run_model(load_model(weights, task, backend='pytorch'), frames, predict_kwargs)
+        entry = {"pytorch": latency_summary(ref_latencies)}
+        for backend in backends:
+            latencies, detections = run_model(load_model(weights, task, backend=backend, int8=int8), frames,
+                                              predict_kwargs)
+            entry[backend] = dict(latency_summary(latencies),
+                                  speedup=round(float(np.mean(ref_latencies) / np.mean(latencies)), 2),
+                                  **parity(ref_detections, detections))
+        report["models"][name] = entry
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare inference backends against the PyTorch weights.")
+    parser.add_argument('video', help="Video to sample frames from")
+    parser.add_argument('--backends', nargs='+', default=['onnx'], choices=['onnx', 'openvino'])
+    parser.add_argument('--int8', action='store_true', help="Compare the INT8-quantized exports")
+    parser.add_argument('--frames', type=int, default=100, help="Number of frames to sample")
+    parser.add_argument('--models', nargs='+', choices=list(MODEL_WEIGHTS), help="Subset of models to compare")
+    parser.add_argument('--json', help="Also write the report to this file")
+    args = parser.parse_args()
+
+    report = compare(args.video, args.backends, args.int8, args.frames, args.models)
+    print(f"\n--- Backend comparison ({report['frames']} frames{', INT8' if args.int8 else ''}) ---")
+    for name, entry in report["models"].items():
+        print(f"{name}: pytorch {entry['pytorch']['mean_ms']:.1f} ms")
+        for backend in args.backends:
+            r = entry[backend]
+            print(f"  {backend}: {r['mean_ms']:.1f} ms (p95 {r['p95_ms']:.1f}, x{r['speedup']:.2f}) "
+                  f"recall {r['recall']:.3f} precision {r['precision']:.3f} mean IoU {r['mean_iou']}"
+                  + (f" keypoints {r['keypoint_mean_px']} px ({r['keypoint_within_tolerance']:.1%} within "
+                     f"{KEYPOINT_TOLERANCE_PX:g} px)" if r['keypoint_mean_px'] is not None else ""))
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(report, f, indent=4)
+
+
+if __name__ == "__main__":
+    main()
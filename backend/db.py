@@ -0,0 +1,23 @@
+"""
+SQLite connection handling shared by the job table (jobs.py) and the shot database
+(shots.py). Both are shared by every app process on the host, so each call opens its
+own short-lived connection and manages transactions explicitly (autocommit mode).
+"""
+import contextlib
+import sqlite3
+
+
+@contextlib.contextmanager
+def connect(db_path, foreign_keys=False):
+    """
+    A connection with rows as sqlite3.Row, closed on exit. One short-lived connection
+    per call keeps the stores safe to use from any thread.
+    """
+    conn = sqlite3.connect(db_path, timeout=30, isolation_level=None)
+    conn.row_factory = sqlite3.Row
+    if foreign_keys:
+        conn.execute("PRAGMA foreign_keys = ON")
+    try:
+        yield conn
+    finally:
+        conn.close()
@@ -0,0 +1,22 @@
+import os
+
+# With PRELOAD_MODELS=1 the app (and the models) are loaded once in the master and
+# shared copy-on-write by the forked workers. Each worker then starts its own job
+# threads and warm-up pass after the fork.
+preload_app = os.environ.get('PRELOAD_MODELS', '0') == '1'
+
+
+def post_fork(server, worker):
+    if preload_app:
+        from app import start_worker
+        start_worker()
+
+# Event streams (/live/<id>/events) and in-progress video streams (/jobs/<id>/stream)
+# keep their connection open for as long as the analysis runs. A sync worker serves one
+# request at a time and kills any that outlasts `timeout`, so requests run on threads
+# instead: every open stream occupies one of a worker's `threads` until it ends.
+worker_class = 'gthread'
+threads = int(os.environ.get('GUNICORN_THREADS', 16))
+# With gthread workers this is how long the worker's main loop may go silent, not a
+# limit on requests, so long streams are not cut off; it covers start-up and warm-up.
+timeout = int(os.environ.get('GUNICORN_TIMEOUT', 120))
@@ -0,0 +1,291 @@
+import json
+import os
+import socket
+import threading
+import time
+import uuid
+
+from db import connect
+
+# --- Job States ---
+QUEUED = 'queued'
+RUNNING = 'running'
+DONE = 'done'
+FAILED = 'failed'
+
+POLL_INTERVAL_SECONDS = 2.0  # How often idle workers look for jobs queued by other processes
+PROGRESS_INTERVAL_SECONDS = 1.0  # Minimum time between progress writes for a single job
+# A RUNNING job whose owner has not renewed its lease for this long is assumed lost and requeued
+JOB_LEASE_SECONDS = float(os.environ.get('JOB_LEASE_SECONDS', 60))
+HEARTBEAT_INTERVAL_SECONDS = JOB_LEASE_SECONDS / 4  # How often a process renews the leases of the jobs it runs
+# A job whose worker was lost this many times (e.g. a video that crashes or hangs it) fails instead of being requeued
+JOB_MAX_ATTEMPTS = int(os.environ.get('JOB_MAX_ATTEMPTS', 3))
+
+# Columns added after the first release, created on existing databases at startup
+_ADDED_COLUMNS = {"heartbeat_at": "REAL", "batch_id": "TEXT", "attempts": "INTEGER NOT NULL DEFAULT 0"}
+
+
+def _owner_id():
+    """
+    A token identifying the process that claims jobs. PIDs are reused, e.g. by every
+    container restart, so the PID is only there for the logs; the random part is what
+    keeps a new process from mistaking an old one's jobs for its own.
+    """
+    return f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:12]}"
+
+
+def _decode(row):
+    job = dict(row)
+    job['payload'] = json.loads(job['payload'])
+    job['result'] = json.loads(job['result']) if job['result'] else None
+    return job
+
+
+class JobStore:
+    """
+    SQLite-backed job table. Every gunicorn worker on the host shares the same
+    database file, so queued work survives worker restarts. A claimed job carries a
+    lease (`heartbeat_at`) that its owner keeps renewing; jobs whose lease runs out
+    belonged to a process that died and are requeued, up to JOB_MAX_ATTEMPTS claims in all.
+    """
+
+    def __init__(self, db_path):
+        self.db_path = db_path
+        with self._connect() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS jobs (
+                    id TEXT PRIMARY KEY,
+                    status TEXT NOT NULL,
+                    payload TEXT NOT NULL,
+                    result TEXT,
+                    error TEXT,
+                    owner TEXT,
+                    frames_done INTEGER NOT NULL DEFAULT 0,
+                    total_frames INTEGER NOT NULL DEFAULT 0,
+                    created_at REAL NOT NULL,
+                    started_at REAL,
+                    finished_at REAL,
+                    heartbeat_at REAL,
+                    batch_id TEXT,
+                    attempts INTEGER NOT NULL DEFAULT 0
+                )
+            """)
+            columns = {row['name'] for row in conn.execute("PRAGMA table_info(jobs)")}
+            for name, kind in _ADDED_COLUMNS.items():
+                if name not in columns:
+                    conn.execute(f"ALTER TABLE jobs ADD COLUMN {name} {kind}")
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_jobs_status_created ON jobs (status, created_at)")
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_jobs_batch ON jobs (batch_id)")
+
+    def _connect(self):
+        return connect(self.db_path)
+
+    def create(self, payload, batch_id=None, result=None):
+        """
+        Insert a new queued job and return its ID. A job created with a `result` (e.g. one
+        answered from a cache) is recorded as already done.
+        """
+        job_id = uuid.uuid4().hex
+        now = time.time()
+        with self._connect() as conn:
+            if result is None:
+                conn.execute(
+                    "INSERT INTO jobs (id, status, payload, created_at, batch_id) VALUES (?, ?, ?, ?, ?)",
+                    (job_id, QUEUED, json.dumps(payload), now, batch_id),
+                )
+            else:
+                conn.execute(
+                    "INSERT INTO jobs (id, status, payload, result, created_at, finished_at, batch_id)"
+                    " VALUES (?, ?, ?, ?, ?, ?, ?)",
+                    (job_id, DONE, json.dumps(payload), json.dumps(result), now, now, batch_id),
+                )
+        return job_id
+
+    def get(self, job_id):
+        """Return the job as a dict, or None if it does not exist."""
+        with self._connect() as conn:
+            row = conn.execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        return _decode(row) if row is not None else None
+
+    def batch(self, batch_id):
+        """The jobs submitted together under `batch_id`, in submission order."""
+        with self._connect() as conn:
+            rows = conn.execute("SELECT * FROM jobs WHERE batch_id = ? ORDER BY created_at, rowid", (batch_id,)).fetchall()
+        return [_decode(row) for row in rows]
+
+    def claim_next(self, owner):
+        """Atomically move the oldest queued job to RUNNING and return it, or None if the queue is empty."""
+        with self._connect() as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                row = conn.execute(
+                    "SELECT id FROM jobs WHERE status = ? ORDER BY created_at LIMIT 1", (QUEUED,)
+                ).fetchone()
+                if row is not None:
+                    now = time.time()
+                    conn.execute(
+                        "UPDATE jobs SET status = ?, owner = ?, started_at = ?, heartbeat_at = ?, attempts = attempts + 1"
+                        " WHERE id = ?",
+                        (RUNNING, owner, now, now, row['id']),
+                    )
+                conn.execute("COMMIT")
+            except Exception:
+                conn.execute("ROLLBACK")
+                raise
+        if row is None:
+            return None
+        return self.get(row['id'])
+
+    # Writes for a claimed job take its owner, and are dropped if the job has since been
+    # requeued and claimed by someone else (the owner's lease ran out while it was stalled).
+
+    def update_progress(self, job_id, frames_done, total_frames, owner=None):
+        with self._connect() as conn:
+            conn.execute(
+                "UPDATE jobs SET frames_done = ?, total_frames = ? WHERE id = ? AND (? IS NULL OR owner = ?)",
+                (frames_done, total_frames, job_id, owner, owner),
+            )
+
+    def finish(self, job_id, result, owner=None):
+        """Mark the job done; returns False if `owner` no longer holds it."""
+        with self._connect() as conn:
+            cursor = conn.execute(
+                "UPDATE jobs SET status = ?, result = ?, finished_at = ?, frames_done = MAX(frames_done, total_frames)"
+                " WHERE id = ? AND (? IS NULL OR owner = ?)",
+                (DONE, json.dumps(result), time.time(), job_id, owner, owner),
+            )
+        return cursor.rowcount > 0
+
+    def fail(self, job_id, error, owner=None):
+        """Mark the job failed; returns False if `owner` no longer holds it."""
+        with self._connect() as conn:
+            cursor = conn.execute(
+                "UPDATE jobs SET status = ?, error = ?, finished_at = ? WHERE id = ? AND (? IS NULL OR owner = ?)",
+                (FAILED, error, time.time(), job_id, owner, owner),
+            )
+        return cursor.rowcount > 0
+
+    def renew(self, owner):
+        """Extend the lease on every job `owner` is running. Returns the number renewed."""
+        with self._connect() as conn:
+            cursor = conn.execute(
+                "UPDATE jobs SET heartbeat_at = ? WHERE owner = ? AND status = ?", (time.time(), owner, RUNNING),
+            )
+        return cursor.rowcount
+
+    def requeue_expired(self, lease_seconds=None, max_attempts=None):
+        """
+        Return RUNNING jobs whose lease is older than `lease_seconds` (default
+        JOB_LEASE_SECONDS) to the queue, or fail them once they have been claimed
+        `max_attempts` (default JOB_MAX_ATTEMPTS) times. Returns the number requeued.
+        """
+        now = time.time()
+        cutoff = now - (JOB_LEASE_SECONDS if lease_seconds is None else lease_seconds)
+        max_attempts = JOB_MAX_ATTEMPTS if max_attempts is None else max_attempts
+        # Jobs claimed before leases existed only have started_at
+        expired = "status = ? AND COALESCE(heartbeat_at, started_at, 0) < ?"
+        with self._connect() as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                conn.execute(
+                    f"UPDATE jobs SET status = ?, error = ?, owner = NULL, finished_at = ? WHERE {expired} AND attempts >= ?",
+                    (FAILED, f"Gave up after {max_attempts} attempts: the worker running it was lost every time",
+                     now, RUNNING, cutoff, max_attempts),
+                )
+                cursor = conn.execute(
+                    f"UPDATE jobs SET status = ?, owner = NULL, frames_done = 0, heartbeat_at = NULL WHERE {expired}",
+                    (QUEUED, RUNNING, cutoff),
+                )
+                conn.execute("COMMIT")
+            except Exception:
+                conn.execute("ROLLBACK")
+                raise
+        return cursor.rowcount
+
+
+class JobQueue:
+    """
+    Bounded pool of worker threads that drain a JobStore.
+    `handler(payload, progress, job_id)` does the work and returns a JSON-serialisable result;
+    `progress(frames_done, total_frames)` may be called as often as convenient. A job that
+    is retried after its lease expired runs again with the same `job_id`.
+    A heartbeat thread renews the leases of this process's jobs and requeues the
+    expired jobs of processes that died, whichever process that was.
+    """
+
+    def __init__(self, store, handler, concurrency=1):
+        self.store = store
+        self.handler = handler
+        self.concurrency = max(1, int(concurrency))
+        self.owner = None
+        self._wakeup = threading.Condition()
+        self._threads = []
+        self._lock = threading.Lock()
+
+    def start(self):
+        """Requeue expired jobs and start the worker and heartbeat threads (idempotent)."""
+        with self._lock:
+            if self._threads:
+                return
+            self.owner = _owner_id()  # Made here, after any fork, so every worker process has its own
+            self._requeue_expired()
+            for i in range(self.concurrency):
+                thread = threading.Thread(target=self._worker, name=f"analysis-worker-{i}", daemon=True)
+                thread.start()
+                self._threads.append(thread)
+            thread = threading.Thread(target=self._heartbeat, name="analysis-heartbeat", daemon=True)
+            thread.start()
+            self._threads.append(thread)
+
+    def submit(self, payload, batch_id=None):
+        """Queue a job and return its ID."""
+        job_id = self.store.create(payload, batch_id=batch_id)
+        with self._wakeup:
+            self._wakeup.notify()
+        return job_id
+
+    def _requeue_expired(self):
+        requeued = self.store.requeue_expired()
+        if requeued:
+            print(f"--- Requeued {requeued} interrupted analysis job(s) ---")
+            with self._wakeup:
+                self._wakeup.notify_all()
+
+    def _heartbeat(self):
+        while True:
+            time.sleep(HEARTBEAT_INTERVAL_SECONDS)
+            try:
+                self.store.renew(self.owner)
+                self._requeue_expired()
+            except Exception as e:  # e.g. the database is locked; the lease still has time to run
+                print(f"Error renewing job leases: {e}")
+
+    def _worker(self):
+        while True:
+            job = self.store.claim_next(self.owner)
+            if job is None:
+                with self._wakeup:
+                    self._wakeup.wait(timeout=POLL_INTERVAL_SECONDS)
+                continue
+            self._run(job)
+
+    def _run(self, job):
+        job_id = job['id']
+        last_write = [0.0]
+
+        def progress(frames_done, total_frames):
+            now = time.monotonic()
+            if now - last_write[0] >= PROGRESS_INTERVAL_SECONDS:
+                last_write[0] = now
+                self.store.update_progress(job_id, frames_done, total_frames, owner=self.owner)
+
+        try:
+            result = self.handler(job['payload'], progress, job_id)
+        except Exception as e:
+            print(f"Error during job {job_id}: {e}")
+            recorded = self.store.fail(job_id, str(e), owner=self.owner)
+        else:
+            recorded = self.store.finish(job_id, result, owner=self.owner)
+        if not recorded:
+            print(f"Job {job_id} was requeued after its lease expired; this run's result is discarded")
@@ -0,0 +1,314 @@
+"""
+Live analysis of a continuous frame source: an RTSP/RTMP/HTTP stream, or a local file
+played back at real-time pace for testing. Impacts are published as events the moment
+they are detected, for the /live/<id>/events Server-Sent Events stream.
+
+Latency is bounded rather than throughput: a reader thread keeps only the newest
+LIVE_BUFFER_FRAMES frames, and frames that have waited longer than
+LIVE_MAX_LATENCY_SECONDS by the time inference is free are dropped unanalysed. Dropped frames
+are skipped in the session like strided ones, so speeds stay in real frame time.
+
+    python live.py rtsp://nets-camera-2/stream --camera-id nets-2
+    python live.py session.mp4        # Files are paced to their frame rate
+"""
+import argparse
+import collections
+import json
+import os
+import queue
+import threading
+import time
+import urllib.parse
+import uuid
+
+import cv2
+
+from main import (AnalysisSession, InferenceCascade, calibrate_scale, extract_detections, parse_cascade,
+                  BALL_DETECT_INTERVAL, CASCADE, CASCADE_HOLD_FRAMES)
+from metrics import metrics, StageTimer
+
+LIVE_MAX_LATENCY_SECONDS = float(os.environ.get('LIVE_MAX_LATENCY_SECONDS', 1.0))  # Older frames are dropped, not analysed
+LIVE_BATCH_SIZE = int(os.environ.get('LIVE_BATCH_SIZE', 2))  # Small batches keep per-frame latency low
+LIVE_BUFFER_FRAMES = 8  # Frames held between the reader and the analysis; the oldest are dropped when full
+LIVE_STATUS_INTERVAL = 2.0  # Seconds between status events
+LIVE_SUBSCRIBER_QUEUE = 100  # Events held for a slow client before its oldest are dropped
+LIVE_HISTORY_EVENTS = 50  # Recent impact events replayed to clients that connect late
+STREAM_SCHEMES = ('rtsp', 'rtsps', 'rtmp', 'http', 'https', 'udp', 'tcp', 'srt')
+
+LIVE_LATENCY_BUCKETS = (0.05, 0.1, 0.25, 0.5, 0.75, 1.0, 1.5, 2.5, 5.0)
+
+# --- Session States ---
+STARTING = 'starting'
+RUNNING = 'running'
+FINISHED = 'finished'  # The source ended
+STOPPED = 'stopped'
+FAILED = 'failed'
+
+
+def is_stream_url(source):
+    return source.split('://', 1)[0].lower() in STREAM_SCHEMES if '://' in source else False
+
+
+def display_source(source):
+    """The source without credentials or query string (stream URLs) or directories (files), for status output."""
+    if not is_stream_url(source):
+        return os.path.basename(source)
+    parts = urllib.parse.urlsplit(source)
+    return urllib.parse.urlunsplit(parts._replace(netloc=parts.netloc.rsplit('@', 1)[-1], query=''))
+
+
+class LiveAnalysis:
+    """
+    One live source analysed on its own thread. Clients subscribe() for a queue of
+    event dicts: "impact" (frame, speed_kmh, category, latency_ms), "ball_exit" once the
+    ball's exit speed is known, periodic "status", and a final "end".
+    `realtime` paces reads to the source frame rate; it defaults to on for files.
+    `on_finish(stats)`, if given, receives the session's final stats once the source ends or is stopped.
+    With `remove_source`, the source file (e.g. an uploaded test video) is deleted once the analysis ends.
+    """
+
+    def __init__(self, source, camera_id=None, realtime=None, max_latency=None, batch_size=None, cascade=None, on_finish=None,
+                 remove_source=False):
+        self.id = uuid.uuid4().hex
+        self.source = source
+        self.remove_source = remove_source
+        self.camera_id = camera_id
+        self.realtime = (not is_stream_url(source)) if realtime is None else realtime
+        self.max_latency = LIVE_MAX_LATENCY_SECONDS if max_latency is None else max_latency
+        self.batch_size = max(1, int(batch_size or LIVE_BATCH_SIZE))
+        self.cascade = cascade if isinstance(cascade, dict) else parse_cascade(CASCADE if cascade is None else cascade)
+        self.on_finish = on_finish
+        self.state = STARTING
+        self.error = None
+        self.started_at = time.time()
+        self.ended_at = None
+        self.counts = {"frames_read": 0, "frames_analysed": 0, "frames_dropped": 0, "impacts": 0}
+        self.last_latency_ms = None
+        self._stop_event = threading.Event()
+        self._frames = collections.deque(maxlen=LIVE_BUFFER_FRAMES)
+        self._frames_ready = threading.Condition()
+        self._source_done = False
+        self._subscribers = []
+        self._history = collections.deque(maxlen=LIVE_HISTORY_EVENTS)
+        self._events_lock = threading.Lock()
+        self._thread = None
+
+    # --- Events ---
+
+    def subscribe(self):
+        """A queue of events from now on, starting with recent impacts (and "end" if already over)."""
+        q = queue.Queue(maxsize=LIVE_SUBSCRIBER_QUEUE)
+        with self._events_lock:
+            for event in self._history:
+                q.put_nowait(event)
+            self._subscribers.append(q)
+        return q
+
+    def unsubscribe(self, q):
+        with self._events_lock:
+            if q in self._subscribers:
+                self._subscribers.remove(q)
+
+    def publish(self, event, keep=False):
+        event = dict(event, stream_id=self.id, time=round(time.time(), 3))
+        with self._events_lock:
+            if keep:
+                self._history.append(event)
+            for q in self._subscribers:
+                if q.full():  # A stalled client loses its oldest events, never blocks the analysis
+                    try:
+                        q.get_nowait()
+                    except queue.Empty:
+                        pass
+                q.put_nowait(event)
+
+    def status(self):
+        return {
+            "stream_id": self.id,
+            "source": display_source(self.source),
+            "state": self.state,
+            "error": self.error,
+            "realtime": self.realtime,
+            "max_latency_seconds": self.max_latency,
+            "last_latency_ms": self.last_latency_ms,
+            "started_at": self.started_at,
+            "ended_at": self.ended_at,
+            **self.counts,
+        }
+
+    # --- Lifecycle ---
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name=f"live-{self.id[:8]}", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop_event.set()
+        with self._frames_ready:
+            self._frames_ready.notify_all()
+
+    @property
+    def active(self):
+        return self.state in (STARTING, RUNNING)
+
+    def _read(self, cap, fps, first_frame=0):
+        """
+        Reader thread: keeps the newest frames, tagged with their 1-based frame number in the
+        source and their capture time. `first_frame` frames were already read (by calibration).
+        """
+        paced_start = time.monotonic()
+        number = first_frame
+        try:
+            while not self._stop_event.is_set():
+                success, frame = cap.read()
+                if not success:
+                    break
+                number += 1
+                read = number - first_frame
+                if self.realtime and fps > 0:
+                    delay = paced_start + read / fps - time.monotonic()
+                    if delay > 0:
+                        time.sleep(delay)
+                with self._frames_ready:
+                    if len(self._frames) == self._frames.maxlen:
+                        self._drop(1)  # The deque evicts the oldest
+                    self._frames.append((number, time.monotonic(), frame))
+                    self.counts["frames_read"] = read
+                    self._frames_ready.notify()
+        finally:
+            with self._frames_ready:
+                self._source_done = True
+                self._frames_ready.notify_all()
+
+    def _drop(self, count):
+        self.counts["frames_dropped"] += count
+        metrics.counter('live_frames_dropped_total', 'Live frames dropped to bound latency').inc(count)
+
+    def _next_batch(self):
+        """Up to batch_size buffered frames, after dropping any older than max_latency; None once the source ends."""
+        with self._frames_ready:
+            while not self._frames and not self._source_done and not self._stop_event.is_set():
+                self._frames_ready.wait(0.5)
+            if not self._frames:
+                return None
+            now = time.monotonic()
+            stale = 0
+            while self._frames and now - self._frames[0][1] > self.max_latency:
+                self._frames.popleft()
+                stale += 1
+            if stale:
+                self._drop(stale)
+            return [self._frames.popleft() for _ in range(min(self.batch_size, len(self._frames)))]
+
+    def _run(self):
+        cap = None
+        reader = None
+        try:
+            cap = cv2.VideoCapture(self.source)
+            if not cap.isOpened():
+                raise RuntimeError(f"Could not open live source {display_source(self.source)}")
+            cap.set(cv2.CAP_PROP_BUFFERSIZE, 1)  # Network sources: do not let the backend queue stale frames
+            fps = cap.get(cv2.CAP_PROP_FPS) or 30.0
+            # Frames read while calibrating are not analysed; a cached camera_id makes this instant
+            pixels_per_meter, _, _, calibration_source = calibrate_scale(cap, self.camera_id)
+            # Number frames from where calibration left off, so impact frames match the source
+            first_frame = max(0, int(cap.get(cv2.CAP_PROP_POS_FRAMES)))
+            session = AnalysisSession(fps, pixels_per_meter=pixels_per_meter, first_frame=first_frame)
+            inference = InferenceCascade(self.cascade, hold=CASCADE_HOLD_FRAMES, timer=StageTimer(),
+                                         intervals={"ball": BALL_DETECT_INTERVAL})
+            reader = threading.Thread(target=self._read, args=(cap, fps, first_frame), name=f"live-read-{self.id[:8]}", daemon=True)
+            reader.start()
+            self.state = RUNNING
+            self.publish({"event": "status", "state": RUNNING, "fps": round(fps, 2),
+                          "calibration": {"source": calibration_source, "pixels_per_meter": round(pixels_per_meter, 2)}})
+            self._analyse(session, inference)
+            self.state = STOPPED if self._stop_event.is_set() else FINISHED
+            if self.on_finish:
+                session.finish_tracking()
+                session.processing_stats["calibration"] = {"source": calibration_source, "pixels_per_meter": round(pixels_per_meter, 2)}
+                try:
+                    self.on_finish(session.final_stats())
+                except Exception as e:  # The analysis itself succeeded
+                    print(f"Live analysis {self.id}: on_finish failed: {e}")
+        except Exception as e:
+            print(f"Live analysis {self.id} failed: {e}")
+            self.state, self.error = FAILED, str(e)
+        finally:
+            self._stop_event.set()
+            if reader is not None:
+                reader.join()
+            if cap is not None:
+                cap.release()
+            if self.remove_source:
+                try:
+                    os.remove(self.source)
+                except OSError:
+                    pass
+            self.ended_at = time.time()
+            self.publish({"event": "end", "state": self.state, "error": self.error, **self.counts}, keep=True)
+
+    def _analyse(self, session, inference):
+        latency = metrics.histogram('live_impact_latency_seconds', 'Capture-to-event latency of live impacts',
+                                    buckets=LIVE_LATENCY_BUCKETS)
+        last_status = time.monotonic()
+        published_exits = set()
+        while not self._stop_event.is_set():
+            batch = self._next_batch()
+            if batch is None:
+                break
+            if not batch:
+                continue
+            results = inference.run([frame for _, _, frame in batch])
+            for index, ((number, captured, frame), (result_bat, result_ball, result_pose)) in enumerate(zip(batch, results)):
+                while session.processing_stats['frame_count'] < number - 1:
+                    session.skip_frame()  # Dropped frames
+                if result_ball is None and session.ball_near_bat():
+                    result_ball = inference.run_skipped("ball", frame, index)  # The ball may reach the bat mid-batch
+                impacts_before = len(session.processing_stats["impacts"])
+                annotations = session.process_frame(extract_detections(result_bat, result_ball, result_pose))
+                self.counts["frames_analysed"] += 1
+                self.last_latency_ms = round(1000 * (time.monotonic() - captured), 1)
+                for impact in session.processing_stats["impacts"][impacts_before:]:
+                    self.counts["impacts"] += 1
+                    latency.observe(time.monotonic() - captured)
+                    self.publish({"event": "impact", "frame": impact["frame"], "speed_kmh": impact["speed_kmh"],
+                                  "category": impact["category"], "location": list(impact["location"]),
+                                  "latency_ms": self.last_latency_ms}, keep=True)
+            for impact in session.processing_stats["impacts"]:
+                if impact.get("exit_speed_kmh") is not None and impact["frame"] not in published_exits:
+                    published_exits.add(impact["frame"])
+                    self.publish({"event": "ball_exit", "frame": impact["frame"],
+                                  "exit_speed_kmh": impact["exit_speed_kmh"]}, keep=True)
+            inference.dense = {"ball"} if session.ball_near_bat() else set()
+            now = time.monotonic()
+            if now - last_status >= LIVE_STATUS_INTERVAL:
+                last_status = now
+                self.publish({"event": "status", "state": self.state, "last_latency_ms": self.last_latency_ms,
+                              "live_bat_speed_kmh": round(float(annotations["scoreboard"]["current_speed"]), 1), **self.counts})
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Analyse a live video stream and print impact events as they happen.")
+    parser.add_argument('source', help="rtsp://, http(s):// ... stream URL, or a video file (played at real-time pace)")
+    parser.add_argument('--camera-id', help="Fixed camera setup, to reuse its cached calibration")
+    parser.add_argument('--max-latency', type=float, help=f"Seconds (default {LIVE_MAX_LATENCY_SECONDS})")
+    parser.add_argument('--no-realtime', action='store_true', help="Read files as fast as possible instead of at their frame rate")
+    args = parser.parse_args()
+
+    live = LiveAnalysis(args.source, camera_id=args.camera_id, max_latency=args.max_latency,
+                        realtime=False if args.no_realtime else None)
+    events = live.subscribe()
+    live.start()
+    try:
+        while True:
+            event = events.get()
+            print(json.dumps(event))
+            if event["event"] == "end":
+                break
+    except KeyboardInterrupt:
+        live.stop()
+
+
+if __name__ == "__main__":
+    main()
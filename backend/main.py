@@ -1,58 +1,132 @@
 import cv2
 import numpy as np
-from ultralytics import YOLO
-from collections import deque
+import contextlib
+import functools
+import json
 import math
+import os
+import queue
+import threading
+import time
+from collections import deque
+
+from metrics import metrics, StageTimer, VIDEO_BUCKETS
+from models import registry, INFERENCE_BACKEND, INFERENCE_INT8
+from tracking import MultiObjectTracker, box_iou
+from track_store import DetectionRecorder, read_tracks, track_path_for
+from video_output import open_video_writer
 
 # --- Model Loading ---
-# Load YOLO models for bat, ball, stump, and pose detection
-bat_model = YOLO('runs/detect/train/weights/best.pt')  # Path to bat detection model
-ball_model = YOLO('runs/detect/train/weights/besst.pt')  # Path to ball detection model (ensure 'besst.pt' is correct)
-stump_model = YOLO('runs/detect/train_stumps/weights/best.pt')  # Path to stump detection model
-pose_model = YOLO('yolov8n-pose.pt')  # Pre-trained YOLOv8 pose model
+# The bat, ball, stump and pose models live in the shared model registry (see models.py),
+# which loads them on first use on the configured inference backend.
 
 # --- Dynamically Find Class Indices ---
 # Find class indices for 'Stumps' and 'Ball' in their respective models
-stump_class_index = next((k for k, v in stump_model.names.items() if v.lower() in ['stumps', 'stump']), 0)
-ball_class_index = next((k for k, v in ball_model.names.items() if v.lower() in ['sports ball', 'ball', 'cricket_ball', 'cricket-ball']), -1)
+def stump_class_index():
+    return next((k for k, v in registry.get("stump").names.items() if v.lower() in ['stumps', 'stump']), 0)
 
-print(f"Stump class index: {stump_class_index}, Ball class index: {ball_class_index}")
+def ball_class_index():
+    return next((k for k, v in registry.get("ball").names.items() if v.lower() in ['sports ball', 'ball', 'cricket_ball', 'cricket-ball']), -1)
 
 # --- Constants ---
 STUMP_HEIGHT_METERS = 0.711  # Standard cricket stump height in meters
 IMPACT_DISPLAY_FRAMES = 30  # Frames to display impact information
 IMPACT_COOLDOWN_FRAMES = 15  # Minimum frames between consecutive impacts
+IMPACT_DISTANCE_METERS = 0.5  # Max bat-ball distance for an impact; reduced for more precise impact timing
 FONT = cv2.FONT_HERSHEY_SIMPLEX  # Font for text overlay
 MIN_SPEED_THRESHOLD = 15  # Minimum speed in km/h to consider an impact valid
 MAX_SPEED_THRESHOLD = 250  # Maximum plausible speed in km/h
 POWER_HIT_THRESHOLD = 100 # Speed in km/h to classify a "Power Hit"
 
-# --- Global State (Reset for each analysis) ---
-# It's better to manage state via a class or pass it through functions,
-# but we'll reset globals for this refactoring.
-def reset_analysis_state():
-    """Resets all global variables to their initial state."""
-    global pixels_per_meter, bat_history, ball_history, left_wrist_history, right_wrist_history
-    global last_impact_frame, last_impact_speed, impact_count, last_impact_location, processing_stats
-    
-    pixels_per_meter = None
-    bat_history = deque(maxlen=10)
-    ball_history = deque(maxlen=10)
-    left_wrist_history = deque(maxlen=10)
-    right_wrist_history = deque(maxlen=10)
-    last_impact_frame = -IMPACT_COOLDOWN_FRAMES - 1
-    last_impact_speed = 0
-    impact_count = 0
-    last_impact_location = None
-    processing_stats = {"frame_count": 0, "impacts": []}
+# --- Calibration Settings ---
+CALIBRATION_WINDOW = 150  # Stumps are searched for in this many leading frames
+CALIBRATION_SAMPLES = int(os.environ.get('ANALYSIS_CALIBRATION_SAMPLES', 10))  # Frames in the window run through the stump model
+CALIBRATION_MAX_BUFFER = 60  # Decoded calibration frames kept for the main pass before falling back to reopening the video
+CALIBRATION_CACHE_PATH = os.environ.get('ANALYSIS_CALIBRATION_CACHE', 'calibration_cache.json')
+CALIBRATION_HASH_DISTANCE = 6  # Max differing bits between first-frame hashes of the same camera setup
+# Also reuse scales across uploads without a camera ID, matched by first-frame hash (opt-in)
+CALIBRATION_FINGERPRINT = os.environ.get('ANALYSIS_CALIBRATION_FINGERPRINT', '0') == '1'
+CALIBRATION_MIN_CONTRAST = 10.0  # Grey-level std. dev. a first frame needs before it is fingerprinted...
+CALIBRATION_MIN_DETAIL = 20.0  # ...and Laplacian variance; black, fade-in and flat frames all hash alike
+CALIBRATION_VERIFY_IOU = 0.5  # Overlap a fresh stump detection needs with a cached box to trust its scale
+
+# --- Inference Settings ---
+# Number of decoded frames sent to each model in a single forward pass.
+# Larger batches amortise per-call overhead on CPU workers.
+BATCH_SIZE = int(os.environ.get('ANALYSIS_BATCH_SIZE', 8))
+# Bounded queue sizes (in frames) between the decode, inference and encode stages.
+READ_QUEUE_SIZE = int(os.environ.get('ANALYSIS_READ_QUEUE_SIZE', 32))
+WRITE_QUEUE_SIZE = int(os.environ.get('ANALYSIS_WRITE_QUEUE_SIZE', 32))
+PROGRESS_LOG_INTERVAL = float(os.environ.get('ANALYSIS_PROGRESS_LOG_INTERVAL', 5.0))  # Seconds between progress log lines
+
+# --- Adaptive Frame Stride ---
+# With a stride k > 1 only every k-th frame is decoded and run through the detectors;
+# the frames in between are only grabbed. A frame-difference motion score near the
+# batsman drops the stride back to 1 so impacts are not missed.
+FRAME_STRIDE = int(os.environ.get('ANALYSIS_FRAME_STRIDE', 1))
+MOTION_THRESHOLD = float(os.environ.get('ANALYSIS_MOTION_THRESHOLD', 6.0))  # Mean abs. grey-level difference
+MOTION_HOLD_FRAMES = 30  # Frames to stay at stride 1 after a motion spike
+MOTION_SAMPLE_WIDTH = 160  # Width frames are downscaled to before scoring motion
+MOTION_WINDOW_FRACTION = 0.25  # Half-size of the scored window around the bat, as a fraction of the frame
 
-# Initialize state
-reset_analysis_state()
+# --- Region of Interest ---
+# When enabled, the detectors run on a crop around the bat and stumps instead of the
+# full frame. The crop falls back to the full frame once the bat has been lost.
+ROI_ENABLED = os.environ.get('ANALYSIS_ROI', '0') == '1'
+ROI_MARGIN = 0.5  # Margin added on each side, as a fraction of the tracked region's larger side
+ROI_MIN_FRACTION = 0.35  # Minimum crop width/height as a fraction of the frame
+ROI_MAX_AREA_FRACTION = 0.8  # Use the full frame when the crop would cover more than this
+ROI_LOST_FRAMES = 10  # Inferred frames without a bat before falling back to the full frame
 
+# --- Cascaded Inference ---
+# "gated:gate" pairs: the gated model only runs on frames where the gate model found
+# something. Pose and ball output is only used alongside a bat, so both are gated on
+# the bat detector by default. Set ANALYSIS_CASCADE="" to run every model on every frame.
+CASCADE = os.environ.get('ANALYSIS_CASCADE', 'pose:bat,ball:bat')
+CASCADE_HOLD_FRAMES = int(os.environ.get('ANALYSIS_CASCADE_HOLD_FRAMES', 0))  # Keep a gate open this many frames after its last detection
+
+# --- Tracking ---
+# Bat and ball detections feed constant-velocity Kalman trackers (see tracking.py), which
+# smooth the positions used for speeds and impacts and predict through missed frames.
+# That lets the ball detector skip frames while no ball is near the bat.
+BAT_TRACK_GATE_METERS = 0.5  # Max distance between a track's prediction and its next detection
+BALL_TRACK_GATE_METERS = 1.0
+TRACK_MAX_AGE = 10  # Frames a track is predicted without a detection before it is dropped
+BALL_DETECT_INTERVAL = int(os.environ.get('ANALYSIS_BALL_INTERVAL', 2))  # Run the ball detector on every k-th inferred frame...
+BALL_DENSE_DISTANCE_METERS = 2.0  # ...and on every frame while a tracked ball is this close to a bat
+BALL_FOLLOW_FRAMES = 15  # Frames of ball flight after an impact used for its trajectory and exit speed
+
+# --- Output ---
+# "full" writes the whole annotated video. "highlights" renders and encodes only short
+# clips around each impact, back to back in one reel. "stats" skips rendering and
+# encoding entirely and only returns the stats.
+OUTPUT_MODES = ('full', 'highlights', 'stats')
+OUTPUT_MODE = os.environ.get('ANALYSIS_OUTPUT_MODE', 'full')
+HIGHLIGHT_BEFORE_SECONDS = 1.0  # Clip length before an impact
+HIGHLIGHT_AFTER_SECONDS = 1.5  # Clip length after an impact
+
+def analysis_params():
+    """The default settings that affect analysis output, e.g. for keying cached results."""
+    return {
+        "impact_cooldown_frames": IMPACT_COOLDOWN_FRAMES,
+        "impact_distance_meters": IMPACT_DISTANCE_METERS,
+        "min_speed": MIN_SPEED_THRESHOLD,
+        "max_speed": MAX_SPEED_THRESHOLD,
+        "frame_stride": FRAME_STRIDE,
+        "motion_threshold": MOTION_THRESHOLD,
+        "roi": ROI_ENABLED,
+        "cascade": CASCADE,
+        "cascade_hold_frames": CASCADE_HOLD_FRAMES,
+        "ball_detect_interval": BALL_DETECT_INTERVAL,
+        "output_mode": OUTPUT_MODE,
+        "calibration_samples": CALIBRATION_SAMPLES,
+        "inference_backend": INFERENCE_BACKEND,
+        "inference_int8": INFERENCE_INT8,
+    }
 
 # --- Helper Functions ---
 
-def get_power_hit_category(speed_kmh):
+def get_power_hit_category(speed_kmh, min_speed=MIN_SPEED_THRESHOLD):
     """Categorizes the speed of a hit."""
     if speed_kmh > 150:
         return "Brutal Power"
@@ -60,292 +134,1315 @@ def get_power_hit_category(speed_kmh):
         return "Excellent"
     elif speed_kmh > 80:
         return "Well-Timed Power"
-    elif speed_kmh >= MIN_SPEED_THRESHOLD:
+    elif speed_kmh >= min_speed:
         return "Timing Shot"
     return "N/A"
 
+def impact_summary(impacts, min_speed=MIN_SPEED_THRESHOLD):
+    """Speed figures over a list of impacts; empty if there are none."""
+    if not impacts:
+        return {}
+    speeds = [imp['speed_kmh'] for imp in impacts]
+    summary = {
+        "average_speed_kmh": round(sum(speeds) / len(speeds), 2),
+        "max_speed_kmh": round(max(speeds), 2),
+        "power_hit_category": get_power_hit_category(max(speeds), min_speed),
+    }
+    exit_speeds = [imp['exit_speed_kmh'] for imp in impacts if imp.get('exit_speed_kmh') is not None]
+    if exit_speeds:
+        summary["max_exit_speed_kmh"] = round(max(exit_speeds), 2)
+    return summary
+
 def calculate_distance(p1, p2):
     """Calculate Euclidean distance between two points."""
     return math.sqrt((p1[0] - p2[0])**2 + (p1[1] - p2[1])**2)
 
-def calculate_peak_speed(history, fps):
-    """
-    Calculates the PEAK speed from the last few frames to find the true power of a swing.
-    This is more robust than averaging or using only two points.
-    """
-    if len(history) < 2 or pixels_per_meter is None:
-        return 0
-    
-    max_speed = 0
-    # Iterate through consecutive pairs of points in the history
-    for i in range(len(history) - 1):
-        (frame1, pos1), (frame2, pos2) = history[i], history[i+1]
-        
-        frame_diff = frame2 - frame1
-        if frame_diff <= 0:
-            continue
-            
-        pixel_dist = calculate_distance(pos1, pos2)
-        time_interval = frame_diff / fps
-        
-        if time_interval <= 0:
-            continue
-
-        pixel_speed_per_sec = pixel_dist / time_interval
-        meter_speed_per_sec = pixel_speed_per_sec / pixels_per_meter
-        kmh = meter_speed_per_sec * 3.6
-        
-        if kmh > max_speed:
-            max_speed = kmh
-            
-    return max_speed
-
 def detect_stumps(frame):
-    """Detect stumps in the frame and return the height of the best detection."""
-    results = stump_model(frame, conf=0.25, verbose=False)
-    if results and results[0].boxes:
-        stump_boxes = [b for b in results[0].boxes if int(b.cls) == stump_class_index]
-        if stump_boxes:
-            best_stump = max(stump_boxes, key=lambda x: x.conf)
-            return best_stump.xywh[0][3].item()  # Height in pixels
+    """Detect stumps in the frame and return the (x1, y1, x2, y2) box of the best detection."""
+    results = registry.predict("stump", frame, verbose=False, **STUMP_DETECTOR)
+    if results:
+        xyxy, conf, _ = extract_boxes(results[0], stump_class_index())
+        if len(conf):
+            return tuple(int(v) for v in xyxy[np.argmax(conf)])
     return None
 
-def setup_scaling_factor(cap):
-    """Set up the scaling factor by detecting stumps in the first 150 frames."""
+def setup_scaling_factor(cap, replay=None, samples=None):
+    """
+    Set up the scaling factor by running the stump detector on `samples` frames spread
+    over the first CALIBRATION_WINDOW frames. `replay` holds frames already read from `cap`.
+    Returns (pixels_per_meter, stump_box, replay_frames): replay_frames are all frames
+    decoded so far, for the main pass to consume before reading from `cap` again, or None
+    if more than CALIBRATION_MAX_BUFFER frames were read and the caller must reopen the video.
+    """
+    step = max(1, CALIBRATION_WINDOW // max(1, int(samples or CALIBRATION_SAMPLES)))
+    frames = list(replay or [])
+    keep = True
     print("--- Searching for stumps to set scale... ---")
-    for i in range(150):
-        success, frame = cap.read()
-        if not success:
+    for i in range(CALIBRATION_WINDOW):
+        sampled = i % step == 0
+        if i < len(frames):
+            frame = frames[i]
+        elif keep or sampled:
+            success, frame = cap.read()
+            if not success:
+                break
+            if keep:
+                frames.append(frame)
+                if len(frames) > CALIBRATION_MAX_BUFFER:
+                    keep, frames = False, []
+        elif not cap.grab():  # Unsampled frames are not decoded once we stop buffering
             break
-        stump_height = detect_stumps(frame)
+        if not sampled:
+            continue
+        stump_box = detect_stumps(frame)
+        stump_height = stump_box[3] - stump_box[1] if stump_box else None  # Height in pixels
         if stump_height and stump_height > 20:  # Ensure detection is reasonable
             ppm = stump_height / STUMP_HEIGHT_METERS
             print(f"--- Scale Established (frame {i}): {ppm:.2f} px/m ---")
-            cap.set(cv2.CAP_PROP_POS_FRAMES, 0)  # Reset video to start
-            return ppm
+            return ppm, stump_box, frames if keep else None
     print("--- Could not find stumps. Using default scale. ---")
-    cap.set(cv2.CAP_PROP_POS_FRAMES, 0)
-    return 100.0  # Default scale if stumps not found
-
-def draw_scoreboard(frame, fps, current_speed, min_dist):
-    """Draw a scoreboard overlay on the frame with analysis information."""
-    h, w, _ = frame.shape
-    overlay = np.zeros((70, w, 3), dtype=np.uint8)
-    frame[0:70, 0:w] = cv2.addWeighted(frame[0:70, 0:w], 0.3, overlay, 0.7, 0)
-    scale_status = "SET" if pixels_per_meter else "NOT SET"
-    scale_color = (0, 255, 0) if pixels_per_meter else (0, 0, 255)
-    impact_active = (processing_stats['frame_count'] - last_impact_frame) < IMPACT_DISPLAY_FRAMES
+    return 100.0, None, frames if keep else None  # Default scale if stumps not found
+
+# --- Calibration Cache ---
+# Fixed net cameras produce the same scale on every upload, so established scales are
+# cached on disk, keyed by an explicit camera ID. With CALIBRATION_FINGERPRINT on, videos
+# without one are also keyed by resolution plus an average hash of their first frame
+# (matched within CALIBRATION_HASH_DISTANCE bits), provided that frame has enough detail
+# to tell setups apart. A cached scale is only used once the stumps are re-detected where
+# the cache says they were, so a moved camera is recalibrated rather than mismeasured.
+_calibration_cache_lock = threading.Lock()
+
+def frame_fingerprint(frame):
+    """64-bit average hash of a frame, as an int."""
+    gray = cv2.cvtColor(cv2.resize(frame, (8, 8), interpolation=cv2.INTER_AREA), cv2.COLOR_BGR2GRAY)
+    bits = (gray > gray.mean()).flatten()
+    return int("".join("1" if b else "0" for b in bits), 2)
+
+def has_fingerprint_detail(frame):
+    """Whether a frame has the contrast and edges for its fingerprint to identify a camera setup."""
+    h, w = frame.shape[:2]
+    scale = MOTION_SAMPLE_WIDTH / w
+    small = cv2.resize(frame, (MOTION_SAMPLE_WIDTH, max(1, int(h * scale))), interpolation=cv2.INTER_AREA)
+    gray = cv2.cvtColor(small, cv2.COLOR_BGR2GRAY)
+    return gray.std() >= CALIBRATION_MIN_CONTRAST and cv2.Laplacian(gray, cv2.CV_64F).var() >= CALIBRATION_MIN_DETAIL
+
+def _calibration_key(camera_id, frame):
+    """Cache key for this camera or first frame, or None if it should not be cached."""
+    if camera_id:
+        return f"camera:{camera_id}"
+    if not CALIBRATION_FINGERPRINT or not has_fingerprint_detail(frame):
+        return None
+    h, w = frame.shape[:2]
+    return f"video:{w}x{h}:{frame_fingerprint(frame):016x}"
+
+def _load_calibration_cache():
+    try:
+        with open(CALIBRATION_CACHE_PATH) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+def lookup_calibration(camera_id, frame):
+    """Return the cached entry for this camera or video fingerprint, or None."""
+    key = _calibration_key(camera_id, frame)
+    if key is None:
+        return None
+    with _calibration_cache_lock:
+        cache = _load_calibration_cache()
+    if camera_id:
+        return cache.get(key)
+    h, w = frame.shape[:2]
+    fingerprint = frame_fingerprint(frame)
+    for key, entry in cache.items():
+        if key.startswith("video:") and entry["size"] == [w, h] \
+                and bin(entry["fingerprint"] ^ fingerprint).count("1") <= CALIBRATION_HASH_DISTANCE:
+            return entry
+    return None
+
+def store_calibration(camera_id, frame, pixels_per_meter, stump_box):
+    key = _calibration_key(camera_id, frame)
+    if key is None:
+        return
+    h, w = frame.shape[:2]
+    entry = {"pixels_per_meter": pixels_per_meter, "stump_box": list(stump_box),
+             "size": [w, h], "fingerprint": frame_fingerprint(frame)}
+    with _calibration_cache_lock:
+        cache = _load_calibration_cache()
+        cache[key] = entry
+        tmp_path = f"{CALIBRATION_CACHE_PATH}.{os.getpid()}.tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(cache, f)
+        os.replace(tmp_path, CALIBRATION_CACHE_PATH)  # Atomic, so other processes never see a partial file
+
+def stumps_match(frame, stump_box):
+    """Whether the stumps detected in `frame` are where `stump_box` says they are."""
+    detected = detect_stumps(frame)
+    if detected is None:
+        return False
+    iou = box_iou(np.array([detected], dtype=np.float64), np.array([stump_box], dtype=np.float64))
+    return iou[0, 0] >= CALIBRATION_VERIFY_IOU
+
+def calibrate_scale(cap, camera_id=None):
+    """
+    Establish pixels_per_meter for a freshly opened video, using the calibration cache
+    when possible. Returns (pixels_per_meter, stump_box, replay_frames, source), where
+    source is "cache", "detected" or "default"; see setup_scaling_factor for replay_frames.
+    """
+    success, first_frame = cap.read()
+    if not success:
+        return 100.0, None, [], "default"
+
+    cached = lookup_calibration(camera_id, first_frame)
+    if cached and stumps_match(first_frame, cached["stump_box"]):
+        print(f"--- Scale loaded from calibration cache: {cached['pixels_per_meter']:.2f} px/m ---")
+        return cached["pixels_per_meter"], tuple(cached["stump_box"]), [first_frame], "cache"
+    if cached:
+        print("--- Cached stump position not confirmed in the first frame; recalibrating ---")
+
+    pixels_per_meter, stump_box, replay_frames = setup_scaling_factor(cap, replay=[first_frame])
+    if stump_box is None:
+        return pixels_per_meter, None, replay_frames, "default"
+    store_calibration(camera_id, first_frame, pixels_per_meter, stump_box)
+    return pixels_per_meter, stump_box, replay_frames, "detected"
+
+# --- Overlay Rendering ---
+# Annotations are drawn in place on the decoded frame, which nothing reads once it has
+# been queued for the writer. Labels that rarely change are rasterised once into cached
+# coverage masks and stamped onto each frame. Where cv2.putText draws binary text
+# (OpenCV 4 without anti-aliasing) the result is identical to calling it every frame;
+# OpenCV 5 always anti-aliases, and blending the cached coverage lands within one grey
+# level of it on the glyph edges.
+SCOREBOARD_HEIGHT = 70
+SCOREBOARD_BRIGHTNESS = 0.3  # The band behind the scoreboard keeps this much of the frame
+
+@functools.lru_cache(maxsize=256)
+def _text_mask(text, scale, thickness):
+    """
+    Glyph coverage of `text` (uint8, 255 where fully inked) cropped to its ink, its solid
+    and partially covered pixels as boolean masks, and the text origin's offset inside it.
+    """
+    (text_w, text_h), baseline = cv2.getTextSize(text, FONT, scale, thickness)
+    # Glyphs such as ( [ | reach past the size getTextSize reports, so render with room to spare
+    pad = text_h + baseline + thickness
+    canvas = np.zeros((text_h + baseline + 2 * pad, text_w + 2 * pad), dtype=np.uint8)
+    origin = (pad, pad + text_h)
+    cv2.putText(canvas, text, origin, FONT, scale, 255, thickness)
+    ys, xs = np.nonzero(canvas)
+    if not len(xs):  # Nothing to draw, e.g. whitespace
+        empty = np.zeros((0, 0), dtype=np.uint8)
+        return empty, empty > 0, empty > 0, (0, 0)
+    x0, y0 = int(xs.min()), int(ys.min())
+    coverage = canvas[y0:int(ys.max()) + 1, x0:int(xs.max()) + 1]
+    return coverage, coverage == 255, (coverage > 0) & (coverage < 255), (origin[0] - x0, origin[1] - y0)
+
+def stamp_text(frame, text, org, scale, color, thickness):
+    """cv2.putText through the glyph mask cache, for text that repeats across frames."""
+    coverage, solid, partial, (ox, oy) = _text_mask(text, scale, thickness)
+    x0, y0 = org[0] - ox, org[1] - oy
+    h, w = frame.shape[:2]
+    fx0, fy0 = max(0, x0), max(0, y0)
+    fx1, fy1 = min(w, x0 + coverage.shape[1]), min(h, y0 + coverage.shape[0])
+    if fx0 >= fx1 or fy0 >= fy1:
+        return
+    region = frame[fy0:fy1, fx0:fx1]
+    crop = np.s_[fy0 - y0:fy1 - y0, fx0 - x0:fx1 - x0]
+    region[solid[crop]] = color
+    edge = partial[crop]
+    if edge.any():
+        alpha = coverage[crop][edge].astype(np.uint32)[:, None]
+        ink = np.asarray(color, dtype=np.uint32)
+        region[edge] = ((region[edge] * (255 - alpha) + ink * alpha + 127) // 255).astype(np.uint8)
+
+def draw_scoreboard(frame, scoreboard):
+    """Draw a scoreboard overlay in place on the frame from an AnalysisSession.scoreboard_state() snapshot."""
+    band = frame[0:SCOREBOARD_HEIGHT]  # Full-width rows, so a contiguous view
+    cv2.convertScaleAbs(band, dst=band, alpha=SCOREBOARD_BRIGHTNESS)  # Equivalent to blending with black
+    scale_status = "SET" if scoreboard['scale_set'] else "NOT SET"
+    scale_color = (0, 255, 0) if scoreboard['scale_set'] else (0, 0, 255)
+    impact_active = scoreboard['impact_active']
     impact_status = "IMPACT!" if impact_active else "---"
     impact_color = (0, 0, 255) if impact_active else (255, 255, 255)
-    cv2.putText(frame, f"Scale: {scale_status}", (20, 25), FONT, 0.7, scale_color, 2)
-    cv2.putText(frame, f"Impact: {impact_status}", (220, 25), FONT, 0.7, impact_color, 2)
-    cv2.putText(frame, f"Speed: {current_speed:.1f} km/h", (420, 25), FONT, 0.7, (255, 255, 0), 2)
-    cv2.putText(frame, f"Impact Speed: {last_impact_speed:.1f} km/h", (20, 55), FONT, 0.7, (50, 205, 255), 2)
-    cv2.putText(frame, f"Shots: {impact_count}", (420, 55), FONT, 0.7, (255, 255, 255), 2)
+    stamp_text(frame, f"Scale: {scale_status}", (20, 25), 0.7, scale_color, 2)
+    stamp_text(frame, f"Impact: {impact_status}", (220, 25), 0.7, impact_color, 2)
+    cv2.putText(frame, f"Speed: {scoreboard['current_speed']:.1f} km/h", (420, 25), FONT, 0.7, (255, 255, 0), 2)
+    stamp_text(frame, f"Impact Speed: {scoreboard['last_impact_speed']:.1f} km/h", (20, 55), 0.7, (50, 205, 255), 2)
+    stamp_text(frame, f"Shots: {scoreboard['impact_count']}", (420, 55), 0.7, (255, 255, 255), 2)
     
     # Display "POWER HIT" if applicable
-    if impact_active and last_impact_speed > POWER_HIT_THRESHOLD:
-        cv2.putText(frame, "POWER HIT!", (650, 55), FONT, 0.7, (0, 0, 255), 2)
-
-    if min_dist is not None:
-        cv2.putText(frame, f"Min Dist: {min_dist:.1f}px", (650, 25), FONT, 0.7, (255, 0, 255), 2)
-
-def detect_impact(bat_centers, ball_centers, fps, bat_history, left_wrist_history, right_wrist_history, threshold):
-    """Detect bat-ball impact and calculate speed, with fallback to bat speed."""
-    global last_impact_frame, last_impact_speed, impact_count, last_impact_location, processing_stats
-    if not bat_centers or not ball_centers:
-        return False, None
-        
-    frame_count = processing_stats['frame_count']
-    if (frame_count - last_impact_frame) < IMPACT_COOLDOWN_FRAMES:
-        return False, None
-        
-    min_distance = float('inf')
-    impact_location = None
-    for bat_center in bat_centers:
-        for ball_center in ball_centers:
-            distance = calculate_distance(bat_center, ball_center)
-            if distance < min_distance:
-                min_distance = distance
-                impact_location = bat_center
-                
-    if min_distance < threshold:
-        # Prioritize wrist speed, but fall back to bat speed for robustness
-        speed_left = calculate_peak_speed(left_wrist_history, fps)
-        speed_right = calculate_peak_speed(right_wrist_history, fps)
-        
-        # Always consider bat speed as a potential source for the hit's power
-        bat_speed = calculate_peak_speed(bat_history, fps)
-        
-        current_speed = max(speed_left, speed_right, bat_speed)
-
-        if MIN_SPEED_THRESHOLD < current_speed < MAX_SPEED_THRESHOLD:
-            last_impact_speed = current_speed
-            last_impact_frame = frame_count
-            impact_count += 1
-            last_impact_location = impact_location
+    if impact_active and scoreboard['last_impact_speed'] > POWER_HIT_THRESHOLD:
+        stamp_text(frame, "POWER HIT!", (650, 55), 0.7, (0, 0, 255), 2)
+
+    if scoreboard['min_dist'] is not None:
+        cv2.putText(frame, f"Min Dist: {scoreboard['min_dist']:.1f}px", (650, 25), FONT, 0.7, (255, 0, 255), 2)
+
+# --- Result Extraction ---
+# Each model's output is converted to NumPy in one shot per frame; everything
+# downstream works on these arrays instead of per-box tensor accessors.
+
+def extract_boxes(result, class_index=-1, offset=(0, 0)):
+    """
+    Return (xyxy, conf, cls) arrays for a detection result, keeping only `class_index`
+    unless it is -1 and shifting coordinates by `offset`. None yields empty arrays.
+    """
+    if result is None or result.boxes is None or len(result.boxes) == 0:
+        return np.zeros((0, 4), dtype=np.float32), np.zeros(0, dtype=np.float32), np.zeros(0, dtype=np.int64)
+    data = result.boxes.data.cpu().numpy()  # (N, 6): x1, y1, x2, y2, conf, cls
+    xyxy = data[:, :4].astype(np.float32) + np.array([offset[0], offset[1], offset[0], offset[1]], dtype=np.float32)
+    conf = data[:, -2].astype(np.float32)
+    cls = data[:, -1].astype(np.int64)
+    if class_index != -1:
+        keep = cls == class_index
+        xyxy, conf, cls = xyxy[keep], conf[keep], cls[keep]
+    return xyxy, conf, cls
+
+def extract_keypoints(result, offset=(0, 0)):
+    """Return a (people, keypoints, 3) array of x, y, confidence for a pose result."""
+    if result is None or result.keypoints is None or len(result.keypoints) == 0:
+        return np.zeros((0, 0, 3), dtype=np.float32)
+    kps = result.keypoints.data.cpu().numpy().astype(np.float32)
+    if kps.shape[-1] == 2:  # Model without keypoint confidences
+        kps = np.concatenate([kps, np.ones(kps.shape[:-1] + (1,), dtype=np.float32)], axis=-1)
+    kps[..., 0] += offset[0]
+    kps[..., 1] += offset[1]
+    return kps
+
+def extract_detections(result_bat, result_ball, result_pose, offset=(0, 0)):
+    """Convert one frame's model results into the arrays AnalysisSession.process_frame consumes."""
+    bat_boxes, bat_conf, _ = extract_boxes(result_bat, offset=offset)
+    ball_boxes, ball_conf, _ = extract_boxes(result_ball, ball_class_index(), offset)
+    return {
+        "bat_boxes": bat_boxes,
+        "bat_conf": bat_conf,
+        "ball_boxes": ball_boxes,
+        "ball_conf": ball_conf,
+        "keypoints": extract_keypoints(result_pose, offset),
+    }
+
+def select_batsman(keypoints, bat_center):
+    """
+    Index of the person whose confident wrist (left preferred, as in the original
+    per-person loop) is closest to the bat, or -1 if nobody has a confident wrist.
+    """
+    if keypoints.shape[0] == 0 or keypoints.shape[1] <= 10:
+        return -1
+    left_ok = keypoints[:, 9, 2] > 0.5
+    right_ok = keypoints[:, 10, 2] > 0.5
+    ref = np.where(left_ok[:, None], keypoints[:, 9, :2], keypoints[:, 10, :2])
+    dist = np.hypot(ref[:, 0] - bat_center[0], ref[:, 1] - bat_center[1])
+    dist[~(left_ok | right_ok)] = np.inf
+    best = int(np.argmin(dist))
+    return best if np.isfinite(dist[best]) else -1
+
+# --- Tracking Histories ---
+
+class Track:
+    """
+    Fixed-capacity ring buffer of (frame index, x, y) samples backed by NumPy arrays.
+    Positions are copied into float32 storage, so no detector tensors are kept alive.
+    """
+
+    def __init__(self, maxlen=10):
+        self.maxlen = maxlen
+        self._frames = np.zeros(maxlen, dtype=np.int64)
+        self._xy = np.zeros((maxlen, 2), dtype=np.float32)
+        self._start = 0
+        self._len = 0
+
+    def __len__(self):
+        return self._len
+
+    def append(self, frame, pos):
+        i = (self._start + self._len) % self.maxlen
+        self._frames[i] = frame
+        self._xy[i] = (pos[0], pos[1])
+        if self._len < self.maxlen:
+            self._len += 1
+        else:
+            self._start = (self._start + 1) % self.maxlen
+
+    def clear(self):
+        self._start = 0
+        self._len = 0
+
+    def arrays(self):
+        """Return (frames, xy) in insertion order."""
+        order = (self._start + np.arange(self._len)) % self.maxlen
+        return self._frames[order], self._xy[order]
+
+# --- Per-Video Analysis State ---
+
+class AnalysisSession:
+    """
+    Owns all per-video analysis state: scale, tracking histories, impacts and counters.
+    The models are module-level and shared, so several sessions can run in one process
+    (e.g. one per job thread) without interfering with each other.
+    The impact settings default to the module constants; reanalyze() overrides them.
+    """
+
+    def __init__(self, fps, pixels_per_meter=None, first_frame=0, impact_cooldown_frames=IMPACT_COOLDOWN_FRAMES,
+                 min_speed=MIN_SPEED_THRESHOLD, max_speed=MAX_SPEED_THRESHOLD, impact_distance_meters=IMPACT_DISTANCE_METERS):
+        self.fps = fps
+        self.pixels_per_meter = pixels_per_meter
+        self.impact_cooldown_frames = impact_cooldown_frames
+        self.min_speed = min_speed
+        self.max_speed = max_speed
+        self.impact_distance_meters = impact_distance_meters
+        self.start_frame = first_frame  # Frames before this are not reported (see drop_preroll)
+        self.bat_history = Track(maxlen=10)  # The primary bat track's positions only
+        self._primary_bat_id = None
+        ppm = pixels_per_meter or 100.0
+        self.bat_tracker = MultiObjectTracker(BAT_TRACK_GATE_METERS * ppm, max_age=TRACK_MAX_AGE)
+        self.ball_tracker = MultiObjectTracker(BALL_TRACK_GATE_METERS * ppm, max_age=TRACK_MAX_AGE)
+        self._pending_exits = []  # (impact_data, frame) awaiting the ball's flight after an impact
+        self.left_wrist_history = Track(maxlen=10)
+        self.right_wrist_history = Track(maxlen=10)
+        self.last_impact_frame = -impact_cooldown_frames - 1
+        self.last_impact_speed = 0
+        self.impact_count = 0
+        self.last_impact_location = None
+        self.processing_stats = {"frame_count": first_frame, "impacts": [], "frames_inferred": 0}
+        # Adaptive stride bookkeeping: frames skipped since the last inferred frame,
+        # and the last position of each track on an inferred frame.
+        self._skipped_frames = []
+        self._last_inferred_frame = None
+        self._last_positions = {}
+
+    @property
+    def impact_distance_threshold(self):
+        return self.impact_distance_meters * self.pixels_per_meter
+
+    def calculate_peak_speed(self, history):
+        """
+        Calculates the PEAK speed from the last few frames to find the true power of a swing.
+        This is more robust than averaging or using only two points.
+        """
+        if len(history) < 2 or self.pixels_per_meter is None or self.fps <= 0:
+            return 0
+
+        # Speeds between consecutive points in the history, in one vectorized pass
+        frames, xy = history.arrays()
+        frame_diff = np.diff(frames)
+        pixel_dist = np.hypot(*np.diff(xy, axis=0).T)
+        valid = frame_diff > 0
+        if not valid.any():
+            return 0
+        pixel_speed_per_sec = pixel_dist[valid] / (frame_diff[valid] / self.fps)
+        kmh = pixel_speed_per_sec / self.pixels_per_meter * 3.6
+        return max(0.0, float(kmh.max()))
+
+    def detect_impact(self, bat_centers, ball_centers):
+        """Detect bat-ball impact and calculate speed, with fallback to bat speed."""
+        if not bat_centers or not ball_centers:
+            return False, None
+            
+        frame_count = self.processing_stats['frame_count']
+        if (frame_count - self.last_impact_frame) < self.impact_cooldown_frames:
+            return False, None
+            
+        # Closest bat-ball pair over all combinations
+        distances = np.linalg.norm(
+            np.asarray(bat_centers, dtype=np.float32)[:, None, :] - np.asarray(ball_centers, dtype=np.float32)[None, :, :],
+            axis=2,
+        )
+        bat_idx, _ = np.unravel_index(np.argmin(distances), distances.shape)
+        min_distance = float(distances[bat_idx].min())
+        impact_location = bat_centers[bat_idx]
+
+        if min_distance < self.impact_distance_threshold:
+            # Prioritize wrist speed, but fall back to bat speed for robustness
+            speed_left = self.calculate_peak_speed(self.left_wrist_history)
+            speed_right = self.calculate_peak_speed(self.right_wrist_history)
             
-            # Store detailed impact data
-            impact_data = {
-                "frame": frame_count,
-                "speed_kmh": round(current_speed, 2),
-                "category": get_power_hit_category(current_speed),
-                "location": impact_location
-            }
-            processing_stats["impacts"].append(impact_data)
-
-            print(f"\n>>> IMPACT! Speed: {last_impact_speed:.1f} km/h at frame {frame_count}")
-            # Clear histories to prevent immediate re-triggering
-            left_wrist_history.clear()
-            right_wrist_history.clear()
-            bat_history.clear()
-            return True, min_distance
+            # Always consider bat speed as a potential source for the hit's power
+            bat_speed = self.calculate_peak_speed(self.bat_history)
             
-    return False, min_distance
+            current_speed = max(speed_left, speed_right, bat_speed)
+
+            if self.min_speed < current_speed < self.max_speed:
+                self.last_impact_speed = current_speed
+                self.last_impact_frame = frame_count
+                self.impact_count += 1
+                self.last_impact_location = impact_location
+                
+                # Store detailed impact data
+                impact_data = {
+                    "frame": frame_count,
+                    "speed_kmh": round(current_speed, 2),
+                    "category": get_power_hit_category(current_speed, self.min_speed),
+                    "location": impact_location
+                }
+                self.processing_stats["impacts"].append(impact_data)
+
+                print(f">>> IMPACT! Speed: {self.last_impact_speed:.1f} km/h at frame {frame_count}")
+                # Clear histories to prevent immediate re-triggering
+                self.left_wrist_history.clear()
+                self.right_wrist_history.clear()
+                self.bat_history.clear()
+                self._last_positions.clear()
+                return True, min_distance
+                
+        return False, min_distance
+
+    def scoreboard_state(self, current_speed, min_dist):
+        """Snapshot the values shown on the scoreboard, for draw_scoreboard() on the writer thread."""
+        return {
+            "scale_set": self.pixels_per_meter is not None,
+            "impact_active": (self.processing_stats['frame_count'] - self.last_impact_frame) < IMPACT_DISPLAY_FRAMES,
+            "current_speed": current_speed,
+            "last_impact_speed": self.last_impact_speed,
+            "impact_count": self.impact_count,
+            "min_dist": min_dist,
+        }
 
-def analyze_video(input_path, output_path):
+    def skip_frame(self):
+        """Advance past a frame that was grabbed but not inferred; its positions are interpolated later."""
+        self.processing_stats['frame_count'] += 1
+        self._skipped_frames.append(self.processing_stats['frame_count'])
+
+    def _track(self, name, history, frame_count, pos):
+        """
+        Append a position to a history. If the same track was seen on the previous inferred
+        frame, positions for the skipped frames in between are linearly interpolated first
+        so calculate_peak_speed sees a dense history.
+        """
+        last = self._last_positions.get(name)
+        if last is not None and self._skipped_frames and last[0] == self._last_inferred_frame:
+            frame0, pos0 = last
+            span = frame_count - frame0
+            for skipped in self._skipped_frames:
+                t = (skipped - frame0) / span
+                history.append(skipped, (pos0[0] + (pos[0] - pos0[0]) * t, pos0[1] + (pos[1] - pos0[1]) * t))
+        history.append(frame_count, pos)
+        self._last_positions[name] = (frame_count, pos)
+
+    def process_frame(self, detections):
+        """
+        Apply tracking and impact logic for one frame's detections, as produced by
+        extract_detections() in full-frame coordinates. Models the cascade did not run
+        on this frame simply contribute empty arrays.
+        Returns the annotations for render_annotations(); no drawing happens here so
+        rendering can run on the writer thread.
+        """
+        self.processing_stats['frame_count'] += 1
+        self.processing_stats['frames_inferred'] += 1
+        frame_count = self.processing_stats['frame_count']
+        annotations = {"bats": [], "balls": [], "wrists": [], "impact_location": None}
+
+        # Bat Detection: confirmed tracks detected on this frame, highest confidence first. Tracks only
+        # coasting on their prediction are left out: a predicted position is not evidence of an impact.
+        bat_boxes = detections["bat_boxes"].astype(np.int64)
+        bat_tracks = self.bat_tracker.confirmed(self.bat_tracker.step(frame_count, detections["bat_boxes"]))
+        bat_centers = [(int(round(x)), int(round(y))) for x, y in (track.position for track in bat_tracks)]
+        if bat_tracks:
+            primary = bat_tracks[0]
+            if primary.id != self._primary_bat_id:
+                # A different object: joining its positions to the old track's would read as a jump
+                self.bat_history.clear()
+                self._last_positions.pop(f"bat{self._primary_bat_id}", None)
+                self._primary_bat_id = primary.id
+            self._track(f"bat{primary.id}", self.bat_history, frame_count, primary.position)  # Smoothed primary bat
+        annotations["bats"] = [(tuple(box), float(conf)) for box, conf in zip(bat_boxes.tolist(), detections["bat_conf"])]
+
+        # Ball Detection (already filtered to the ball class); the tracker predicts through skipped and missed frames
+        ball_boxes = detections["ball_boxes"].astype(np.int64)
+        ball_tracks = self.ball_tracker.confirmed(self.ball_tracker.step(frame_count, detections["ball_boxes"]))
+        ball_centers = [(int(round(x)), int(round(y))) for x, y in (track.position for track in ball_tracks)]
+        annotations["balls"] = [(tuple(box), float(conf)) for box, conf in zip(ball_boxes.tolist(), detections["ball_conf"])]
+
+        # Pose Detection (Wrist Tracking)
+        keypoints = detections["keypoints"]
+        if bat_centers:
+            # Find the person closest to the primary bat
+            best_batsman_idx = select_batsman(keypoints, bat_centers[0])
+
+            # If a batsman is linked, track their wrists
+            if best_batsman_idx != -1:
+                batsman_kps = keypoints[best_batsman_idx]
+                for name, history, kp_idx, color in (("left_wrist", self.left_wrist_history, 9, (255, 0, 0)),
+                                                     ("right_wrist", self.right_wrist_history, 10, (0, 255, 0))):
+                    if batsman_kps[kp_idx, 2] > 0.5:
+                        wrist = (float(batsman_kps[kp_idx, 0]), float(batsman_kps[kp_idx, 1]))
+                        self._track(name, history, frame_count, wrist)
+                        annotations["wrists"].append(((int(wrist[0]), int(wrist[1])), color))
+
+        # Impact Detection
+        impact_detected, min_dist = self.detect_impact(bat_centers, ball_centers)
+        if impact_detected and self.last_impact_location:
+            annotations["impact_location"] = self.last_impact_location
+        if impact_detected:
+            self._pending_exits.append((self.processing_stats["impacts"][-1], frame_count))
+        self._resolve_exits(frame_count)
+
+        # Calculate current bat speed for display
+        current_bat_speed = self.calculate_peak_speed(self.bat_history)
+
+        annotations["scoreboard"] = self.scoreboard_state(current_bat_speed, min_dist)
+        self._skipped_frames = []
+        self._last_inferred_frame = frame_count
+        return annotations
+
+    def ball_near_bat(self):
+        """
+        Whether a tracked ball is, or on the next frame is predicted to be, within
+        BALL_DENSE_DISTANCE_METERS of a tracked bat.
+        """
+        if not self.ball_tracker.tracks or not self.bat_tracker.tracks:
+            return False
+        balls = np.array([position for track in self.ball_tracker.tracks
+                          for position in (track.position, np.add(track.position, track.velocity))])
+        bats = np.array([track.position for track in self.bat_tracker.tracks])
+        distances = np.linalg.norm(balls[:, None, :] - bats[None, :, :], axis=2)
+        return float(distances.min()) <= BALL_DENSE_DISTANCE_METERS * (self.pixels_per_meter or 100.0)
+
+    def _ball_flight(self, impact_frame, location):
+        """
+        The detected ball positions over BALL_FOLLOW_FRAMES after an impact, from the ball
+        track that starts closest to the impact, and the ball's average speed over them.
+        Returns ([[frame, x, y], ...], exit_speed_kmh), or ([], None) if no ball was followed.
+        """
+        if self.pixels_per_meter is None or self.fps <= 0:
+            return [], None
+        best, best_distance = None, BALL_TRACK_GATE_METERS * self.pixels_per_meter
+        for track in self.ball_tracker.all_tracks():
+            points = [p for p in track.path if impact_frame <= p[0] <= impact_frame + BALL_FOLLOW_FRAMES]
+            if len(points) < 3:
+                continue
+            distance = math.hypot(points[0][1] - location[0], points[0][2] - location[1])
+            if distance < best_distance:
+                best, best_distance = points, distance
+        if best is None:
+            return [], None
+        (f0, x0, y0), (f1, x1, y1) = best[0], best[-1]
+        exit_speed = math.hypot(x1 - x0, y1 - y0) / ((f1 - f0) / self.fps) / self.pixels_per_meter * 3.6
+        return [[f, round(x, 1), round(y, 1)] for f, x, y in best], round(exit_speed, 2)
+
+    def _resolve_exits(self, frame_count, final=False):
+        """Attach the ball trajectory and exit speed to impacts BALL_FOLLOW_FRAMES old (or all, if final)."""
+        pending = []
+        for impact, impact_frame in self._pending_exits:
+            if not final and frame_count - impact_frame < BALL_FOLLOW_FRAMES:
+                pending.append((impact, impact_frame))
+                continue
+            impact["ball_trajectory"], impact["exit_speed_kmh"] = self._ball_flight(impact_frame, impact["location"])
+        self._pending_exits = pending
+
+    def finish_tracking(self):
+        """Resolve impacts still waiting for their ball flight at the end of the video."""
+        self._resolve_exits(self.processing_stats['frame_count'], final=True)
+
+    def drop_preroll(self, start_frame, preroll_inferred):
+        """
+        Forget the overlap frames a video segment analysed only to warm up its histories
+        and impact cooldown: their impacts belong to the previous segment.
+        """
+        self.start_frame = start_frame
+        self.processing_stats['frames_inferred'] -= preroll_inferred
+        self.processing_stats['impacts'] = [imp for imp in self.processing_stats['impacts'] if imp['frame'] > start_frame]
+        self.impact_count = len(self.processing_stats['impacts'])
+
+    def final_stats(self):
+        """Summarise the session into the stats dict returned by analyze_video."""
+        total_frames = self.processing_stats['frame_count'] - self.start_frame
+        frames_inferred = self.processing_stats['frames_inferred']
+        final_stats = {
+            "total_frames": total_frames,
+            "fps": round(self.fps, 3) if self.fps else None,
+            "total_shots": self.impact_count,
+            "impacts": self.processing_stats["impacts"],
+            "frames_inferred": frames_inferred,
+            "inference_speedup": round(total_frames / frames_inferred, 2) if frames_inferred else None,
+            "model_invocations": self.processing_stats.get("model_invocations", {}),
+            "calibration": self.processing_stats.get("calibration"),
+            "timings": self.processing_stats.get("timings"),
+            "output": self.processing_stats.get("output"),
+        }
+        final_stats.update(impact_summary(self.processing_stats['impacts'], self.min_speed))
+        return final_stats
+
+# --- Inference ---
+
+# Per-model call settings for the analysis detectors, in default run order.
+DETECTORS = {
+    "bat": {"conf": 0.25},  # Lowered confidence
+    "ball": {"conf": 0.15},  # Lowered confidence
+    "pose": {},
+}
+STUMP_DETECTOR = {"conf": 0.25}  # Only run during calibration, see detect_stumps()
+
+def parse_cascade(spec):
+    """Parse a cascade spec such as "pose:bat,ball:bat" into {gated_model: gate_model}."""
+    gates = {}
+    for item in (spec or "").split(","):
+        item = item.strip()
+        if not item:
+            continue
+        gated, _, gate = item.partition(":")
+        gates[gated.strip()] = gate.strip()
+    return gates
+
+def _has_detections(result):
+    return result is not None and result.boxes is not None and len(result.boxes) > 0
+
+class InferenceCascade:
+    """
+    Runs the detectors over a batch of frames. A gated model only runs on frames where
+    its gate model detected something within the last `hold` inferred frames; on other
+    frames its result is None. A model with an interval k in `intervals` only runs on
+    every k-th frame, unless it is in `dense`; run_skipped() catches up on one of the
+    frames it skipped once the caller needs it after all. Counts the images each model was run on,
+    and times each batched call as the "model_<name>" stage when given a StageTimer.
+    """
+
+    def __init__(self, gates=None, hold=0, timer=None, intervals=None):
+        self.gates = dict(gates or {})
+        self.hold = max(0, int(hold))
+        self.timer = timer
+        self.intervals = dict(intervals or {})
+        self.dense = set()
+        self.invocations = {name: 0 for name in DETECTORS}
+        self._interval_skipped = {}  # Per model, the indices in the last batch skipped for its interval
+        self._last_seen = {}
+        self._frame_index = 0
+
+        for gated, gate in self.gates.items():
+            if gated not in DETECTORS or gate not in DETECTORS:
+                raise ValueError(f"Unknown model in cascade: {gated}:{gate}")
+
+        # Gate models must run before the models they gate
+        self.order = []
+        while len(self.order) < len(DETECTORS):
+            ready = [name for name in DETECTORS if name not in self.order
+                     and self.gates.get(name) in (None, *self.order)]
+            if not ready:
+                raise ValueError(f"Invalid model cascade: {self.gates}")
+            self.order.extend(ready)
+
+    def _gate_mask(self, gate, gate_results, base_index):
+        mask = []
+        for offset, result in enumerate(gate_results):
+            index = base_index + offset
+            if _has_detections(result):
+                self._last_seen[gate] = index
+            last_seen = self._last_seen.get(gate)
+            mask.append(last_seen is not None and index - last_seen <= self.hold)
+        return mask
+
+    def run(self, frames):
+        """Returns (bat, ball, pose) result tuples in the same order as the input frames."""
+        base_index = self._frame_index
+        self._frame_index += len(frames)
+        results = {}
+        masks = {}
+        for name in self.order:
+            kwargs = DETECTORS[name]
+            gate = self.gates.get(name)
+            if gate is None:
+                indices = list(range(len(frames)))
+            else:
+                if gate not in masks:
+                    masks[gate] = self._gate_mask(gate, results[gate], base_index)
+                indices = [i for i, is_open in enumerate(masks[gate]) if is_open]
+            interval = self.intervals.get(name, 1)
+            skipped = set()
+            if interval > 1 and name not in self.dense:
+                skipped = {i for i in indices if (base_index + i) % interval != 0}
+                indices = [i for i in indices if i not in skipped]
+            self._interval_skipped[name] = skipped
+
+            model_results = [None] * len(frames)
+            if indices:
+                with self.timer.time(f"model_{name}") if self.timer else contextlib.nullcontext():
+                    batch_results = registry.predict(name, [frames[i] for i in indices], verbose=False, **kwargs)
+                for i, result in zip(indices, batch_results):
+                    model_results[i] = result
+                self.invocations[name] += len(indices)
+            results[name] = model_results
+        return list(zip(results["bat"], results["ball"], results["pose"]))
+
+    def run_skipped(self, name, frame, index):
+        """
+        Run model `name` on `frame`, frame `index` of the last batch, if its interval skipped
+        it there: a ball that comes near the bat partway through a batch must still be
+        detected on the impact frame. Returns the result, or None if the frame was not skipped.
+        """
+        skipped = self._interval_skipped.get(name, set())
+        if index not in skipped:
+            return None
+        skipped.discard(index)
+        with self.timer.time(f"model_{name}") if self.timer else contextlib.nullcontext():
+            (result,) = registry.predict(name, [frame], verbose=False, **DETECTORS[name])
+        self.invocations[name] += 1
+        return result
+
+class ROITracker:
+    """
+    Tracks a crop region around the batsman: the union of the latest bat box and the
+    stump box, grown by ROI_MARGIN and clipped to the frame. region() is None while
+    the full frame should be used.
+    """
+
+    def __init__(self, frame_size, stump_box=None):
+        self.frame_w, self.frame_h = frame_size
+        self.stump_box = stump_box
+        self._region = None
+        self._misses = 0
+
+    def region(self):
+        return self._region
+
+    def crop(self, frame):
+        """Return (crop, offset) for the current region."""
+        if self._region is None:
+            return frame, (0, 0)
+        x1, y1, x2, y2 = self._region
+        return frame[y1:y2, x1:x2], (x1, y1)
+
+    def update(self, bat_boxes):
+        """Update from one inferred frame's bat boxes, given in full-frame coordinates."""
+        if not bat_boxes:
+            self._misses += 1
+            if self._misses > ROI_LOST_FRAMES:
+                self._region = None
+            return
+        self._misses = 0
+        boxes = list(bat_boxes) + ([self.stump_box] if self.stump_box else [])
+        x1, y1 = min(b[0] for b in boxes), min(b[1] for b in boxes)
+        x2, y2 = max(b[2] for b in boxes), max(b[3] for b in boxes)
+
+        margin = ROI_MARGIN * max(x2 - x1, y2 - y1)
+        half_w = max((x2 - x1) / 2 + margin, ROI_MIN_FRACTION * self.frame_w / 2)
+        half_h = max((y2 - y1) / 2 + margin, ROI_MIN_FRACTION * self.frame_h / 2)
+        cx, cy = (x1 + x2) / 2, (y1 + y2) / 2
+        x1, x2 = max(0, int(cx - half_w)), min(self.frame_w, int(cx + half_w))
+        y1, y2 = max(0, int(cy - half_h)), min(self.frame_h, int(cy + half_h))
+
+        if (x2 - x1) * (y2 - y1) > ROI_MAX_AREA_FRACTION * self.frame_w * self.frame_h:
+            self._region = None
+        else:
+            self._region = (x1, y1, x2, y2)
+
+def render_annotations(frame, annotations):
+    """Draw the detections, impact marker and scoreboard in place on one frame and return it."""
+    annotated_frame = frame
+    for (x1, y1, x2, y2), conf in annotations["bats"]:
+        cv2.rectangle(annotated_frame, (x1, y1), (x2, y2), (0, 165, 255), 2)
+        cv2.putText(annotated_frame, f"Bat ({conf:.2f})", (x1, y1 - 10), FONT, 0.5, (0, 165, 255), 2)
+    for (x1, y1, x2, y2), conf in annotations["balls"]:
+        cv2.rectangle(annotated_frame, (x1, y1), (x2, y2), (0, 255, 255), 2)
+        cv2.putText(annotated_frame, f"Ball ({conf:.2f})", (x1, y1 - 10), FONT, 0.5, (0, 255, 255), 2)
+    for center, color in annotations["wrists"]:
+        cv2.circle(annotated_frame, center, 5, color, -1)
+    if annotations["impact_location"]:
+        cv2.circle(annotated_frame, annotations["impact_location"], 40, (0, 255, 0), 3)
+
+    # Draw scoreboard and annotations
+    draw_scoreboard(annotated_frame, annotations["scoreboard"])
+    return annotated_frame
+
+# --- Pipeline Stages ---
+# analyze_video runs as three stages connected by bounded queues:
+#   reader thread (decode) -> inference (calling thread) -> writer thread (render + encode)
+# OpenCV releases the GIL while decoding and encoding, so those stages overlap with inference.
+_END_OF_STREAM = object()
+_SKIPPED_FRAME = None  # Placeholder for a frame the stride controller only grabbed
+
+class StrideController:
+    """
+    Decides which frames the reader decodes for inference when a frame stride is set.
+    Runs on the reader thread; the inference stage only updates `focus`, the last
+    bat position in frame pixels, which centres the motion window on the batsman.
+    """
+
+    def __init__(self, stride):
+        self.stride = max(1, int(stride))
+        self.focus = None
+        self._prev_small = None
+        self._hold_until = -1
+
+    def should_decode(self, index):
+        return self.stride == 1 or index <= self._hold_until or index % self.stride == 0
+
+    def observe(self, index, frame):
+        """Score motion against the previous decoded frame and hold stride 1 after a spike."""
+        if self.stride == 1:
+            return
+        h, w = frame.shape[:2]
+        scale = MOTION_SAMPLE_WIDTH / w
+        small = cv2.resize(frame, (MOTION_SAMPLE_WIDTH, max(1, int(h * scale))), interpolation=cv2.INTER_AREA)
+        small = cv2.cvtColor(small, cv2.COLOR_BGR2GRAY)
+        prev, self._prev_small = self._prev_small, small
+        if prev is None:
+            return
+        diff = cv2.absdiff(small, prev)
+        focus = self.focus
+        if focus is not None:
+            cx, cy = int(focus[0] * scale), int(focus[1] * scale)
+            rx, ry = int(small.shape[1] * MOTION_WINDOW_FRACTION), int(small.shape[0] * MOTION_WINDOW_FRACTION)
+            diff = diff[max(0, cy - ry):cy + ry, max(0, cx - rx):cx + rx]
+        if diff.size and float(diff.mean()) > MOTION_THRESHOLD:
+            self._hold_until = index + MOTION_HOLD_FRAMES
+
+def _put(q, item, stop_event):
+    """Put with backpressure; gives up if the pipeline is being torn down."""
+    while not stop_event.is_set():
+        try:
+            q.put(item, timeout=0.1)
+            return True
+        except queue.Full:
+            continue
+    return False
+
+def _get(q, stop_event):
+    """Get the next item, or the end-of-stream marker if the pipeline is stopped."""
+    while True:
+        try:
+            return q.get(timeout=0.1)
+        except queue.Empty:
+            if stop_event.is_set():
+                return _END_OF_STREAM
+
+def seek_frame(cap, index, input_path):
+    """
+    Position `cap` so its next read() returns frame `index`, and return the capture to
+    read from. Seeking by CAP_PROP_POS_FRAMES lands on a nearby keyframe with some
+    containers and backends, so the position is checked afterwards; if it is off, the
+    video is reopened (when it overshot) and grab()bed forward to `index` instead.
+    """
+    if cap.set(cv2.CAP_PROP_POS_FRAMES, index) and int(cap.get(cv2.CAP_PROP_POS_FRAMES)) == index:
+        return cap
+    position = int(cap.get(cv2.CAP_PROP_POS_FRAMES))
+    if position < 0 or position > index:
+        cap.release()
+        cap = cv2.VideoCapture(input_path)
+        position = 0
+    print(f"--- Inexact seek to frame {index}; skipping ahead from frame {position} ---")
+    for _ in range(index - position):
+        if not cap.grab():
+            break
+    return cap
+
+def frame_reader(cap, frame_queue, stop_event, errors, stride_controller=None, replay_frames=None, timer=None, limit=None):
+    """
+    Reader stage: decode frames ahead of inference. Frames the stride controller
+    skips are only grabbed and queued as _SKIPPED_FRAME. `replay_frames` (already
+    decoded during calibration) are delivered before reading from `cap`.
+    Stops after `limit` frames if given.
+    Reads and grabs are timed as the "decode" stage when given a StageTimer.
+    """
+    replay_frames = replay_frames or []
+    timer = timer or StageTimer()
+    try:
+        index = 0
+        while not stop_event.is_set() and (limit is None or index < limit):
+            decode = stride_controller is None or stride_controller.should_decode(index)
+            if index < len(replay_frames):
+                success, frame = True, replay_frames[index] if decode else _SKIPPED_FRAME
+                replay_frames[index] = None  # Release it once handed over
+                if decode and stride_controller is not None:
+                    stride_controller.observe(index, frame)
+            elif decode:
+                with timer.time("decode"):
+                    success, frame = cap.read()
+                if success and stride_controller is not None:
+                    stride_controller.observe(index, frame)
+            else:
+                with timer.time("decode"):
+                    success, frame = cap.grab(), _SKIPPED_FRAME
+            if not success:
+                break
+            if not _put(frame_queue, frame, stop_event):
+                break
+            index += 1
+    except Exception as e:
+        errors.append(e)
+        stop_event.set()
+    finally:
+        _put(frame_queue, _END_OF_STREAM, stop_event)
+
+def frame_writer(out, render_queue, stop_event, errors, show=False, timer=None, discard=0):
+    """
+    Writer stage: render annotations and encode frames in order. Skipped frames
+    repeat the last annotated frame so the output keeps its length and timing.
+    The first `discard` frames are rendered but not written (a segment's overlap).
+    Timed as the "render" and "encode" stages when given a StageTimer.
+    """
+    annotated_frame = None
+    timer = timer or StageTimer()
+    while True:
+        item = render_queue.get()
+        if item is _END_OF_STREAM:
+            break
+        if stop_event.is_set():
+            continue  # Keep draining so the inference stage never blocks
+        try:
+            frame, annotations = item
+            write = discard <= 0
+            discard -= 1
+            if frame is _SKIPPED_FRAME:
+                if annotated_frame is not None and write:
+                    with timer.time("encode"):
+                        out.write(annotated_frame)
+                continue
+            with timer.time("render"):
+                annotated_frame = render_annotations(frame, annotations)
+            if not write:
+                continue
+            with timer.time("encode"):
+                out.write(annotated_frame)
+            if show:
+                cv2.imshow("Cricket Analysis", annotated_frame)
+                if cv2.waitKey(1) & 0xFF == ord('q'):
+                    stop_event.set()
+        except Exception as e:
+            errors.append(e)
+            stop_event.set()
+
+def highlight_writer(open_out, render_queue, stop_event, errors, timer=None, discard=0, before=0, after=0, clips=None):
+    """
+    Writer stage for the "highlights" output mode: only frames from `before` frames ahead
+    of an impact to `after` frames past it are rendered and encoded, into a reel opened
+    by open_out() at the first clip. Each clip is appended to `clips` as a dict of
+    frame indices into the stream ("start", "end") and into the reel ("reel_start", "frames").
+    Impacts within the first `discard` frames (a segment's overlap) do not start a clip.
+    """
+    timer = timer or StageTimer()
+    pending = deque(maxlen=max(1, before))  # Recent frames, rendered only if an impact follows
+    out = None
+    annotated_frame = None
+    remaining = 0  # Frames still to write after the latest impact
+    reel_frames = 0
+    index = -1
+
+    def write(item):
+        nonlocal annotated_frame, reel_frames
+        frame, annotations = item
+        if frame is not _SKIPPED_FRAME:
+            with timer.time("render"):
+                annotated_frame = render_annotations(frame, annotations)
+        if annotated_frame is not None:
+            with timer.time("encode"):
+                out.write(annotated_frame)
+            reel_frames += 1
+            clips[-1]["frames"] += 1
+
+    while True:
+        item = render_queue.get()
+        if item is _END_OF_STREAM:
+            break
+        if stop_event.is_set():
+            continue  # Keep draining so the inference stage never blocks
+        index += 1
+        try:
+            annotations = item[1]
+            impact = index >= discard and annotations is not None and annotations["impact_location"] is not None
+            if impact and remaining == 0:
+                out = out or open_out()
+                clips.append({"start": index - len(pending), "end": None, "reel_start": reel_frames, "frames": 0})
+                while pending:
+                    write(pending.popleft())
+            if impact:
+                remaining = after + 1
+            if remaining:
+                write(item)
+                remaining -= 1
+                if not remaining:
+                    clips[-1]["end"] = index + 1
+            elif before and index >= discard:  # Overlap frames belong to the previous segment's reel
+                pending.append(item)
+        except Exception as e:
+            errors.append(e)
+            stop_event.set()
+    if clips and clips[-1]["end"] is None:
+        clips[-1]["end"] = index + 1
+
+def analyze_video(input_path, output_path, batch_size=None, progress_callback=None, frame_stride=None, cascade=None, roi=None, camera_id=None,
+                  segment=None, calibration=None, output_mode=None, track_path=None, timer=None):
     """
     Process the video, save annotated video, and return analysis statistics.
+    Frames are decoded into batches of `batch_size` (default BATCH_SIZE) and each
+    model runs once per batch; per-frame logic then consumes the results in frame order.
+    Decoding and rendering/encoding run on their own threads (see Pipeline Stages).
+    With `frame_stride` (default FRAME_STRIDE) above 1, only every k-th frame is inferred
+    outside of motion spikes (see Adaptive Frame Stride).
+    `cascade` is a {gated_model: gate_model} dict or spec string (default CASCADE).
+    With `roi` (default ROI_ENABLED) the detectors run on a crop around the batsman.
+    `camera_id` names a fixed camera setup so its cached scale calibration is reused.
+    If given, `progress_callback(frames_done, total_frames)` is called after every batch.
+    Per-stage timings (decode, each model, impact logic, render, encode) are returned
+    under "timings" and fed to the process-wide histograms served at /metrics; pass a
+    `timer` (e.g. StageTimer(keep_samples=True)) to collect them somewhere else.
+    `segment=(start_frame, end_frame, preroll)` analyses only frames [start_frame, end_frame)
+    (end_frame None reads to the end), after warming up on `preroll` earlier frames that
+    are neither written nor reported; `calibration=(pixels_per_meter, stump_box, source)`
+    skips scale calibration. Both are used by parallel.analyze_video_parallel.
+    `output_mode` (default OUTPUT_MODE) is "full", "highlights" or "stats" (see Output);
+    with "highlights" nothing is written if there are no impacts, and with "stats"
+    `output_path` is ignored.
+    With `track_path`, every inferred frame's raw detections are saved there (see
+    track_store) so reanalyze() can recompute the stats without running the models.
     """
-    # Reset state for a new analysis run
-    reset_analysis_state()
-    
-    global pixels_per_meter, last_impact_frame, last_impact_speed, impact_count, last_impact_location, processing_stats
-    
+    output_mode = output_mode or OUTPUT_MODE
+    if output_mode not in OUTPUT_MODES:
+        raise ValueError(f"Unknown output mode: {output_mode} (expected one of {', '.join(OUTPUT_MODES)})")
+    started = time.perf_counter()
+    timer = timer or StageTimer()
+    batch_size = max(1, int(batch_size or BATCH_SIZE))
+    frame_stride = max(1, int(frame_stride or FRAME_STRIDE))
+    stride_controller = StrideController(frame_stride) if frame_stride > 1 else None
+    if cascade is None or isinstance(cascade, str):
+        cascade = parse_cascade(CASCADE if cascade is None else cascade)
+    inference = InferenceCascade(cascade, hold=CASCADE_HOLD_FRAMES, timer=timer, intervals={"ball": BALL_DETECT_INTERVAL})
+
     cap = cv2.VideoCapture(input_path)
     if not cap.isOpened():
         raise RuntimeError(f"ERROR: Could not open video file {input_path}")
     
     fps = cap.get(cv2.CAP_PROP_FPS)
     w, h = int(cap.get(cv2.CAP_PROP_FRAME_WIDTH)), int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
+    total_frames = max(0, int(cap.get(cv2.CAP_PROP_FRAME_COUNT)))  # Container estimate; 0 if unknown
+    start_frame, end_frame, preroll = segment or (0, None, 0)
+    first_frame = max(0, start_frame - preroll)
     print(f"Video Info: {w}x{h} @ {fps:.2f} FPS")
     
-    out = cv2.VideoWriter(output_path, cv2.VideoWriter_fourcc(*'mp4v'), fps, (w, h))
+    reel = []  # The output writer, once opened (lazily for highlights)
 
-    pixels_per_meter = setup_scaling_factor(cap)
-    impact_distance_threshold = 0.5 * pixels_per_meter # Reduced for more precise impact timing
+    def open_output():
+        reel.append(open_video_writer(output_path, fps, (w, h)))
+        return reel[-1]
 
-    print("--- Starting video processing ---")
-    processing_stats['frame_count'] = 0
-    
-    while cap.isOpened():
-        success, frame = cap.read()
-        if not success:
-            break
-        
-        processing_stats['frame_count'] += 1
-        annotated_frame = frame.copy()
-        bat_centers, ball_centers = [], []
-          
-        # Bat Detection
-        results_bat = bat_model(frame, conf=0.25, verbose=False) # Lowered confidence
-        if results_bat and results_bat[0].boxes:
-            for box in results_bat[0].boxes:
-                x1, y1, x2, y2 = map(int, box.xyxy[0])
-                bat_center = ((x1 + x2) // 2, (y1 + y2) // 2)
-                bat_centers.append(bat_center)
-                bat_history.append((processing_stats['frame_count'], bat_center))
-                cv2.rectangle(annotated_frame, (x1, y1), (x2, y2), (0, 165, 255), 2)
-                cv2.putText(annotated_frame, f"Bat ({box.conf.item():.2f})", (x1, y1 - 10), FONT, 0.5, (0, 165, 255), 2)
-          
-        # Ball Detection
-        results_ball = ball_model(frame, conf=0.15, verbose=False) # Lowered confidence
-        if results_ball and results_ball[0].boxes:
-            detections = [b for b in results_ball[0].boxes if ball_class_index == -1 or int(b.cls) == ball_class_index]
-            for box in detections:
-                x1, y1, x2, y2 = map(int, box.xyxy[0])
-                ball_center = ((x1 + x2) // 2, (y1 + y2) // 2)
-                ball_centers.append(ball_center)
-                # No need to add ball to history unless we track its trajectory
-                cv2.rectangle(annotated_frame, (x1, y1), (x2, y2), (0, 255, 255), 2)
-                cv2.putText(annotated_frame, f"Ball ({box.conf.item():.2f})", (x1, y1 - 10), FONT, 0.5, (0, 255, 255), 2)
-          
-        # Pose Detection (Wrist Tracking)
-        results_pose = pose_model(frame, verbose=False)
-        if results_pose and results_pose[0].keypoints is not None and bat_centers:
-            bat_center = bat_centers[0] # Assume primary bat
-            min_dist_to_bat = float('inf')
-            best_batsman_idx = -1
-
-            # Find the person closest to the bat
-            for i, person_kps_obj in enumerate(results_pose[0].keypoints):
-                person_kps = person_kps_obj.data[0]
-                left_wrist_conf = person_kps[9, 2] if len(person_kps) > 9 else 0
-                right_wrist_conf = person_kps[10, 2] if len(person_kps) > 10 else 0
-                
-                dist = float('inf')
-                if left_wrist_conf > 0.5:
-                    dist = calculate_distance(bat_center, person_kps[9, :2])
-                elif right_wrist_conf > 0.5:
-                    dist = calculate_distance(bat_center, person_kps[10, :2])
-                
-                if dist < min_dist_to_bat:
-                    min_dist_to_bat = dist
-                    best_batsman_idx = i
+    out = open_output() if output_mode == 'full' else None
 
-            # If a batsman is linked, track their wrists
-            if best_batsman_idx != -1:
-                batsman_kps_tensor = results_pose[0].keypoints[best_batsman_idx].data[0]
-                left_wrist = batsman_kps_tensor[9, :2] if len(batsman_kps_tensor) > 9 and batsman_kps_tensor[9, 2] > 0.5 else None
-                right_wrist = batsman_kps_tensor[10, :2] if len(batsman_kps_tensor) > 10 and batsman_kps_tensor[10, 2] > 0.5 else None
-                
-                if left_wrist is not None:
-                    left_wrist_history.append((processing_stats['frame_count'], left_wrist))
-                    cv2.circle(annotated_frame, (int(left_wrist[0]), int(left_wrist[1])), 5, (255, 0, 0), -1)
-                if right_wrist is not None:
-                    right_wrist_history.append((processing_stats['frame_count'], right_wrist))
-                    cv2.circle(annotated_frame, (int(right_wrist[0]), int(right_wrist[1])), 5, (0, 255, 0), -1)
-        
-        # Impact Detection
-        impact_detected, min_dist = detect_impact(bat_centers, ball_centers, fps, bat_history, left_wrist_history, right_wrist_history, impact_distance_threshold)
-        if impact_detected and last_impact_location:
-            cv2.circle(annotated_frame, last_impact_location, 40, (0, 255, 0), 3)
-        
-        # Calculate current bat speed for display
-        current_bat_speed = calculate_peak_speed(bat_history, fps)
-        
-        # Print live speed to CLI
-        print(f"\rFrame: {processing_stats['frame_count']}, Live Bat Speed: {current_bat_speed:.1f} km/h", end="")
+    # Fresh state for this analysis run
+    if calibration is None:
+        with timer.time("calibration"):
+            pixels_per_meter, stump_box, replay_frames, calibration_source = calibrate_scale(cap, camera_id)
+        if replay_frames is None or first_frame:
+            # Calibration read too far to keep its frames; reopening is cheaper and more exact than seeking
+            cap.release()
+            cap = cv2.VideoCapture(input_path)
+            replay_frames = None
+    else:
+        pixels_per_meter, stump_box, calibration_source = calibration
+        replay_frames = None
+    if first_frame:
+        cap = seek_frame(cap, first_frame, input_path)
+    session = AnalysisSession(fps, pixels_per_meter=pixels_per_meter, first_frame=first_frame)
+    session.processing_stats["calibration"] = {"source": calibration_source, "pixels_per_meter": round(pixels_per_meter, 2)}
+    roi_tracker = ROITracker((w, h), stump_box) if (ROI_ENABLED if roi is None else roi) else None
+    recorder = DetectionRecorder() if track_path else None
 
-        # Draw scoreboard and annotations
-        draw_scoreboard(annotated_frame, fps, current_bat_speed, min_dist)
+    print(f"--- Starting video processing (batch size {batch_size}, frame stride {frame_stride}) ---")
 
-        out.write(annotated_frame)
-        # Only show window if running as script
-        if __name__ == "__main__":
-            cv2.imshow("Cricket Analysis", annotated_frame)
-            if cv2.waitKey(1) & 0xFF == ord('q'):
+    frame_queue = queue.Queue(maxsize=max(READ_QUEUE_SIZE, batch_size))
+    render_queue = queue.Queue(maxsize=WRITE_QUEUE_SIZE)
+    stop_event = threading.Event()
+    errors = []
+    reader = threading.Thread(target=frame_reader, args=(cap, frame_queue, stop_event, errors, stride_controller, replay_frames, timer,
+                                                          None if end_frame is None else end_frame - first_frame), daemon=True)
+    clips = []
+    if output_mode == 'full':
+        writer = threading.Thread(target=frame_writer, args=(out, render_queue, stop_event, errors, __name__ == "__main__", timer,
+                                                             start_frame - first_frame), daemon=True)
+    elif output_mode == 'highlights':
+        writer = threading.Thread(target=highlight_writer, args=(open_output, render_queue, stop_event, errors, timer, start_frame - first_frame,
+                                                                 int(HIGHLIGHT_BEFORE_SECONDS * fps), int(HIGHLIGHT_AFTER_SECONDS * fps), clips), daemon=True)
+    else:
+        writer, render_queue = None, None  # "stats": frames are dropped as soon as they are analysed
+    reader.start()
+    if writer is not None:
+        writer.start()
+
+    last_log = time.monotonic()
+    preroll_inferred = 0  # Overlap frames inferred before start_frame
+    try:
+        ended = False
+        while not ended and not stop_event.is_set():
+            # Gather a batch of decoded frames (plus any skipped frames in between)
+            frames, keyframes = [], []
+            while len(keyframes) < batch_size:
+                frame = _get(frame_queue, stop_event)
+                if frame is _END_OF_STREAM:
+                    ended = True
+                    break
+                frames.append(frame)
+                if frame is not _SKIPPED_FRAME:
+                    keyframes.append(frame)
+            if not frames:
                 break
 
-    # Cleanup
-    cap.release()
-    out.release()
-    if __name__ == "__main__":
-        cv2.destroyAllWindows()
-    print(f"\nProcessing complete. Output saved to {output_path}")
-
-    # --- Final Statistics ---
-    final_stats = {
-        "total_frames": processing_stats['frame_count'],
-        "total_shots": impact_count,
-        "impacts": processing_stats["impacts"]
+            # The ROI is fixed for the batch, so every crop in it has the same size
+            offset = (0, 0)
+            if roi_tracker is not None:
+                crops = [roi_tracker.crop(frame) for frame in keyframes]
+                offset = crops[0][1] if crops else offset
+                keyframes = [crop for crop, _ in crops]
+
+            # One forward pass per model for the whole batch, then per-frame logic in order
+            results = inference.run(keyframes) if keyframes else []
+            index = 0
+            for frame in frames:
+                if frame is _SKIPPED_FRAME:
+                    session.skip_frame()
+                    if render_queue is not None:
+                        render_queue.put((frame, None))
+                    continue
+                result_bat, result_ball, result_pose = results[index]
+                if result_ball is None and session.ball_near_bat():
+                    result_ball = inference.run_skipped("ball", keyframes[index], index)
+                index += 1
+                detections = extract_detections(result_bat, result_ball, result_pose, offset)
+                with timer.time("impact"):
+                    annotations = session.process_frame(detections)
+                if recorder is not None and session.processing_stats['frame_count'] > start_frame:  # Overlap frames belong to the previous segment
+                    recorder.add(session.processing_stats['frame_count'], detections)
+                if roi_tracker is not None:
+                    roi_tracker.update([box for box, _ in annotations["bats"]])
+                if stride_controller is not None and annotations["bats"]:
+                    (x1, y1, x2, y2), _ = annotations["bats"][0]
+                    stride_controller.focus = ((x1 + x2) // 2, (y1 + y2) // 2)
+                if render_queue is not None:
+                    render_queue.put((frame, annotations))
+                if session.processing_stats['frame_count'] <= start_frame:
+                    preroll_inferred = session.processing_stats['frames_inferred']
+            # Run the ball detector on every frame of the next batch while a ball approaches the bat
+            # (within a batch, run_skipped() above fills in the frames it skipped)
+            inference.dense = {"ball"} if session.ball_near_bat() else set()
+            if progress_callback:
+                progress_callback(session.processing_stats['frame_count'], total_frames)
+            now = time.monotonic()
+            if now - last_log >= PROGRESS_LOG_INTERVAL:
+                last_log = now
+                frames_done = session.processing_stats['frame_count'] - first_frame
+                print(json.dumps({
+                    "event": "analysis_progress",
+                    "video": os.path.basename(input_path),
+                    "frames_done": frames_done,
+                    "total_frames": total_frames,
+                    "fps": round(frames_done / (time.perf_counter() - started), 2),
+                    "live_bat_speed_kmh": round(float(annotations["scoreboard"]["current_speed"]), 1) if keyframes else None,
+                    "impacts": session.impact_count,
+                }))
+    except Exception:
+        stop_event.set()
+        metrics.counter('analysis_videos_total', 'Videos analysed', outcome='failed').inc()
+        raise
+    finally:
+        if writer is not None:
+            render_queue.put(_END_OF_STREAM)
+            writer.join()
+        stop_event.set()
+        reader.join()
+        # Cleanup
+        cap.release()
+        for writer_out in reel:
+            writer_out.release()
+        if __name__ == "__main__":
+            cv2.destroyAllWindows()
+
+    if errors:
+        metrics.counter('analysis_videos_total', 'Videos analysed', outcome='failed').inc()
+        raise RuntimeError(f"Video pipeline failed: {errors[0]}") from errors[0]
+    session.processing_stats["model_invocations"] = dict(inference.invocations)
+    session.finish_tracking()
+    session.processing_stats["output"] = {
+        "mode": output_mode,
+        "written": bool(reel),
+        "highlights": [{
+            "start_frame": first_frame + clip["start"],
+            "end_frame": first_frame + clip["end"],
+            "start_seconds": round((first_frame + clip["start"]) / fps, 2) if fps else None,
+            "reel_start_seconds": round(clip["reel_start"] / fps, 2) if fps else None,
+            "reel_frames": clip["frames"],
+        } for clip in clips] if output_mode == 'highlights' else None,
+    }
+    if recorder is not None:
+        recorder.save(track_path, video=os.path.basename(input_path), fps=fps, pixels_per_meter=pixels_per_meter,
+                      calibration=session.processing_stats["calibration"], start_frame=start_frame,
+                      end_frame=session.processing_stats['frame_count'], model_invocations=dict(inference.invocations),
+                      params=analysis_params())
+    if start_frame:
+        session.drop_preroll(start_frame, preroll_inferred)
+    wall_seconds = time.perf_counter() - started
+    frame_count = session.processing_stats['frame_count'] - first_frame  # Including any segment overlap
+    session.processing_stats["timings"] = {
+        "wall_seconds": round(wall_seconds, 3),
+        "frames_per_second": round(frame_count / wall_seconds, 2) if wall_seconds > 0 else None,
+        "stages": timer.summary(),
     }
+    metrics.counter('analysis_videos_total', 'Videos analysed', outcome='done').inc()
+    metrics.counter('analysis_frames_total', 'Video frames processed').inc(frame_count)
+    metrics.histogram('analysis_video_seconds', 'Wall-clock time per analysed video', buckets=VIDEO_BUCKETS).observe(wall_seconds)
+    print(f"\nProcessing complete. Output saved to {output_path}" if reel else "\nProcessing complete. No video written.")
 
-    if impact_count > 0:
-        speeds = [imp['speed_kmh'] for imp in processing_stats['impacts']]
-        final_stats["average_speed_kmh"] = round(sum(speeds) / len(speeds), 2)
-        final_stats["max_speed_kmh"] = round(max(speeds), 2)
-        final_stats["power_hit_category"] = get_power_hit_category(final_stats["max_speed_kmh"])
-    
+    return session.final_stats()
+
+# --- Re-analysis ---
+# Settings reanalyze() accepts, with their types. Only the impact logic is re-run, so
+# settings that change which frames are inferred (stride, cascade, ROI) need a full analysis.
+REANALYSIS_PARAMS = {
+    "impact_cooldown_frames": int,
+    "min_speed": float,
+    "max_speed": float,
+    "impact_distance_meters": float,
+}
+
+def reanalyze(track_file, params=None):
+    """
+    Recompute impacts and stats from a track file saved by analyze_video, with `params`
+    (any of REANALYSIS_PARAMS) replacing the module defaults. No model runs, so this
+    takes milliseconds to a second or so. Returns the stats dict analyze_video would
+    have returned with those settings, plus the settings used under "reanalysis".
+    Raises ValueError for unknown or malformed params.
+    """
+    params = dict(params or {})
+    unknown = sorted(set(params) - set(REANALYSIS_PARAMS))
+    if unknown:
+        raise ValueError(f"Unknown reanalysis parameter(s): {', '.join(unknown)} (expected {', '.join(REANALYSIS_PARAMS)})")
+    try:
+        params = {name: REANALYSIS_PARAMS[name](value) for name, value in params.items()}
+    except (TypeError, ValueError) as e:
+        raise ValueError(f"Invalid reanalysis parameter: {e}") from e
+    started = time.perf_counter()
+    meta, detections = read_tracks(track_file)
+    session = AnalysisSession(meta["fps"], pixels_per_meter=meta["pixels_per_meter"], first_frame=meta["start_frame"], **params)
+    for frame, frame_detections in detections:
+        while session.processing_stats['frame_count'] < frame - 1:
+            session.skip_frame()
+        session.process_frame(frame_detections)
+    while session.processing_stats['frame_count'] < meta["end_frame"]:
+        session.skip_frame()
+    session.finish_tracking()
+
+    wall_seconds = time.perf_counter() - started
+    frame_count = session.processing_stats['frame_count'] - meta["start_frame"]
+    session.processing_stats.update({
+        "calibration": meta["calibration"],
+        "model_invocations": meta["model_invocations"],
+        "output": {"mode": "stats", "written": False, "highlights": None},
+        "timings": {
+            "wall_seconds": round(wall_seconds, 3),
+            "frames_per_second": round(frame_count / wall_seconds, 2) if wall_seconds > 0 else None,
+            "stages": {},
+        },
+    })
+    final_stats = session.final_stats()
+    final_stats["reanalysis"] = {
+        "track_file": os.path.basename(track_file),
+        "params": {
+            "impact_cooldown_frames": session.impact_cooldown_frames,
+            "min_speed": session.min_speed,
+            "max_speed": session.max_speed,
+            "impact_distance_meters": session.impact_distance_meters,
+        },
+    }
     return final_stats
 
 def main():
     """Standalone script entry point."""
     input_path = 'Virat Kohli batting on a Green wicket _ Bold Diaries.mp4'
     output_path = 'cricket_analysis_final_4.mp4'
-    stats = analyze_video(input_path, output_path)
+    stats = analyze_video(input_path, output_path, track_path=track_path_for(output_path))
     print("\n--- Analysis Report ---")
-    import json
     print(json.dumps(stats, indent=4))
 
 if __name__ == "__main__":
@@ -0,0 +1,168 @@
+import bisect
+import contextlib
+import threading
+import time
+
+# Latency buckets (seconds) shared by the stage histograms
+STAGE_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+# Wall-clock buckets (seconds) for whole videos
+VIDEO_BUCKETS = (1, 5, 10, 30, 60, 120, 300, 600, 1200, 3600)
+
+
+class Histogram:
+    """Thread-safe fixed-bucket histogram, exposed in the Prometheus cumulative format."""
+
+    def __init__(self, buckets=STAGE_BUCKETS):
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)  # Last slot is +Inf
+        self.sum = 0.0
+        self.count = 0
+        self._lock = threading.Lock()
+
+    def observe(self, value):
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            self.counts[index] += 1
+            self.sum += value
+            self.count += 1
+
+    def quantile(self, q):
+        """Approximate quantile: the upper bound of the bucket holding the q-th observation."""
+        with self._lock:
+            if not self.count:
+                return None
+            target = q * self.count
+            seen = 0
+            for bound, count in zip(self.buckets + (float('inf'),), self.counts):
+                seen += count
+                if seen >= target:
+                    return bound if bound != float('inf') else self.buckets[-1]
+        return None
+
+
+class Counter:
+    def __init__(self):
+        self.value = 0
+        self._lock = threading.Lock()
+
+    def inc(self, amount=1):
+        with self._lock:
+            self.value += amount
+
+
+def _percentile(ordered, q):
+    """Linearly interpolated q-quantile of an already sorted, non-empty list."""
+    position = q * (len(ordered) - 1)
+    lower = int(position)
+    upper = min(lower + 1, len(ordered) - 1)
+    return ordered[lower] + (ordered[upper] - ordered[lower]) * (position - lower)
+
+
+def _label_str(labels):
+    if not labels:
+        return ''
+    return '{' + ','.join(f'{k}="{v}"' for k, v in sorted(labels.items())) + '}'
+
+
+class MetricsRegistry:
+    """
+    Process-wide metrics rendered in the Prometheus text format. Each gunicorn worker
+    keeps its own registry, so scrape every worker (or run a single one) for totals.
+    """
+
+    def __init__(self):
+        self._metrics = {}  # name -> (type, help, {label tuple: metric})
+        self._lock = threading.Lock()
+
+    def _get(self, kind, name, help_text, labels, factory):
+        key = tuple(sorted(labels.items()))
+        with self._lock:
+            _, _, series = self._metrics.setdefault(name, (kind, help_text, {}))
+            if key not in series:
+                series[key] = factory()
+            return series[key]
+
+    def histogram(self, name, help_text, buckets=STAGE_BUCKETS, **labels):
+        return self._get('histogram', name, help_text, labels, lambda: Histogram(buckets))
+
+    def counter(self, name, help_text, **labels):
+        return self._get('counter', name, help_text, labels, Counter)
+
+    def render(self):
+        lines = []
+        with self._lock:
+            metrics = {name: (kind, help_text, dict(series)) for name, (kind, help_text, series) in self._metrics.items()}
+        for name, (kind, help_text, series) in sorted(metrics.items()):
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} {kind}")
+            for key, metric in sorted(series.items()):
+                labels = dict(key)
+                if kind == 'counter':
+                    lines.append(f"{name}{_label_str(labels)} {metric.value}")
+                    continue
+                cumulative = 0
+                for bound, count in zip(metric.buckets + (float('inf'),), metric.counts):
+                    cumulative += count
+                    le = '+Inf' if bound == float('inf') else repr(bound)
+                    lines.append(f"{name}_bucket{_label_str(dict(labels, le=le))} {cumulative}")
+                lines.append(f"{name}_sum{_label_str(labels)} {metric.sum}")
+                lines.append(f"{name}_count{_label_str(labels)} {metric.count}")
+        return '\n'.join(lines) + '\n'
+
+
+metrics = MetricsRegistry()
+
+
+class StageTimer:
+    """
+    Per-job stage timings. Every observation also feeds the process-wide
+    analysis_stage_seconds{stage=...} histogram behind /metrics. With `keep_samples`
+    the raw durations are kept too, so summary() reports exact percentiles rather than
+    bucket bounds (the benchmark uses this; jobs leave it off to stay constant-memory).
+    """
+
+    def __init__(self, keep_samples=False):
+        self.stages = {}
+        self.samples = {} if keep_samples else None
+        self._lock = threading.Lock()
+
+    def observe(self, stage, seconds):
+        with self._lock:
+            histogram = self.stages.get(stage)
+            if histogram is None:
+                histogram = self.stages[stage] = Histogram()
+            if self.samples is not None:
+                self.samples.setdefault(stage, []).append(seconds)
+        histogram.observe(seconds)
+        metrics.histogram('analysis_stage_seconds', 'Time spent per pipeline stage call', stage=stage).observe(seconds)
+
+    @contextlib.contextmanager
+    def time(self, stage):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(stage, time.perf_counter() - start)
+
+    def summary(self):
+        """
+        Per-stage call count, total seconds, mean and p50/p95 in milliseconds. The
+        percentiles are exact with keep_samples, otherwise histogram bucket upper bounds.
+        """
+        with self._lock:
+            stages = dict(self.stages)
+            samples = {stage: sorted(values) for stage, values in self.samples.items()} if self.samples is not None else None
+        summary = {}
+        for stage, histogram in sorted(stages.items()):
+            if samples is not None and samples.get(stage):
+                p50, p95 = _percentile(samples[stage], 0.5), _percentile(samples[stage], 0.95)
+            else:
+                p50, p95 = histogram.quantile(0.5), histogram.quantile(0.95)
+            summary[stage] = {
+                "count": histogram.count,
+                "total_seconds": round(histogram.sum, 3),
+                "mean_ms": round(1000 * histogram.sum / histogram.count, 2) if histogram.count else None,
+                "p50_ms": round(1000 * p50, 2) if p50 is not None else None,
+                "p95_ms": round(1000 * p95, 2) if p95 is not None else None,
+            }
+        return summary
@@ -0,0 +1,328 @@
+import contextlib
+import fcntl
+import functools
+import glob
+import os
+import shutil
+import tempfile
+import threading
+import time
+
+import cv2
+import numpy as np
+
+# --- Model Weights ---
+# Weight files for bat, ball, stump, and pose detection
+MODEL_WEIGHTS = {
+    "bat": 'runs/detect/train/weights/best.pt',  # Path to bat detection model
+    "ball": 'runs/detect/train/weights/besst.pt',  # Path to ball detection model (ensure 'besst.pt' is correct)
+    "stump": 'runs/detect/train_stumps/weights/best.pt',  # Path to stump detection model
+    "pose": 'yolov8n-pose.pt',  # Pre-trained YOLOv8 pose model
+}
+MODEL_TASKS = {"bat": "detect", "ball": "detect", "stump": "detect", "pose": "pose"}
+
+# --- Inference Backend ---
+# "pytorch" runs the .pt weights directly. "onnx" (ONNX Runtime) and "openvino" export
+# each model once, cache the artifact next to its .pt file, and load that instead.
+INFERENCE_BACKEND = os.environ.get('INFERENCE_BACKEND', 'pytorch')
+BACKENDS = ('pytorch', 'onnx', 'openvino')
+# INT8 post-training quantization for the exported backends, calibrated on a folder of
+# representative frames (INT8_CALIBRATION_DIR, *.jpg / *.png).
+INFERENCE_INT8 = os.environ.get('INFERENCE_INT8', '0') == '1'
+INT8_CALIBRATION_DIR = os.environ.get('INT8_CALIBRATION_DIR', 'calibration_frames')
+INT8_CALIBRATION_MAX_IMAGES = 200
+EXPORT_IMGSZ = int(os.environ.get('INFERENCE_IMGSZ', 640))
+# Dummy frame size used to warm up the models
+WARMUP_WIDTH = 1280
+WARMUP_HEIGHT = 720
+
+
+def _yolo(path, **kwargs):
+    # Imported on first load: ultralytics pulls in torch, which nothing else needs until a model is loaded
+    from ultralytics import YOLO
+    return YOLO(path, **kwargs)
+
+
+def exported_path(weights, backend, int8=False):
+    """Where the exported artifact for `weights` lives: next to the .pt file."""
+    base = os.path.splitext(weights)[0]
+    suffix = '_int8' if int8 else ''
+    if backend == 'onnx':
+        return f"{base}{suffix}.onnx"
+    if backend == 'openvino':
+        return f"{base}{suffix}_openvino_model"
+    return weights
+
+
+@contextlib.contextmanager
+def _export_lock(path):
+    """Serialise exports of the same artifact across worker processes."""
+    with open(f"{path}.lock", 'w') as lock_file:
+        fcntl.flock(lock_file, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+
+def _calibration_images():
+    paths = sorted(glob.glob(os.path.join(INT8_CALIBRATION_DIR, '*.jpg')) +
+                   glob.glob(os.path.join(INT8_CALIBRATION_DIR, '*.png')))
+    if not paths:
+        raise RuntimeError(f"INT8 quantization needs calibration frames in {INT8_CALIBRATION_DIR}")
+    return paths[:INT8_CALIBRATION_MAX_IMAGES]
+
+
+def _letterbox_tensor(image, imgsz):
+    """Preprocess a BGR image the way ultralytics does for a fixed-size export: letterbox, RGB, CHW, 0-1."""
+    h, w = image.shape[:2]
+    scale = min(imgsz / h, imgsz / w)
+    resized = cv2.resize(image, (int(round(w * scale)), int(round(h * scale))), interpolation=cv2.INTER_LINEAR)
+    canvas = np.full((imgsz, imgsz, 3), 114, dtype=np.uint8)
+    top, left = (imgsz - resized.shape[0]) // 2, (imgsz - resized.shape[1]) // 2
+    canvas[top:top + resized.shape[0], left:left + resized.shape[1]] = resized
+    return canvas[:, :, ::-1].transpose(2, 0, 1)[None].astype(np.float32) / 255.0
+
+
+def _quantize_onnx(fp32_path, int8_path):
+    """Static INT8 quantization of an exported ONNX model with ONNX Runtime."""
+    from onnxruntime.quantization import CalibrationDataReader, QuantFormat, QuantType, quantize_static
+    import onnxruntime
+
+    input_name = onnxruntime.InferenceSession(fp32_path, providers=['CPUExecutionProvider']).get_inputs()[0].name
+
+    class FrameReader(CalibrationDataReader):
+        def __init__(self):
+            self._paths = iter(_calibration_images())
+
+        def get_next(self):
+            for path in self._paths:
+                image = cv2.imread(path)
+                if image is not None:
+                    return {input_name: _letterbox_tensor(image, EXPORT_IMGSZ)}
+            return None
+
+    quantize_static(fp32_path, int8_path, FrameReader(), quant_format=QuantFormat.QDQ,
+                    activation_type=QuantType.QUInt8, weight_type=QuantType.QInt8)
+
+
+def _calibration_dataset_yaml(model):
+    """Write a throwaway ultralytics dataset YAML pointing at the calibration frames (for OpenVINO INT8)."""
+    _calibration_images()  # Fail early if the folder is empty
+    fd, path = tempfile.mkstemp(suffix='.yaml')
+    root = os.path.abspath(INT8_CALIBRATION_DIR)
+    with os.fdopen(fd, 'w') as f:
+        f.write(f"path: {root}\ntrain: .\nval: .\nnames:\n")
+        for index, name in model.names.items():
+            f.write(f"  {index}: {name}\n")
+    return path
+
+
+def export_model(weights, backend, int8=False):
+    """Export `weights` for `backend` unless a cached artifact already exists; returns its path."""
+    target = exported_path(weights, backend, int8)
+    if os.path.exists(target):
+        return target
+    with _export_lock(target):
+        if os.path.exists(target):  # Another worker finished the export while we waited
+            return target
+        print(f"--- Exporting {weights} for {backend}{' (INT8)' if int8 else ''} ---")
+        model = _yolo(weights)
+        if backend == 'onnx':
+            fp32_path = exported_path(weights, 'onnx')
+            if not os.path.exists(fp32_path):
+                produced = model.export(format='onnx', dynamic=True, imgsz=EXPORT_IMGSZ)
+                if os.path.abspath(produced) != os.path.abspath(fp32_path):
+                    shutil.move(produced, fp32_path)
+            if int8:
+                _quantize_onnx(fp32_path, target)
+        elif backend == 'openvino':
+            kwargs = {'format': 'openvino', 'dynamic': True, 'imgsz': EXPORT_IMGSZ}
+            data_yaml = None
+            if int8:
+                data_yaml = _calibration_dataset_yaml(model)
+                kwargs.update(int8=True, data=data_yaml)
+            try:
+                produced = model.export(**kwargs)
+            finally:
+                if data_yaml:
+                    os.remove(data_yaml)
+            if os.path.abspath(produced) != os.path.abspath(target):
+                shutil.move(produced, target)
+        else:
+            raise ValueError(f"Unknown inference backend: {backend}")
+    return target
+
+
+def load_model(weights, task, backend=None, int8=None):
+    """Load a YOLO model for the configured backend (default INFERENCE_BACKEND / INFERENCE_INT8)."""
+    backend = backend or INFERENCE_BACKEND
+    int8 = INFERENCE_INT8 if int8 is None else int8
+    if backend not in BACKENDS:
+        raise ValueError(f"Unknown inference backend: {backend} (expected one of {', '.join(BACKENDS)})")
+    if backend == 'pytorch':
+        return _yolo(weights, task=task)
+    return _yolo(export_model(weights, backend, int8), task=task)
+
+
+# --- Model Registry ---
+
+class _BatchPacker:
+    """
+    Packs concurrent predict calls on one model into shared forward passes. While the
+    model runs one call, calls from other sessions queue up; the next caller to get the
+    model takes every queued call with the same settings (up to `max_images` images)
+    and runs them as one batch. No call waits longer than it would for the model lock.
+    """
+
+    def __init__(self, run, max_images):
+        self._run = run
+        self.max_images = max_images
+        self._cond = threading.Condition()
+        self._pending = []
+        self._busy = False
+
+    def __call__(self, source, **kwargs):
+        request = {"images": list(source), "kwargs": kwargs, "key": repr(sorted(kwargs.items())), "results": None, "error": None}
+        with self._cond:
+            self._pending.append(request)
+            while request["results"] is None and request["error"] is None:
+                if self._busy:
+                    self._cond.wait()
+                    continue
+                self._busy = True
+                taken, images = [], 0
+                for other in self._pending:
+                    if other["key"] != request["key"]:
+                        continue
+                    if taken and images + len(other["images"]) > self.max_images:
+                        break
+                    taken.append(other)
+                    images += len(other["images"])
+                for other in taken:
+                    self._pending.remove(other)
+                self._cond.release()
+                try:
+                    results, error = list(self._run([image for other in taken for image in other["images"]], **kwargs)), None
+                except Exception as e:
+                    results, error = None, e
+                finally:
+                    self._cond.acquire()
+                start = 0
+                for other in taken:
+                    if error is not None:
+                        other["error"] = error
+                    else:
+                        other["results"] = results[start:start + len(other["images"])]
+                        start += len(other["images"])
+                self._busy = False
+                self._cond.notify_all()
+        if request["error"] is not None:
+            raise request["error"]
+        return request["results"]
+
+
+class ModelRegistry:
+    """
+    Loads the analysis models on first use and shares them across every analysis in the
+    process. load_all() lets a gunicorn master load them before forking (--preload), so
+    workers share the weights copy-on-write; warm_up() runs a dummy batch through every
+    model so the first real request does not pay predictor setup and allocation costs.
+    """
+
+    def __init__(self, weights=None, tasks=None):
+        self.weights = dict(weights or MODEL_WEIGHTS)
+        self.tasks = dict(tasks or MODEL_TASKS)
+        self._models = {}
+        self._load_lock = threading.Lock()
+        self._warm_lock = threading.Lock()
+        # Ultralytics predictors keep per-call state, so concurrent analyses share the
+        # weights but take turns on each model.
+        self._predict_locks = {name: threading.Lock() for name in self.weights}
+        self._packers = {}
+        self.warm = False
+        self.load_seconds = {}
+        self.warmup_seconds = None
+        self.error = None
+
+    def get(self, name):
+        """Return the named model, loading it on first use."""
+        model = self._models.get(name)
+        if model is not None:
+            return model
+        with self._load_lock:
+            if name not in self._models:
+                start = time.perf_counter()
+                self._models[name] = load_model(self.weights[name], self.tasks[name])
+                self.load_seconds[name] = round(time.perf_counter() - start, 2)
+                print(f"--- Loaded {name} model in {self.load_seconds[name]:.2f}s ---")
+            return self._models[name]
+
+    def install(self, name, model):
+        """Use an already constructed model (e.g. a benchmark stub) instead of loading the weights."""
+        with self._load_lock:
+            self._models[name] = model
+            self._predict_locks.setdefault(name, threading.Lock())
+
+    def load_all(self):
+        try:
+            for name in self.weights:
+                self.get(name)
+        except Exception as e:
+            self.error = str(e)
+            raise
+
+    @property
+    def loaded(self):
+        """Whether every model is in memory."""
+        return all(name in self._models for name in self.weights)
+
+    def predict(self, name, source, **kwargs):
+        """Run a shared model, serialising calls from concurrent sessions (or packing them, see pack())."""
+        packer = self._packers.get(name)
+        if packer is not None:
+            return packer(source, **kwargs)
+        return self._predict(name, source, **kwargs)
+
+    def _predict(self, name, source, **kwargs):
+        model = self.get(name)
+        with self._predict_locks[name]:
+            return model(source, **kwargs)
+
+    def pack(self, max_images):
+        """Pack concurrent predict calls into shared batches of up to `max_images` images from now on."""
+        for name in self.weights:
+            self._packers[name] = _BatchPacker(functools.partial(self._predict, name), max_images)
+
+    def warm_up(self, batch_size=1, frame_size=(WARMUP_WIDTH, WARMUP_HEIGHT)):
+        """Load every model and run a dummy batch through it once. Safe to call repeatedly."""
+        with self._warm_lock:
+            if self.warm:
+                return
+            try:
+                start = time.perf_counter()
+                frame = np.zeros((frame_size[1], frame_size[0], 3), dtype=np.uint8)
+                for name in self.weights:
+                    self.predict(name, [frame] * max(1, batch_size), verbose=False)
+                self.warmup_seconds = round(time.perf_counter() - start, 2)
+                self.warm = True
+                self.error = None
+                print(f"--- Models warm after {self.warmup_seconds:.2f}s ---")
+            except Exception as e:
+                self.error = str(e)
+                print(f"Error during model warm-up: {e}")
+
+    def status(self, require_warm=True):
+        """Readiness and load details; without `require_warm` (warm-up disabled) ready means loaded."""
+        return {
+            "ready": self.warm or (not require_warm and self.loaded),
+            "warm": self.warm,
+            "backend": INFERENCE_BACKEND,
+            "loaded": sorted(self._models),
+            "load_seconds": dict(self.load_seconds),
+            "warmup_seconds": self.warmup_seconds,
+            "error": self.error,
+        }
+
+
+registry = ModelRegistry()
@@ -0,0 +1,201 @@
+"""
+Parallel analysis of long videos: the video is split into time segments that are
+analysed in a process pool and merged back into one result and one output file.
+
+Each segment starts SEGMENT_OVERLAP_FRAMES early and runs its tracking and impact
+logic over that overlap without writing or reporting it, so the tracking histories
+and impact cooldown are already warm at the segment's first frame. The merge drops
+any impact that still lands within the cooldown of the previous segment's last one.
+The scale is calibrated once up front and shared by every segment. Segment track
+files (see track_store) hold only their own frames and are joined into one.
+"""
+import concurrent.futures
+import math
+import multiprocessing
+import os
+import subprocess
+import tempfile
+import time
+
+import cv2
+
+from main import analyze_video, calibrate_scale, impact_summary, IMPACT_COOLDOWN_FRAMES
+from track_store import merge_track_files
+from video_output import ffmpeg_path, open_video_writer
+
+PARALLEL_WORKERS = int(os.environ.get('ANALYSIS_PARALLEL_WORKERS', 1))  # 1 keeps analysis sequential
+# Overlap analysed before each segment; covers the 10-sample tracking histories and the impact cooldown
+SEGMENT_OVERLAP_FRAMES = int(os.environ.get('ANALYSIS_SEGMENT_OVERLAP', 30))
+MIN_SEGMENT_FRAMES = int(os.environ.get('ANALYSIS_MIN_SEGMENT_FRAMES', 300))  # Shorter videos are not split
+
+
+def _init_worker(threads):
+    """Give each pool process an equal share of the cores instead of letting every one use all of them."""
+    import torch
+    torch.set_num_threads(threads)
+    cv2.setNumThreads(threads)
+
+
+def _analyze_segment(input_path, output_path, segment, calibration, kwargs):
+    return analyze_video(input_path, output_path, segment=segment, calibration=calibration, **kwargs)
+
+
+def plan_segments(total_frames, workers, min_segment_frames=None):
+    """
+    Split [0, total_frames) into at most `workers` equal (start, end) ranges of at least
+    `min_segment_frames` (default MIN_SEGMENT_FRAMES); the last one reads to the end.
+    """
+    if min_segment_frames is None:
+        min_segment_frames = MIN_SEGMENT_FRAMES
+    count = max(1, min(workers, total_frames // max(1, min_segment_frames)))
+    size = math.ceil(total_frames / count)
+    bounds = [(i * size, (i + 1) * size) for i in range(count)]
+    bounds[-1] = (bounds[-1][0], None)  # The container frame count is only an estimate
+    return bounds
+
+
+def concatenate_videos(paths, output_path, fps, frame_size):
+    """Join segment videos into `output_path`: a stream copy with ffmpeg when available, else a re-encode."""
+    ffmpeg = ffmpeg_path()
+    if ffmpeg:
+        fd, list_path = tempfile.mkstemp(suffix='.txt')
+        try:
+            with os.fdopen(fd, 'w') as f:
+                f.writelines(f"file '{os.path.abspath(path)}'\n" for path in paths)
+            subprocess.run([ffmpeg, '-y', '-loglevel', 'error', '-f', 'concat', '-safe', '0', '-i', list_path,
+                            '-c', 'copy', '-movflags', '+faststart', output_path], check=True)
+            return
+        except subprocess.CalledProcessError as e:
+            print(f"ffmpeg concat failed ({e}); re-encoding segments instead")
+        finally:
+            os.remove(list_path)
+    out = open_video_writer(output_path, fps, frame_size)
+    try:
+        for path in paths:
+            cap = cv2.VideoCapture(path)
+            while True:
+                success, frame = cap.read()
+                if not success:
+                    break
+                out.write(frame)
+            cap.release()
+    finally:
+        out.release()
+
+
+def merge_outputs(segment_stats, fps):
+    """Combine the segments' "output" stats, shifting highlight clips to their place in the joined reel."""
+    output = {"mode": segment_stats[0]["output"]["mode"], "written": False, "highlights": None}
+    if output["mode"] == 'highlights':
+        output["highlights"] = []
+        reel_frames = 0
+        for stats in segment_stats:
+            for clip in stats["output"]["highlights"]:
+                output["highlights"].append(dict(clip, reel_start_seconds=round(clip["reel_start_seconds"] + reel_frames / fps, 2)))
+            reel_frames += sum(clip["reel_frames"] for clip in stats["output"]["highlights"])
+    output["written"] = any(stats["output"]["written"] for stats in segment_stats)
+    return output
+
+
+def merge_stats(segment_stats, calibration, wall_seconds, fps):
+    """Combine per-segment stats into the dict analyze_video would have returned."""
+    impacts = []
+    for impact in sorted((imp for stats in segment_stats for imp in stats["impacts"]), key=lambda imp: imp["frame"]):
+        if impacts and impact["frame"] - impacts[-1]["frame"] < IMPACT_COOLDOWN_FRAMES:
+            continue  # Already counted by the previous segment
+        impacts.append(impact)
+
+    total_frames = sum(stats["total_frames"] for stats in segment_stats)
+    frames_inferred = sum(stats["frames_inferred"] for stats in segment_stats)
+    model_invocations = {}
+    stages = {}
+    for stats in segment_stats:
+        for name, count in stats["model_invocations"].items():
+            model_invocations[name] = model_invocations.get(name, 0) + count
+        for stage, summary in stats["timings"]["stages"].items():
+            merged = stages.setdefault(stage, {"count": 0, "total_seconds": 0.0, "mean_ms": None, "p50_ms": None, "p95_ms": None})
+            merged["count"] += summary["count"]
+            merged["total_seconds"] = round(merged["total_seconds"] + summary["total_seconds"], 3)
+            merged["p50_ms"] = max((v for v in (merged["p50_ms"], summary["p50_ms"]) if v is not None), default=None)
+            merged["p95_ms"] = max((v for v in (merged["p95_ms"], summary["p95_ms"]) if v is not None), default=None)
+    for merged in stages.values():
+        merged["mean_ms"] = round(1000 * merged["total_seconds"] / merged["count"], 2) if merged["count"] else None
+
+    final_stats = {
+        "total_frames": total_frames,
+        "fps": round(fps, 3) if fps else None,
+        "total_shots": len(impacts),
+        "impacts": impacts,
+        "frames_inferred": frames_inferred,
+        "inference_speedup": round(total_frames / frames_inferred, 2) if frames_inferred else None,
+        "model_invocations": model_invocations,
+        "calibration": calibration,
+        "timings": {
+            "wall_seconds": round(wall_seconds, 3),
+            "frames_per_second": round(total_frames / wall_seconds, 2) if wall_seconds > 0 else None,
+            "stages": stages,  # p50/p95 are the worst segment's
+            "segments": [stats["timings"]["wall_seconds"] for stats in segment_stats],
+        },
+        "output": merge_outputs(segment_stats, fps),
+    }
+    final_stats.update(impact_summary(impacts))
+    return final_stats
+
+
+def analyze_video_parallel(input_path, output_path, workers=None, progress_callback=None, camera_id=None, track_path=None, **kwargs):
+    """
+    Drop-in replacement for analyze_video that analyses segments of the video in
+    `workers` processes (default PARALLEL_WORKERS). Videos too short to split, or with
+    an unknown frame count, are analysed sequentially. The on-screen shot counter
+    restarts in each segment; the returned stats count every shot once.
+    `progress_callback(frames_done, total_frames)` is called as segments finish.
+    """
+    workers = max(1, int(workers or PARALLEL_WORKERS))
+    cap = cv2.VideoCapture(input_path)
+    if not cap.isOpened():
+        raise RuntimeError(f"ERROR: Could not open video file {input_path}")
+    fps = cap.get(cv2.CAP_PROP_FPS)
+    frame_size = (int(cap.get(cv2.CAP_PROP_FRAME_WIDTH)), int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT)))
+    total_frames = max(0, int(cap.get(cv2.CAP_PROP_FRAME_COUNT)))
+    segments = plan_segments(total_frames, workers) if total_frames else [(0, None)]
+    if len(segments) == 1:
+        cap.release()
+        return analyze_video(input_path, output_path, progress_callback=progress_callback, camera_id=camera_id,
+                             track_path=track_path, **kwargs)
+
+    started = time.perf_counter()
+    pixels_per_meter, stump_box, _, calibration_source = calibrate_scale(cap, camera_id)
+    cap.release()
+    calibration = (pixels_per_meter, stump_box, calibration_source)
+    print(f"--- Analysing {total_frames} frames in {len(segments)} segments on {workers} processes ---")
+
+    workdir_parent = os.path.dirname(os.path.abspath(output_path or track_path)) if output_path or track_path else None
+    with tempfile.TemporaryDirectory(prefix='segments-', dir=workdir_parent) as workdir:
+        segment_paths = [os.path.join(workdir, f"segment_{i:03d}.mp4") for i in range(len(segments))]
+        track_paths = [os.path.join(workdir, f"segment_{i:03d}.tracks.npz") if track_path else None for i in range(len(segments))]
+        threads = max(1, (os.cpu_count() or 1) // workers)
+        with concurrent.futures.ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context('spawn'),
+                                                    initializer=_init_worker, initargs=(threads,)) as pool:
+            futures = {
+                pool.submit(_analyze_segment, input_path, path, (start, end, SEGMENT_OVERLAP_FRAMES), calibration,
+                            dict(kwargs, track_path=segment_track)): i
+                for i, (path, segment_track, (start, end)) in enumerate(zip(segment_paths, track_paths, segments))
+            }
+            segment_stats = [None] * len(segments)
+            frames_done = 0
+            for future in concurrent.futures.as_completed(futures):
+                stats = future.result()
+                segment_stats[futures[future]] = stats
+                frames_done += stats["total_frames"]
+                if progress_callback:
+                    progress_callback(frames_done, total_frames)
+        # Segments without output ("stats" mode, or highlights without impacts) wrote no file
+        written = [path for path, stats in zip(segment_paths, segment_stats) if stats["output"]["written"]]
+        if written:
+            concatenate_videos(written, output_path, fps, frame_size)
+        if track_path:
+            merge_track_files(track_paths, track_path)
+
+    wall_seconds = time.perf_counter() - started
+    print(f"\nProcessing complete. Output saved to {output_path}" if written else "\nProcessing complete. No video written.")
+    return merge_stats(segment_stats, {"source": calibration_source, "pixels_per_meter": round(pixels_per_meter, 2)}, wall_seconds, fps)
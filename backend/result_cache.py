@@ -0,0 +1,126 @@
+import collections
+import hashlib
+import json
+import os
+import threading
+import time
+
+HASH_CHUNK_SIZE = 1024 * 1024  # Bytes read per step when hashing and copying files and uploads
+FILE_DIGEST_MEMO_SIZE = 256  # Most recently hashed files remembered by file_digest
+
+_file_digests = collections.OrderedDict()
+_file_digests_lock = threading.Lock()
+
+
+def file_digest(path):
+    """
+    SHA-256 of a file, memoised on (path, size, mtime) so weight files are only hashed once.
+    Uploads are hashed through here too, so only the FILE_DIGEST_MEMO_SIZE most recent are kept.
+    """
+    stat = os.stat(path)
+    memo_key = (os.path.abspath(path), stat.st_size, stat.st_mtime_ns)
+    with _file_digests_lock:
+        if memo_key in _file_digests:
+            _file_digests.move_to_end(memo_key)
+            return _file_digests[memo_key]
+    hasher = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(HASH_CHUNK_SIZE), b''):
+            hasher.update(chunk)
+    digest = hasher.hexdigest()
+    with _file_digests_lock:
+        _file_digests[memo_key] = digest
+        while len(_file_digests) > FILE_DIGEST_MEMO_SIZE:
+            _file_digests.popitem(last=False)
+    return digest
+
+
+def cache_key(content_digest, weight_paths, params):
+    """Key a result by the upload content, the model weights and the analysis parameters."""
+    hasher = hashlib.sha256()
+    hasher.update(content_digest.encode())
+    for name in sorted(weight_paths):
+        path = weight_paths[name]
+        weights = file_digest(path) if os.path.exists(path) else 'missing'
+        hasher.update(f"{name}={weights};".encode())
+    hasher.update(json.dumps(params, sort_keys=True).encode())
+    return hasher.hexdigest()
+
+
+class ResultCache:
+    """
+    Content-addressed store of finished analyses. Each entry is a small JSON file with
+    the stats and the names of the processed video and track file in `output_folder`. Entries
+    and their files count against `max_bytes`, and the least recently used ones are evicted first.
+    Job results and recorded sessions may still name an evicted entry's files, so links to
+    them must check the files still exist (see app.processed_video_url).
+    """
+
+    def __init__(self, cache_dir, output_folder, max_bytes):
+        self.cache_dir = cache_dir
+        self.output_folder = output_folder
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        os.makedirs(cache_dir, exist_ok=True)
+
+    def _entry_path(self, key):
+        return os.path.join(self.cache_dir, f"{key}.json")
+
+    def _output_files(self, entry):
+        """Paths of the entry's files in the output folder; stats-only results have no video."""
+        names = (entry.get('output_filename'), entry.get('track_filename'))
+        return [os.path.join(self.output_folder, name) for name in names if name]
+
+    def get(self, key):
+        """Return the cached result for `key`, or None. A hit marks the entry as recently used."""
+        path = self._entry_path(key)
+        try:
+            with open(path) as f:
+                entry = json.load(f)
+        except (OSError, ValueError):
+            return None
+        if entry['output_filename'] and not os.path.exists(os.path.join(self.output_folder, entry['output_filename'])):
+            self._remove(path, entry)
+            return None
+        now = time.time()
+        os.utime(path, (now, now))  # mtime doubles as the LRU timestamp
+        return entry
+
+    def put(self, key, result):
+        """Store a job result ({'output_filename', 'track_filename', 'analysis_data'}) and evict down to the size bound."""
+        path = self._entry_path(key)
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp_path, 'w') as f:
+            json.dump(result, f)
+        os.replace(tmp_path, path)
+        self.evict()
+
+    def _remove(self, path, entry):
+        for victim in [path] + self._output_files(entry):
+            try:
+                os.remove(victim)
+            except OSError:
+                pass
+
+    def evict(self):
+        """Delete least recently used entries (and their files) until the cache fits in max_bytes."""
+        with self._lock:
+            entries = []
+            total = 0
+            for name in os.listdir(self.cache_dir):
+                if not name.endswith('.json'):
+                    continue
+                path = os.path.join(self.cache_dir, name)
+                try:
+                    with open(path) as f:
+                        entry = json.load(f)
+                    size = os.path.getsize(path) + sum(os.path.getsize(f) for f in self._output_files(entry) if os.path.isfile(f))
+                    entries.append((os.path.getmtime(path), path, entry, size))
+                except (OSError, ValueError, KeyError):
+                    continue
+                total += size
+            for _, path, entry, size in sorted(entries, key=lambda e: e[0]):
+                if total <= self.max_bytes:
+                    break
+                self._remove(path, entry)
+                total -= size
@@ -0,0 +1,223 @@
+"""
+Persistent shot database: every finished analysis is recorded as a session with its
+impacts, so questions like "a player's top bat speeds this month" are a query instead
+of a reprocess. SQLite, like the job table; each impact row carries its session's
+player and recording time so leaderboards, percentiles and trends are answered from
+the impacts indexes alone.
+"""
+import datetime
+import math
+import time
+import uuid
+
+from db import connect
+
+TREND_BUCKETS = {"day": "%Y-%m-%d", "week": "%Y-W%W", "month": "%Y-%m"}
+DEFAULT_PERCENTILES = (50, 75, 90, 95, 99)
+MAX_QUERY_LIMIT = 1000
+
+
+def parse_timestamp(value):
+    """Epoch seconds from a number or an ISO 8601 date/time (UTC unless it has an offset); None passes through."""
+    if value is None or value == '':
+        return None
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        pass
+    try:
+        parsed = datetime.datetime.fromisoformat(str(value).replace('Z', '+00:00'))
+    except ValueError:
+        raise ValueError(f"Not a timestamp or ISO 8601 date: {value!r}") from None
+    if parsed.tzinfo is None:
+        parsed = parsed.replace(tzinfo=datetime.timezone.utc)
+    return parsed.timestamp()
+
+
+def _filters(player=None, since=None, until=None):
+    clauses, args = [], []
+    if player is not None:
+        clauses.append("player = ?")
+        args.append(player)
+    if since is not None:
+        clauses.append("recorded_at >= ?")
+        args.append(since)
+    if until is not None:
+        clauses.append("recorded_at < ?")
+        args.append(until)
+    return (" WHERE " + " AND ".join(clauses)) if clauses else "", args
+
+
+def _limit(limit):
+    """A row limit in [1, MAX_QUERY_LIMIT]; SQLite would treat a negative LIMIT as no limit at all."""
+    return max(1, min(int(limit), MAX_QUERY_LIMIT))
+
+
+class ShotStore:
+    """SQLite-backed sessions and impacts, shared by every app process on the host."""
+
+    def __init__(self, db_path):
+        self.db_path = db_path
+        with self._connect() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS sessions (
+                    id TEXT PRIMARY KEY,
+                    source_id TEXT UNIQUE,
+                    player TEXT,
+                    session_tag TEXT,
+                    camera_id TEXT,
+                    video TEXT,
+                    recorded_at REAL NOT NULL,
+                    created_at REAL NOT NULL,
+                    fps REAL,
+                    total_frames INTEGER,
+                    total_shots INTEGER NOT NULL,
+                    average_speed_kmh REAL,
+                    max_speed_kmh REAL
+                )
+            """)
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS impacts (
+                    id INTEGER PRIMARY KEY,
+                    session_id TEXT NOT NULL REFERENCES sessions (id) ON DELETE CASCADE,
+                    player TEXT,
+                    recorded_at REAL NOT NULL,
+                    frame INTEGER NOT NULL,
+                    video_seconds REAL,
+                    speed_kmh REAL NOT NULL,
+                    exit_speed_kmh REAL,
+                    category TEXT,
+                    x REAL,
+                    y REAL
+                )
+            """)
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_sessions_player_recorded ON sessions (player, recorded_at)")
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_sessions_recorded ON sessions (recorded_at)")
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_impacts_session ON impacts (session_id)")
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_impacts_player_recorded ON impacts (player, recorded_at, speed_kmh)")
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_impacts_recorded ON impacts (recorded_at, speed_kmh)")
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_impacts_speed ON impacts (speed_kmh)")
+
+    def _connect(self):
+        return connect(self.db_path, foreign_keys=True)
+
+    def record(self, stats, player=None, session_tag=None, camera_id=None, video=None, recorded_at=None, source_id=None):
+        """
+        Store an analysis (the stats dict from analyze_video) as a session and return its ID.
+        `recorded_at` (epoch seconds) defaults to now. Recording the same `source_id` twice
+        (e.g. a retried job) keeps the first session and returns its ID.
+        """
+        session_id = uuid.uuid4().hex
+        now = time.time()
+        recorded_at = now if recorded_at is None else recorded_at
+        fps = stats.get("fps")
+        impacts = stats["impacts"]
+        with self._connect() as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                if source_id is not None:
+                    row = conn.execute("SELECT id FROM sessions WHERE source_id = ?", (source_id,)).fetchone()
+                    if row is not None:
+                        conn.execute("ROLLBACK")
+                        return row["id"]
+                conn.execute(
+                    "INSERT INTO sessions (id, source_id, player, session_tag, camera_id, video, recorded_at, created_at, fps,"
+                    " total_frames, total_shots, average_speed_kmh, max_speed_kmh) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                    (session_id, source_id, player, session_tag, camera_id, video, recorded_at, now, fps,
+                     stats.get("total_frames"), len(impacts), stats.get("average_speed_kmh"), stats.get("max_speed_kmh")),
+                )
+                conn.executemany(
+                    "INSERT INTO impacts (session_id, player, recorded_at, frame, video_seconds, speed_kmh, exit_speed_kmh,"
+                    " category, x, y) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                    [(session_id, player, recorded_at + (impact["frame"] / fps if fps else 0), impact["frame"],
+                      round(impact["frame"] / fps, 3) if fps else None, impact["speed_kmh"], impact.get("exit_speed_kmh"),
+                      impact.get("category"), *(impact.get("location") or (None, None)))
+                     for impact in impacts],
+                )
+                conn.execute("COMMIT")
+            except Exception:
+                conn.execute("ROLLBACK")
+                raise
+        return session_id
+
+    def get_session(self, session_id):
+        """The session as a dict with its impacts, or None."""
+        with self._connect() as conn:
+            row = conn.execute("SELECT * FROM sessions WHERE id = ?", (session_id,)).fetchone()
+            if row is None:
+                return None
+            impacts = conn.execute(
+                "SELECT frame, video_seconds, speed_kmh, exit_speed_kmh, category, x, y FROM impacts"
+                " WHERE session_id = ? ORDER BY frame", (session_id,),
+            ).fetchall()
+        session = dict(row)
+        session["impacts"] = [dict(impact) for impact in impacts]
+        return session
+
+    def sessions(self, player=None, since=None, until=None, limit=50):
+        """Most recent sessions first."""
+        where, args = _filters(player, since, until)
+        with self._connect() as conn:
+            rows = conn.execute(f"SELECT * FROM sessions{where} ORDER BY recorded_at DESC LIMIT ?",
+                                args + [_limit(limit)]).fetchall()
+        return [dict(row) for row in rows]
+
+    def top_shots(self, player=None, since=None, until=None, limit=10):
+        """The fastest individual shots, with their session and player."""
+        where, args = _filters(player, since, until)
+        with self._connect() as conn:
+            rows = conn.execute(
+                f"SELECT session_id, player, recorded_at, frame, speed_kmh, exit_speed_kmh, category FROM impacts{where}"
+                " ORDER BY speed_kmh DESC LIMIT ?", args + [_limit(limit)],
+            ).fetchall()
+        return [dict(row) for row in rows]
+
+    def leaderboard(self, since=None, until=None, limit=10):
+        """Players ranked by their fastest shot, with shot counts and average speed."""
+        where, args = _filters(None, since, until)
+        where += (" AND " if where else " WHERE ") + "player IS NOT NULL"
+        with self._connect() as conn:
+            rows = conn.execute(
+                f"SELECT player, MAX(speed_kmh) AS max_speed_kmh, ROUND(AVG(speed_kmh), 2) AS average_speed_kmh,"
+                f" COUNT(*) AS shots FROM impacts{where} GROUP BY player ORDER BY max_speed_kmh DESC LIMIT ?",
+                args + [_limit(limit)],
+            ).fetchall()
+        return [dict(row, rank=rank) for rank, row in enumerate(rows, 1)]
+
+    def percentiles(self, player=None, since=None, until=None, percentiles=DEFAULT_PERCENTILES):
+        """
+        Nearest-rank percentiles of shot speed, plus count, mean and max. Each percentile is
+        one indexed ORDER BY ... OFFSET lookup, so no speeds are loaded into Python.
+        """
+        for p in percentiles:
+            if not 0 < p <= 100:
+                raise ValueError(f"Percentiles must be in (0, 100], got {p}")
+        where, args = _filters(player, since, until)
+        with self._connect() as conn:
+            shots, mean, fastest = conn.execute(
+                f"SELECT COUNT(*), AVG(speed_kmh), MAX(speed_kmh) FROM impacts{where}", args).fetchone()
+            result = {"shots": shots, "percentiles": {}}
+            if shots:
+                result["mean_kmh"] = round(mean, 2)
+                result["max_kmh"] = fastest
+                query = f"SELECT speed_kmh FROM impacts{where} ORDER BY speed_kmh LIMIT 1 OFFSET ?"
+                result["percentiles"] = {
+                    f"p{p:g}": conn.execute(query, args + [max(0, math.ceil(p / 100 * shots) - 1)]).fetchone()[0]
+                    for p in percentiles
+                }
+        return result
+
+    def trends(self, player=None, since=None, until=None, bucket="week"):
+        """Shot count, average and max speed per day, week or month (UTC), oldest first."""
+        if bucket not in TREND_BUCKETS:
+            raise ValueError(f"bucket must be one of {', '.join(TREND_BUCKETS)}")
+        where, args = _filters(player, since, until)
+        with self._connect() as conn:
+            rows = conn.execute(
+                f"SELECT strftime(?, recorded_at, 'unixepoch') AS period, COUNT(*) AS shots,"
+                f" ROUND(AVG(speed_kmh), 2) AS average_speed_kmh, MAX(speed_kmh) AS max_speed_kmh"
+                f" FROM impacts{where} GROUP BY period ORDER BY period",
+                [TREND_BUCKETS[bucket]] + args,
+            ).fetchall()
+        return [dict(row) for row in rows]
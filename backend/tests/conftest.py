@@ -0,0 +1,27 @@
+import os
+import sys
+
+import pytest
+
+# The backend modules are imported as top-level modules, as gunicorn and the scripts do
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+@pytest.fixture(scope="session")
+def app_module(tmp_path_factory):
+    """
+    The Flask app module. Importing it creates its databases and upload folders in the
+    working directory and starts the job threads, so it is imported from a scratch
+    directory, with the model warm-up off, and the tests stay in that directory.
+    """
+    cwd = os.getcwd()
+    os.chdir(tmp_path_factory.mktemp("app"))
+    os.environ['WARMUP_ON_START'] = '0'
+    import app
+    yield app
+    os.chdir(cwd)
+
+
+@pytest.fixture
+def client(app_module):
+    return app_module.app.test_client()
@@ -0,0 +1,96 @@
+import hashlib
+import io
+import time
+
+import cv2
+import numpy as np
+import pytest
+
+from main import analysis_params, OUTPUT_MODE
+from models import MODEL_WEIGHTS
+from result_cache import cache_key
+
+
+def make_video(tmp_path, level):
+    path = tmp_path / f"clip_{level}.mp4"
+    out = cv2.VideoWriter(str(path), cv2.VideoWriter_fourcc(*'mp4v'), 30.0, (64, 48))
+    for _ in range(5):
+        out.write(np.full((48, 64, 3), level, dtype=np.uint8))
+    out.release()
+    return path.read_bytes()
+
+
+def post_batch(client, videos, **fields):
+    files = [(io.BytesIO(data), f"net_{i}.mp4") for i, data in enumerate(videos)]
+    return client.post('/analyze/batch', data=dict(fields, videos=files), content_type='multipart/form-data')
+
+
+def wait_for_batch(client, url, timeout=60):
+    """Poll the batch until every job has finished, so no analysis outlives the test."""
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        status = client.get(url).json
+        if status['complete']:
+            return status
+        time.sleep(0.2)
+    raise AssertionError("batch did not finish")
+
+
+def test_batch_queues_one_job_per_video(client, tmp_path):
+    response = post_batch(client, [make_video(tmp_path, 40), make_video(tmp_path, 80)])
+    assert response.status_code == 202
+    jobs = response.json['jobs']
+    assert [job['video'] for job in jobs] == ['net_0.mp4', 'net_1.mp4']
+    assert len({job['job_id'] for job in jobs}) == 2
+    for job in jobs:
+        assert client.get(job['status_url']).json['job_id'] == job['job_id']
+
+    status = wait_for_batch(client, response.json['status_url'])
+    assert [job['job_id'] for job in status['jobs']] == [job['job_id'] for job in jobs]
+    assert status['counts']['done'] + status['counts']['failed'] == 2
+    assert status['summary']['videos'] == 2
+
+
+def test_cached_video_is_recorded_as_a_finished_job(app_module, client, tmp_path):
+    video = make_video(tmp_path, 120)
+    stats = {"total_frames": 5, "total_shots": 1, "impacts": [{"frame": 3, "speed_kmh": 42.0}]}
+    params = dict(analysis_params(), camera_id=None, output_mode=OUTPUT_MODE)
+    app_module.result_cache.put(cache_key(hashlib.sha256(video).hexdigest(), MODEL_WEIGHTS, params),
+                                {'output_filename': None, 'track_filename': None, 'session_id': None, 'analysis_data': stats})
+
+    response = post_batch(client, [video])
+    (job,) = response.json['jobs']
+    assert response.status_code == 202
+    assert job['cached'] and job['status'] == 'done'
+    assert client.get(job['status_url']).json['analysis_data'] == stats
+    status = client.get(response.json['status_url']).json
+    assert status['complete']
+    assert status['summary']['total_shots'] == 1
+    assert status['summary']['max_speed_kmh'] == 42.0
+
+
+def test_batch_has_its_own_body_limit(app_module, client, tmp_path, monkeypatch):
+    videos = [make_video(tmp_path, level) for level in (160, 200)]
+    monkeypatch.setitem(app_module.app.config, 'MAX_CONTENT_LENGTH', max(map(len, videos)) + 4096)
+    response = post_batch(client, videos)  # Over the single-video limit, within the batch one
+    assert response.status_code == 202
+    wait_for_batch(client, response.json['status_url'])
+
+    monkeypatch.setattr(app_module, 'BATCH_UPLOAD_MAX_BYTES', sum(map(len, videos)) // 2)
+    monkeypatch.setattr(app_module, 'MULTIPART_OVERHEAD_BYTES', 0)
+    assert post_batch(client, videos).status_code == 413
+
+
+def test_batch_size_is_capped(app_module, client, tmp_path, monkeypatch):
+    monkeypatch.setattr(app_module, 'BATCH_MAX_VIDEOS', 1)
+    video = make_video(tmp_path, 220)
+    assert post_batch(client, [video, video]).status_code == 413
+
+
+@pytest.mark.parametrize("fields", [{'output_mode': 'everything'}, {'recorded_at': 'yesterday'}])
+def test_invalid_options_queue_nothing(client, tmp_path, fields):
+    assert post_batch(client, [make_video(tmp_path, 240)], **fields).status_code == 400
+
+
+def test_unknown_batch(client):
+    assert client.get('/batches/0123abcd').status_code == 404
@@ -0,0 +1,39 @@
+import benchmark
+import main
+from metrics import StageTimer
+
+
+def test_stage_timer_reports_exact_percentiles_from_samples():
+    timer = StageTimer(keep_samples=True)
+    for ms in range(1, 101):
+        timer.observe("decode", ms / 1000)
+    stage = timer.summary()["decode"]
+    assert stage["count"] == 100
+    assert stage["p50_ms"] == 50.5
+    assert stage["p95_ms"] == 95.05
+
+
+def test_stage_timer_without_samples_reports_bucket_bounds():
+    timer = StageTimer()
+    timer.observe("decode", 0.003)
+    assert timer.samples is None
+    assert timer.summary()["decode"]["p50_ms"] == 5.0  # Upper bound of the 2.5-5 ms bucket
+
+
+def test_synthetic_swing_produces_impacts():
+    report = benchmark.benchmark(["batched"], detectors="stub", width=320, height=180, seconds=3.0,
+                                 stub_call_ms=0, stub_image_ms=0)
+    mode = report["modes"]["batched"]
+    assert mode["impacts"] >= 2  # One per swing period
+    assert "impact" in mode["stages"]
+
+
+def test_synthetic_impacts_report_the_swing_speed(tmp_path, monkeypatch):
+    monkeypatch.setattr(main, "CALIBRATION_CACHE_PATH", str(tmp_path / "calibration_cache.json"))
+    benchmark.install_stub_detectors(0, 0)
+    path = str(tmp_path / "synthetic.mp4")
+    benchmark.make_synthetic_video(path, width=640, height=360, seconds=6.0)
+    stats = main.analyze_video(path, str(tmp_path / "out.mp4"), output_mode="stats")
+    speeds = [impact["speed_kmh"] for impact in stats["impacts"]]
+    assert len(speeds) == 4
+    assert all(25 < speed < 45 for speed in speeds), speeds  # The swing peaks at ~34 km/h
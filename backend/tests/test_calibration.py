@@ -0,0 +1,88 @@
+import json
+
+import numpy as np
+import pytest
+
+import main
+from benchmark import STUMP_COLOR, StubDetector
+
+WIDTH, HEIGHT = 640, 360
+
+
+class FakeCapture:
+    """Just enough of cv2.VideoCapture for calibrate_scale."""
+
+    def __init__(self, frames):
+        self.frames = list(frames)
+
+    def read(self):
+        if not self.frames:
+            return False, None
+        return True, self.frames.pop(0)
+
+    def grab(self):
+        return bool(self.frames) and self.frames.pop(0) is not None
+
+
+def pitch_frame(stump_x=300, seed=0):
+    """A textured frame with 100 px stumps at `stump_x`."""
+    rng = np.random.default_rng(seed)
+    frame = np.zeros((HEIGHT, WIDTH, 3), dtype=np.uint8)
+    frame[..., 1] = rng.integers(60, 160, (HEIGHT, WIDTH), dtype=np.uint8)
+    frame[150:250, stump_x:stump_x + 12] = STUMP_COLOR
+    return frame
+
+
+def calibrate(frames, camera_id=None):
+    return main.calibrate_scale(FakeCapture(frames), camera_id)
+
+
+@pytest.fixture(autouse=True)
+def calibration_cache(tmp_path, monkeypatch):
+    path = tmp_path / "calibration_cache.json"
+    monkeypatch.setattr(main, "CALIBRATION_CACHE_PATH", str(path))
+    monkeypatch.setattr(main, "CALIBRATION_FINGERPRINT", False)
+    main.registry.install("stump", StubDetector("stumps", STUMP_COLOR, call_ms=0, image_ms=0))
+    return path
+
+
+def test_camera_id_reuses_verified_scale():
+    ppm, _, _, source = calibrate([pitch_frame()] * 3, camera_id="net-1")
+    assert source == "detected"
+    cached_ppm, _, replay, source = calibrate([pitch_frame(seed=1)] * 3, camera_id="net-1")
+    assert source == "cache"
+    assert cached_ppm == ppm
+    assert len(replay) == 1
+
+
+def test_moved_stumps_are_recalibrated(calibration_cache):
+    calibrate([pitch_frame(stump_x=100)] * 3, camera_id="net-1")
+    _, stump_box, _, source = calibrate([pitch_frame(stump_x=400)] * 3, camera_id="net-1")
+    assert source == "detected"
+    assert stump_box[0] == 400
+    assert json.loads(calibration_cache.read_text())["camera:net-1"]["stump_box"][0] == 400
+
+
+def test_fingerprint_reuse_is_opt_in(calibration_cache):
+    calibrate([pitch_frame()] * 3)
+    assert not calibration_cache.exists()
+    assert calibrate([pitch_frame()] * 3)[3] == "detected"
+
+
+def test_fingerprint_reuse_when_enabled(monkeypatch):
+    monkeypatch.setattr(main, "CALIBRATION_FINGERPRINT", True)
+    calibrate([pitch_frame()] * 3)
+    assert calibrate([pitch_frame()] * 3)[3] == "cache"
+
+
+@pytest.mark.parametrize("first_frame", [
+    np.zeros((HEIGHT, WIDTH, 3), dtype=np.uint8),  # Black
+    (pitch_frame() * 0.05).astype(np.uint8),  # Fade-in
+    np.full((HEIGHT, WIDTH, 3), 128, dtype=np.uint8),  # Uniform
+])
+def test_featureless_first_frames_are_not_fingerprinted(monkeypatch, calibration_cache, first_frame):
+    monkeypatch.setattr(main, "CALIBRATION_FINGERPRINT", True)
+    assert not main.has_fingerprint_detail(first_frame)
+    assert calibrate([first_frame] + [pitch_frame()] * 20)[3] == "detected"  # Stumps found in a later sample
+    assert not calibration_cache.exists()
+    assert main.lookup_calibration(None, first_frame) is None
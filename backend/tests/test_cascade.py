@@ -0,0 +1,112 @@
+import numpy as np
+import pytest
+
+import main
+from main import InferenceCascade, parse_cascade
+from metrics import StageTimer
+
+
+class Boxes:
+    def __init__(self, data):
+        self.data = data
+
+    def __len__(self):
+        return len(self.data)
+
+
+class Result:
+    def __init__(self, detected):
+        self.boxes = Boxes(np.array([[0, 0, 10, 10, 0.9, 0]] if detected else np.zeros((0, 6)), dtype=np.float32))
+        self.keypoints = None
+
+
+class CountingModel:
+    """Detects something on the frames whose id is in `detect_on`, and records every frame id it is run on."""
+
+    def __init__(self, detect_on=()):
+        self.detect_on = set(detect_on)
+        self.seen = []
+        self.calls = []
+
+    def __call__(self, source, verbose=False, **kwargs):
+        ids = [int(frame[0, 0, 0]) for frame in source]
+        self.seen.extend(ids)
+        self.calls.append(kwargs)
+        return [Result(i in self.detect_on) for i in ids]
+
+
+@pytest.fixture
+def models(monkeypatch):
+    """Counting stand-ins for the three detectors; the bat is seen on frames 2 and 3."""
+    installed = {"bat": CountingModel(detect_on={2, 3}), "ball": CountingModel(), "pose": CountingModel()}
+    for name, model in installed.items():
+        monkeypatch.setitem(main.registry._models, name, model)
+    return installed
+
+
+def frames(start, count):
+    return [np.full((4, 4, 3), i, dtype=np.uint8) for i in range(start, start + count)]
+
+
+def test_parse_cascade():
+    assert parse_cascade(" pose:bat, ball:bat ,") == {"pose": "bat", "ball": "bat"}
+    assert parse_cascade("") == {}
+    assert parse_cascade(None) == {}
+
+
+@pytest.mark.parametrize("gates", [{"pose": "racket"}, {"bat": "ball", "ball": "bat"}])
+def test_unknown_models_and_cycles_are_refused(gates):
+    with pytest.raises(ValueError):
+        InferenceCascade(gates)
+
+
+def test_gate_models_run_first():
+    order = InferenceCascade({"bat": "pose"}).order
+    assert order.index("pose") < order.index("bat")
+
+
+def test_ungated_models_run_on_every_frame(models):
+    inference = InferenceCascade()
+    results = inference.run(frames(0, 4))
+    assert len(results) == 4 and all(result is not None for frame_results in results for result in frame_results)
+    assert inference.invocations == {"bat": 4, "ball": 4, "pose": 4}
+    assert models["bat"].calls == [main.DETECTORS["bat"]]  # One batched call, at the analysis threshold
+
+
+def test_gated_models_only_run_where_the_gate_detected(models):
+    inference = InferenceCascade({"pose": "bat", "ball": "bat"})
+    results = inference.run(frames(0, 6))
+    assert models["pose"].seen == [2, 3] and models["ball"].seen == [2, 3]
+    assert [pose is not None for _, _, pose in results] == [False, False, True, True, False, False]
+    assert inference.invocations == {"bat": 6, "ball": 2, "pose": 2}
+
+
+def test_hold_keeps_the_gate_open_across_batches(models):
+    inference = InferenceCascade({"pose": "bat"}, hold=3)
+    inference.run(frames(0, 4))
+    inference.run(frames(4, 4))
+    assert models["pose"].seen == [2, 3, 4, 5, 6]
+
+
+def test_interval_skips_frames_unless_dense(models):
+    inference = InferenceCascade(intervals={"ball": 2})
+    results = inference.run(frames(0, 3))
+    inference.run(frames(3, 3))
+    assert models["ball"].seen == [0, 2, 4]
+    assert results[1][1] is None
+    inference.dense = {"ball"}
+    inference.run(frames(6, 2))
+    assert models["ball"].seen[-2:] == [6, 7]
+
+
+def test_run_skipped_catches_up_on_one_skipped_frame(models):
+    timer = StageTimer()
+    inference = InferenceCascade(intervals={"ball": 2}, timer=timer)
+    batch = frames(0, 4)
+    inference.run(batch)
+    assert inference.run_skipped("ball", batch[0], 0) is None  # Already run there
+    assert inference.run_skipped("ball", batch[1], 1) is not None
+    assert inference.run_skipped("ball", batch[1], 1) is None  # Only once
+    assert models["ball"].seen == [0, 2, 1]
+    assert inference.invocations["ball"] == 3
+    assert timer.summary()["model_ball"]["count"] == 2
@@ -0,0 +1,41 @@
+import numpy as np
+import pytest
+
+import compare_backends
+from benchmark import _Result
+from compare_backends import parity, run_model
+
+
+def pose_result(shift=0.0):
+    """One person with three keypoints, shifted right by `shift` pixels."""
+    keypoints = np.array([[[10 + shift, 10, 0.9], [20 + shift, 20, 0.9], [30 + shift, 30, 0.9]]], dtype=np.float32)
+    return _Result(np.array([[0 + shift, 0, 40 + shift, 40, 0.8, 0]], dtype=np.float32), keypoints)
+
+
+def test_models_run_at_the_analysis_thresholds():
+    calls = []
+
+    def model(frame, **kwargs):
+        calls.append(kwargs)
+        return [pose_result()]
+
+    _, detections = run_model(model, [np.zeros((4, 4, 3), dtype=np.uint8)] * 2, compare_backends.PREDICT_KWARGS["ball"])
+    assert calls and all(call == {"verbose": False, "conf": 0.15} for call in calls)
+    xyxy, conf, cls, keypoints = detections[0]
+    assert xyxy.shape == (1, 4) and keypoints.shape == (1, 3, 3)
+
+
+def test_keypoint_parity_of_matched_people():
+    _, reference = run_model(lambda frame, **kwargs: [pose_result()], [None])
+    _, close = run_model(lambda frame, **kwargs: [pose_result(shift=2)], [None])
+    _, far = run_model(lambda frame, **kwargs: [pose_result(shift=8)], [None])
+    assert parity(reference, close)["keypoint_mean_px"] == pytest.approx(2.0)
+    assert parity(reference, close)["keypoint_within_tolerance"] == 1.0
+    assert parity(reference, far)["keypoint_within_tolerance"] == 0.0
+
+
+def test_detection_models_report_no_keypoint_parity():
+    boxes = np.array([[0, 0, 40, 40, 0.8, 0]], dtype=np.float32)
+    _, reference = run_model(lambda frame, **kwargs: [_Result(boxes)], [None])
+    report = parity(reference, reference)
+    assert report["recall"] == 1.0 and report["keypoint_mean_px"] is None
@@ -0,0 +1,61 @@
+import numpy as np
+import pytest
+
+from benchmark import _Result
+from main import extract_boxes, extract_keypoints, select_batsman
+
+
+def boxes_result():
+    return _Result(np.array([[10, 20, 30, 40, 0.9, 0],
+                             [50, 60, 70, 80, 0.4, 32]], dtype=np.float32))
+
+
+def test_boxes_split_into_coordinates_confidences_and_classes():
+    xyxy, conf, cls = extract_boxes(boxes_result())
+    assert xyxy.tolist() == [[10, 20, 30, 40], [50, 60, 70, 80]]
+    assert conf.tolist() == pytest.approx([0.9, 0.4])
+    assert cls.tolist() == [0, 32]
+
+
+def test_boxes_filtered_by_class_and_offset():
+    xyxy, conf, cls = extract_boxes(boxes_result(), class_index=32, offset=(100, 200))
+    assert xyxy.tolist() == [[150, 260, 170, 280]]
+    assert conf.tolist() == pytest.approx([0.4]) and cls.tolist() == [32]
+
+
+@pytest.mark.parametrize("result", [None, _Result(np.zeros((0, 6), dtype=np.float32))])
+def test_no_boxes_give_empty_arrays(result):
+    xyxy, conf, cls = extract_boxes(result)
+    assert xyxy.shape == (0, 4) and conf.shape == (0,) and cls.shape == (0,)
+
+
+def test_keypoints_without_confidences_are_treated_as_confident():
+    keypoints = np.array([[[1, 2], [3, 4]]], dtype=np.float32)
+    kps = extract_keypoints(_Result(np.zeros((0, 6), dtype=np.float32), keypoints), offset=(10, 20))
+    assert kps.tolist() == [[[11, 22, 1], [13, 24, 1]]]
+    assert extract_keypoints(None).shape == (0, 0, 3)
+
+
+def people(*wrists):
+    """Keypoints for one person per (left, right) pair of (x, y, confidence) wrists."""
+    keypoints = np.zeros((len(wrists), 17, 3), dtype=np.float32)
+    for person, (left, right) in enumerate(wrists):
+        keypoints[person, 9] = left
+        keypoints[person, 10] = right
+    return keypoints
+
+
+def test_batsman_is_the_person_whose_wrist_is_closest_to_the_bat():
+    keypoints = people(((500, 500, 0.9), (0, 0, 0)), ((110, 100, 0.9), (0, 0, 0)))
+    assert select_batsman(keypoints, (100, 100)) == 1
+
+
+def test_left_wrist_preferred_when_confident():
+    # The right wrist is on the bat but the confident left wrist is used for the distance
+    keypoints = people(((400, 100, 0.9), (100, 100, 0.9)), ((200, 100, 0.2), (150, 100, 0.9)))
+    assert select_batsman(keypoints, (100, 100)) == 1
+
+
+def test_nobody_with_a_confident_wrist():
+    assert select_batsman(people(((100, 100, 0.3), (100, 100, 0.5))), (100, 100)) == -1
+    assert select_batsman(np.zeros((0, 17, 3), dtype=np.float32), (100, 100)) == -1
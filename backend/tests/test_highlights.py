@@ -0,0 +1,43 @@
+import queue
+import threading
+
+import numpy as np
+
+import main
+
+
+class ReelWriter:
+    """Collects the frame numbers written to the reel."""
+
+    def __init__(self):
+        self.frames = []
+
+    def write(self, frame):
+        self.frames.append(int(frame[-1, -1, 0]))  # Below the scoreboard band
+
+
+def write_highlights(impact_frames, total=12, discard=0, before=3, after=1):
+    scoreboard = main.AnalysisSession(30.0, pixels_per_meter=100.0).scoreboard_state(0.0, None)
+    render_queue = queue.Queue()
+    for i in range(total):
+        frame = np.full((80, 120, 3), i, dtype=np.uint8)
+        annotations = {"bats": [], "balls": [], "wrists": [], "scoreboard": scoreboard,
+                       "impact_location": (60, 40) if i in impact_frames else None}
+        render_queue.put((frame, annotations))
+    render_queue.put(main._END_OF_STREAM)
+    reel, clips = ReelWriter(), []
+    main.highlight_writer(lambda: reel, render_queue, threading.Event(), [], discard=discard,
+                          before=before, after=after, clips=clips)
+    return reel.frames, clips
+
+
+def test_clip_includes_frames_before_and_after_the_impact():
+    frames, clips = write_highlights({6})
+    assert frames == [3, 4, 5, 6, 7]
+    assert [(c["start"], c["end"], c["frames"]) for c in clips] == [(3, 8, 5)]
+
+
+def test_segment_overlap_is_not_pre_rolled():
+    frames, clips = write_highlights({2, 6}, discard=5)
+    assert frames == [5, 6, 7]  # Frames 2-4 are the previous segment's, impact or not
+    assert [(c["start"], c["end"]) for c in clips] == [(5, 8)]
@@ -0,0 +1,122 @@
+import os
+import sqlite3
+import time
+
+import jobs
+from jobs import JobQueue, JobStore, DONE, FAILED, QUEUED, RUNNING
+
+
+def make_store(tmp_path):
+    return JobStore(str(tmp_path / 'jobs.db'))
+
+
+def test_expired_lease_is_requeued_even_if_its_pid_is_reused(tmp_path):
+    store = make_store(tmp_path)
+    job_id = store.create({'input_path': 'a.mp4'})
+    # The previous process had this process's PID, as after a container restart
+    store.claim_next(f"host:{os.getpid()}:previous")
+    time.sleep(0.01)
+
+    assert store.requeue_expired(lease_seconds=0) == 1
+    job = store.get(job_id)
+    assert job['status'] == QUEUED
+    assert job['owner'] is None
+
+
+def test_renewed_lease_is_not_requeued(tmp_path):
+    store = make_store(tmp_path)
+    job_id = store.create({})
+    store.claim_next('owner-a')
+    assert store.renew('owner-a') == 1
+    assert store.renew('owner-b') == 0
+
+    assert store.requeue_expired(lease_seconds=60) == 0
+    assert store.get(job_id)['status'] == RUNNING
+
+
+def test_stale_owner_cannot_finish_a_reclaimed_job(tmp_path):
+    store = make_store(tmp_path)
+    job_id = store.create({})
+    store.claim_next('stalled')
+    time.sleep(0.01)
+    store.requeue_expired(lease_seconds=0)
+    store.claim_next('fresh')
+
+    assert not store.finish(job_id, {'late': True}, owner='stalled')
+    store.update_progress(job_id, 50, 100, owner='stalled')
+    job = store.get(job_id)
+    assert (job['status'], job['owner'], job['frames_done']) == (RUNNING, 'fresh', 0)
+    assert store.finish(job_id, {'ok': True}, owner='fresh')
+    assert store.get(job_id)['result'] == {'ok': True}
+
+
+def test_job_that_keeps_losing_its_worker_fails(tmp_path):
+    store = make_store(tmp_path)
+    job_id = store.create({'input_path': 'crashes-the-worker.mp4'})
+    for attempt in range(1, 4):
+        assert store.claim_next(f"worker-{attempt}")['attempts'] == attempt
+        time.sleep(0.01)
+        assert store.requeue_expired(lease_seconds=0, max_attempts=3) == (1 if attempt < 3 else 0)
+
+    job = store.get(job_id)
+    assert job['status'] == FAILED
+    assert '3 attempts' in job['error']
+    assert store.claim_next('worker-4') is None
+
+
+def test_database_from_before_leases_is_migrated(tmp_path):
+    path = str(tmp_path / 'jobs.db')
+    conn = sqlite3.connect(path)
+    conn.execute("""
+        CREATE TABLE jobs (id TEXT PRIMARY KEY, status TEXT NOT NULL, payload TEXT NOT NULL, result TEXT, error TEXT,
+                           owner TEXT, frames_done INTEGER NOT NULL DEFAULT 0, total_frames INTEGER NOT NULL DEFAULT 0,
+                           created_at REAL NOT NULL, started_at REAL, finished_at REAL)
+    """)
+    conn.execute("INSERT INTO jobs (id, status, payload, owner, created_at, started_at) VALUES ('old', ?, '{}', '1', 0, 0)",
+                 (RUNNING,))
+    conn.commit()
+    conn.close()
+
+    store = JobStore(path)
+    assert store.requeue_expired() == 1
+    assert store.get('old')['status'] == QUEUED
+    assert store.get('old')['batch_id'] is None
+    assert store.get('old')['attempts'] == 0
+
+
+def test_batch_lists_its_jobs_in_submission_order(tmp_path):
+    store = make_store(tmp_path)
+    first = store.create({'n': 1}, batch_id='b1')
+    store.create({'n': 2})
+    cached = store.create({'n': 3}, batch_id='b1', result={'cached': True})
+
+    batch = store.batch('b1')
+    assert [job['id'] for job in batch] == [first, cached]
+    assert [job['status'] for job in batch] == [QUEUED, DONE]
+    assert batch[1]['result'] == {'cached': True}
+    assert store.claim_next('owner')['id'] == first  # Finished jobs are never claimed
+    assert store.batch('unknown') == []
+
+
+def test_queue_runs_jobs_and_records_progress(tmp_path, monkeypatch):
+    monkeypatch.setattr(jobs, 'PROGRESS_INTERVAL_SECONDS', 0)
+    seen = []
+
+    def handler(payload, progress, job_id):
+        progress(5, 10)
+        seen.append((payload['n'], job_id))
+        return {'double': payload['n'] * 2}
+
+    queue = JobQueue(make_store(tmp_path), handler)
+    queue.start()
+    job_id = queue.submit({'n': 21})
+    deadline = time.monotonic() + 5
+    while queue.store.get(job_id)['status'] != DONE and time.monotonic() < deadline:
+        time.sleep(0.02)
+
+    job = queue.store.get(job_id)
+    assert job['status'] == DONE
+    assert job['result'] == {'double': 42}
+    assert job['total_frames'] == 10
+    assert job['owner'] == queue.owner and str(os.getpid()) in queue.owner
+    assert seen == [(21, job_id)]
@@ -0,0 +1,45 @@
+import os
+
+import pytest
+
+import benchmark
+import main
+from live import LiveAnalysis, FINISHED
+
+
+@pytest.fixture
+def synthetic_clip(tmp_path, monkeypatch):
+    monkeypatch.setattr(main, "CALIBRATION_CACHE_PATH", str(tmp_path / "calibration_cache.json"))
+    benchmark.install_stub_detectors(0, 0)
+    path = str(tmp_path / "synthetic.mp4")
+    benchmark.make_synthetic_video(path, width=320, height=180, seconds=3.0)
+    return path
+
+
+def run_live(source, **kwargs):
+    finished = []
+    live = LiveAnalysis(source, realtime=True, on_finish=finished.append, **kwargs).start()
+    live._thread.join(timeout=60)
+    assert live.state == FINISHED, live.error
+    return live, finished[0]
+
+
+def test_file_source_impacts_keep_their_source_frame_numbers(synthetic_clip, tmp_path):
+    expected = main.analyze_video(synthetic_clip, str(tmp_path / "out.mp4"), output_mode="stats")
+    live, stats = run_live(synthetic_clip)
+    assert expected["impacts"]
+    assert [imp["frame"] for imp in stats["impacts"]] == [imp["frame"] for imp in expected["impacts"]]
+    assert live.counts["frames_read"] == stats["total_frames"]
+
+
+def test_uploaded_source_is_removed_when_the_stream_ends(synthetic_clip):
+    run_live(synthetic_clip, remove_source=True)
+    assert not os.path.exists(synthetic_clip)
+
+
+def test_no_ball_exit_event_without_an_exit_speed(synthetic_clip, monkeypatch):
+    monkeypatch.setattr(main.AnalysisSession, "_ball_flight", lambda self, frame, location: ([], None))
+    live, stats = run_live(synthetic_clip)
+    events = list(live.subscribe().queue)
+    assert stats["impacts"] and any(event["event"] == "impact" for event in events)
+    assert not [event for event in events if event["event"] == "ball_exit"]
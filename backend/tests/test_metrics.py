@@ -0,0 +1,76 @@
+import io
+
+import pytest
+
+from metrics import Histogram, MetricsRegistry, StageTimer, metrics
+
+
+def test_histogram_buckets_and_quantiles():
+    histogram = Histogram(buckets=(1, 5, 10))
+    for value in (0.5, 1, 3, 7, 20):
+        histogram.observe(value)
+    assert histogram.counts == [2, 1, 1, 1]  # Bounds are inclusive; the last slot is +Inf
+    assert histogram.count == 5 and histogram.sum == pytest.approx(31.5)
+    assert histogram.quantile(0.4) == 1
+    assert histogram.quantile(0.6) == 5
+    assert histogram.quantile(1.0) == 10  # +Inf reports the largest finite bound
+    assert Histogram().quantile(0.5) is None
+
+
+def test_render_uses_the_prometheus_text_format():
+    registry = MetricsRegistry()
+    registry.counter('jobs_total', 'Jobs run', status='done').inc(2)
+    registry.counter('jobs_total', 'Jobs run', status='failed').inc()
+    registry.histogram('video_seconds', 'Video time', buckets=(1, 10)).observe(4)
+    assert registry.render().splitlines() == [
+        '# HELP jobs_total Jobs run',
+        '# TYPE jobs_total counter',
+        'jobs_total{status="done"} 2',
+        'jobs_total{status="failed"} 1',
+        '# HELP video_seconds Video time',
+        '# TYPE video_seconds histogram',
+        'video_seconds_bucket{le="1"} 0',
+        'video_seconds_bucket{le="10"} 1',
+        'video_seconds_bucket{le="+Inf"} 1',
+        'video_seconds_sum 4.0',
+        'video_seconds_count 1',
+    ]
+
+
+def test_same_name_and_labels_share_one_series():
+    registry = MetricsRegistry()
+    assert registry.counter('a_total', 'A', x='1') is registry.counter('a_total', 'A', x='1')
+    assert registry.counter('a_total', 'A', x='1') is not registry.counter('a_total', 'A', x='2')
+
+
+def test_stage_timer_totals_and_process_histogram():
+    process = metrics.histogram('analysis_stage_seconds', 'Time spent per pipeline stage call', stage='test_stage')
+    before = process.count
+    timer = StageTimer()
+    timer.observe('test_stage', 0.002)
+    timer.observe('test_stage', 0.004)
+    with timer.time('other_stage'):
+        pass
+    summary = timer.summary()
+    assert summary['test_stage']['count'] == 2
+    assert summary['test_stage']['total_seconds'] == 0.006
+    assert summary['test_stage']['mean_ms'] == 3.0
+    assert summary['other_stage']['count'] == 1
+    assert process.count == before + 2
+
+
+def test_metrics_endpoint_counts_rejected_uploads(client):
+    def rejected():
+        for line in client.get('/metrics').get_data(as_text=True).splitlines():
+            if line.startswith('uploads_rejected_total{status="422"}'):
+                return int(line.split()[-1])
+        return 0
+
+    before = rejected()
+    response = client.post('/analyze', data={'video': (io.BytesIO(b'not a video' * 100), 'net.mp4')},
+                           content_type='multipart/form-data')
+    assert response.status_code == 422
+    page = client.get('/metrics')
+    assert page.mimetype == 'text/plain'
+    assert '# TYPE uploads_rejected_total counter' in page.get_data(as_text=True)
+    assert rejected() == before + 1
@@ -0,0 +1,74 @@
+import threading
+import time
+
+from models import ModelRegistry, _BatchPacker
+
+
+class EchoModel:
+    names = {0: 'thing'}
+
+    def __init__(self):
+        self.calls = []
+
+    def __call__(self, source, verbose=False, **kwargs):
+        self.calls.append(len(source))
+        return [f"result-{id(image)}" for image in source]
+
+
+def make_registry():
+    registry = ModelRegistry(weights={'bat': 'bat.pt', 'ball': 'ball.pt'}, tasks={'bat': 'detect', 'ball': 'detect'})
+    for name in registry.weights:
+        registry.install(name, EchoModel())
+    return registry
+
+
+def test_ready_once_loaded_when_warm_up_is_disabled():
+    registry = ModelRegistry(weights={'bat': 'bat.pt', 'ball': 'ball.pt'}, tasks={'bat': 'detect', 'ball': 'detect'})
+    assert not registry.status(require_warm=False)['ready']
+    registry.install('bat', EchoModel())
+    assert not registry.status(require_warm=False)['ready']
+    registry.install('ball', EchoModel())
+
+    assert registry.status(require_warm=False)['ready']
+    assert not registry.status()['ready']  # Warm-up is still expected by default
+
+
+def test_ready_after_warm_up():
+    registry = make_registry()
+    registry.warm_up(batch_size=2, frame_size=(64, 48))
+
+    status = registry.status()
+    assert status['ready'] and status['warm']
+    assert status['error'] is None
+    assert registry.get('bat').calls == [2]
+
+
+def test_packer_merges_concurrent_calls_and_splits_results():
+    started = threading.Event()
+    calls = []
+
+    def run(images, **kwargs):
+        calls.append(list(images))
+        started.set()
+        deadline = time.monotonic() + 5
+        while len(calls) == 1 and len(packer._pending) < 2 and time.monotonic() < deadline:
+            time.sleep(0.005)  # Hold the model until the other callers have queued up
+        return [image * 10 for image in images]
+
+    packer = _BatchPacker(run, max_images=8)
+    results = {}
+
+    def call(key, images):
+        results[key] = packer(images, conf=0.25)
+
+    first = threading.Thread(target=call, args=('first', [1]))
+    first.start()
+    started.wait()
+    others = [threading.Thread(target=call, args=(key, images)) for key, images in (('a', [2, 3]), ('b', [4]))]
+    for thread in others:
+        thread.start()
+    for thread in [first] + others:
+        thread.join()
+
+    assert results == {'first': [10], 'a': [20, 30], 'b': [40]}
+    assert len(calls) == 2 and sorted(calls[1]) == [2, 3, 4]
@@ -0,0 +1,29 @@
+import cv2
+import numpy as np
+import pytest
+
+import main
+
+TEXTS = ["Scale: SET", "Impact: DETECTED", "Impact Speed: 87.3 km/h", "Shots: 12", "POWER HIT!", "(|)[]{}", " "]
+ORGS = [(20, 25), (0, 5), (-6, 12), (300, 55), (330, 78)]
+
+
+def binary_text_rendering():
+    canvas = np.zeros((40, 200), dtype=np.uint8)
+    cv2.putText(canvas, "Shots: 12", (5, 30), main.FONT, 0.7, 255, 2)
+    return set(np.unique(canvas)) <= {0, 255}
+
+
+@pytest.mark.parametrize("text", TEXTS)
+@pytest.mark.parametrize("org", ORGS)
+def test_stamp_text_matches_put_text(text, org):
+    rng = np.random.default_rng(0)
+    frame = rng.integers(0, 256, (80, 360, 3), dtype=np.uint8)
+    expected = frame.copy()
+    cv2.putText(expected, text, org, main.FONT, 0.7, (50, 205, 255), 2)
+    main.stamp_text(frame, text, org, 0.7, (50, 205, 255), 2)
+    difference = np.abs(frame.astype(int) - expected.astype(int))
+    if binary_text_rendering():
+        assert difference.max() == 0
+    else:  # Anti-aliased edges are blended from 8-bit coverage, so may round differently
+        assert difference.max() <= 1
@@ -0,0 +1,119 @@
+import cv2
+import numpy as np
+import pytest
+
+import main
+import parallel
+from parallel import merge_stats, plan_segments
+
+FRAME_COUNT = 40
+
+
+@pytest.fixture(scope="module")
+def numbered_video(tmp_path_factory):
+    """An mp4 whose frame i is black apart from a white band at columns [8i, 8i + 8)."""
+    path = str(tmp_path_factory.mktemp("video") / "numbered.mp4")
+    out = cv2.VideoWriter(path, cv2.VideoWriter_fourcc(*'mp4v'), 30.0, (8 * FRAME_COUNT, 48))
+    for i in range(FRAME_COUNT):
+        out.write(numbered_frame(i))
+    out.release()
+    return path
+
+
+def numbered_frame(i):
+    frame = np.zeros((48, 8 * FRAME_COUNT, 3), dtype=np.uint8)
+    frame[:, 8 * i:8 * i + 8] = 255
+    return frame
+
+
+def frame_number(frame):
+    return int(frame.mean(axis=(0, 2)).argmax()) // 8
+
+
+class KeyframeCapture:
+    """A capture whose seeks land `offset` frames away from the target, like a keyframe-snapping backend."""
+
+    def __init__(self, offset):
+        self.offset = offset
+        self.position = 0
+
+    def set(self, prop, value):
+        self.position = int(value) + self.offset
+        return True
+
+    def get(self, prop):
+        return self.position
+
+    def grab(self):
+        self.position += 1
+        return self.position <= FRAME_COUNT
+
+    def read(self):
+        frame = numbered_frame(self.position)
+        self.position += 1
+        return True, frame
+
+    def release(self):
+        pass
+
+
+def test_plan_segments_splits_evenly_and_leaves_the_last_open():
+    assert plan_segments(1000, 4, min_segment_frames=100) == [(0, 250), (250, 500), (500, 750), (750, None)]
+
+
+def test_plan_segments_keeps_segments_above_the_minimum():
+    assert plan_segments(1000, 8, min_segment_frames=300) == [(0, 334), (334, 668), (668, None)]
+    assert plan_segments(200, 4, min_segment_frames=300) == [(0, None)]
+
+
+def test_plan_segments_reads_the_minimum_at_call_time(monkeypatch):
+    monkeypatch.setattr(parallel, "MIN_SEGMENT_FRAMES", 500)
+    assert len(plan_segments(1000, 4)) == 2
+
+
+def segment(impact_frames, total_frames=100, stages=None):
+    return {
+        "impacts": [{"frame": f, "speed_kmh": 40.0} for f in impact_frames],
+        "total_frames": total_frames,
+        "frames_inferred": total_frames // 2,
+        "model_invocations": {"bat": 10},
+        "timings": {"wall_seconds": 1.0, "stages": stages or {}},
+        "output": {"mode": "full", "written": True, "highlights": None},
+    }
+
+
+def test_merge_stats_drops_impacts_repeated_across_the_overlap():
+    cooldown = main.IMPACT_COOLDOWN_FRAMES
+    stats = merge_stats([segment([20, 95]), segment([95 + cooldown // 2, 150])], {"source": "cache"}, 2.0, 30.0)
+    assert [imp["frame"] for imp in stats["impacts"]] == [20, 95, 150]
+    assert stats["total_shots"] == 3
+    assert stats["total_frames"] == 200
+    assert stats["frames_inferred"] == 100
+    assert stats["model_invocations"] == {"bat": 20}
+    assert stats["timings"]["frames_per_second"] == 100.0
+
+
+def test_merge_stats_combines_stage_timings():
+    first = {"decode": {"count": 10, "total_seconds": 0.1, "mean_ms": 10.0, "p50_ms": 9.0, "p95_ms": 20.0}}
+    second = {"decode": {"count": 30, "total_seconds": 0.5, "mean_ms": 16.67, "p50_ms": 15.0, "p95_ms": 18.0}}
+    stage = merge_stats([segment([], stages=first), segment([], stages=second)], {}, 1.0, 30.0)["timings"]["stages"]["decode"]
+    assert stage == {"count": 40, "total_seconds": 0.6, "mean_ms": 15.0, "p50_ms": 15.0, "p95_ms": 20.0}
+
+
+def test_seek_frame_positions_a_real_capture(numbered_video):
+    cap = main.seek_frame(cv2.VideoCapture(numbered_video), 23, numbered_video)
+    success, frame = cap.read()
+    cap.release()
+    assert success and frame_number(frame) == 23
+
+
+def test_seek_frame_grabs_forward_after_landing_early(numbered_video):
+    cap = main.seek_frame(KeyframeCapture(offset=-5), 23, numbered_video)
+    assert frame_number(cap.read()[1]) == 23
+
+
+def test_seek_frame_reopens_after_overshooting(numbered_video):
+    cap = main.seek_frame(KeyframeCapture(offset=4), 23, numbered_video)
+    success, frame = cap.read()
+    cap.release()
+    assert success and frame_number(frame) == 23
@@ -0,0 +1,117 @@
+import hashlib
+import io
+import os
+
+import cv2
+import numpy as np
+import pytest
+
+import result_cache
+from main import analysis_params, OUTPUT_MODE
+from models import MODEL_WEIGHTS
+from result_cache import ResultCache, cache_key, file_digest
+from shots import ShotStore
+
+
+def result(output_filename=None, track_filename=None, shots=1):
+    return {"output_filename": output_filename, "track_filename": track_filename, "session_id": "first",
+            "analysis_data": {"total_shots": shots, "fps": 30.0, "impacts": [{"frame": 10, "speed_kmh": 40.0}] * shots}}
+
+
+@pytest.fixture
+def cache(tmp_path):
+    (tmp_path / "outputs").mkdir()
+    return ResultCache(str(tmp_path / "cache"), str(tmp_path / "outputs"), max_bytes=10_000)
+
+
+def write_output(cache, name, size):
+    with open(os.path.join(cache.output_folder, name), 'wb') as f:
+        f.write(b'x' * size)
+
+
+def age(cache, key, seconds):
+    path = cache._entry_path(key)
+    mtime = os.path.getmtime(path) - seconds
+    os.utime(path, (mtime, mtime))
+
+
+def test_put_then_get(cache):
+    write_output(cache, "a.mp4", 100)
+    cache.put("a", result("a.mp4"))
+    assert cache.get("a") == result("a.mp4")
+    assert cache.get("unknown") is None
+
+
+def test_entry_whose_video_is_gone_is_dropped(cache):
+    write_output(cache, "a.mp4", 100)
+    cache.put("a", result("a.mp4"))
+    os.remove(os.path.join(cache.output_folder, "a.mp4"))
+    assert cache.get("a") is None
+    assert not os.path.exists(cache._entry_path("a"))
+
+
+def test_eviction_removes_the_least_recently_used_entries_and_their_files(cache):
+    for key, seconds in (("used", 100), ("old", 50)):
+        write_output(cache, f"{key}.mp4", 4000)
+        write_output(cache, f"{key}.tracks.npz", 500)
+        cache.put(key, result(f"{key}.mp4", f"{key}.tracks.npz"))
+        age(cache, key, seconds)
+    assert cache.get("used") is not None  # The hit makes it the most recently used
+    write_output(cache, "new.mp4", 4000)
+    cache.put("new", result("new.mp4"))  # 13.5 kB in all: one entry has to go
+
+    assert cache.get("old") is None
+    assert not os.path.exists(os.path.join(cache.output_folder, "old.mp4"))
+    assert not os.path.exists(os.path.join(cache.output_folder, "old.tracks.npz"))
+    assert cache.get("used") is not None and cache.get("new") is not None
+
+
+def test_file_digest_memo_is_bounded(tmp_path, monkeypatch):
+    monkeypatch.setattr(result_cache, "FILE_DIGEST_MEMO_SIZE", 2)
+    monkeypatch.setattr(result_cache, "_file_digests", result_cache.collections.OrderedDict())
+    for i in range(4):
+        path = tmp_path / f"{i}.bin"
+        path.write_bytes(bytes([i]) * 10)
+        assert file_digest(str(path)) == hashlib.sha256(bytes([i]) * 10).hexdigest()
+    assert len(result_cache._file_digests) == 2
+
+
+@pytest.fixture
+def cached_upload(app_module, tmp_path, monkeypatch):
+    """A video whose result is already cached, with the app's stores and folders in `tmp_path`."""
+    outputs = tmp_path / "outputs"
+    outputs.mkdir()
+    monkeypatch.setitem(app_module.app.config, 'OUTPUT_FOLDER', str(outputs))
+    monkeypatch.setattr(app_module, "shot_store", ShotStore(str(tmp_path / "shots.db")))
+    monkeypatch.setattr(app_module, "result_cache", ResultCache(str(tmp_path / "cache"), str(outputs), 10 ** 9))
+    path = str(tmp_path / "net.mp4")
+    out = cv2.VideoWriter(path, cv2.VideoWriter_fourcc(*'mp4v'), 30.0, (64, 48))
+    for _ in range(5):
+        out.write(np.full((48, 64, 3), 90, dtype=np.uint8))
+    out.release()
+    with open(path, 'rb') as f:
+        video = f.read()
+    (outputs / "first_processed.mp4").write_bytes(b"video")
+    params = dict(analysis_params(), camera_id=None, output_mode=OUTPUT_MODE)
+    app_module.result_cache.put(cache_key(hashlib.sha256(video).hexdigest(), MODEL_WEIGHTS, params),
+                                result("first_processed.mp4"))
+    return video
+
+
+def test_cache_hit_records_a_session_with_the_new_tags(app_module, client, cached_upload):
+    response = client.post('/analyze', data={'video': (io.BytesIO(cached_upload), 'net.mp4'), 'player': 'zoe'},
+                           content_type='multipart/form-data')
+    assert response.status_code == 200 and response.json['cached']
+    session = app_module.shot_store.get_session(response.json['session_id'])
+    assert response.json['session_id'] != "first"
+    assert session['player'] == 'zoe' and len(session['impacts']) == 1
+    assert response.json['processed_video_url'].endswith('/videos/first_processed.mp4')
+
+
+def test_links_to_an_evicted_video_are_withheld(app_module, client, cached_upload, tmp_path):
+    job_id = app_module.job_queue.store.create({'video': 'net.mp4'}, result=result("first_processed.mp4"))
+    os.remove(tmp_path / "outputs" / "first_processed.mp4")
+    status = client.get(f'/jobs/{job_id}').json
+    assert status['processed_video_url'] is None
+    assert status['output_expired']
+    assert client.get(f'/jobs/{job_id}/stream').status_code == 410
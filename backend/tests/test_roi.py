@@ -0,0 +1,77 @@
+import numpy as np
+import pytest
+
+import benchmark
+import main
+from main import ROITracker, extract_detections
+
+FRAME_SIZE = (1280, 720)
+
+
+def test_full_frame_until_a_bat_is_seen():
+    tracker = ROITracker(FRAME_SIZE)
+    frame = np.zeros((720, 1280, 3), dtype=np.uint8)
+    crop, offset = tracker.crop(frame)
+    assert tracker.region() is None
+    assert crop is frame and offset == (0, 0)
+
+
+def test_region_covers_the_bat_and_stumps_with_a_margin():
+    tracker = ROITracker(FRAME_SIZE, stump_box=(620, 400, 660, 540))
+    tracker.update([(500, 350, 540, 470)])
+    x1, y1, x2, y2 = tracker.region()
+    assert x1 < 500 and y1 < 350 and x2 > 660 and y2 > 540
+    crop, offset = tracker.crop(np.zeros((720, 1280, 3), dtype=np.uint8))
+    assert offset == (x1, y1)
+    assert crop.shape[:2] == (y2 - y1, x2 - x1)
+
+
+def test_region_is_clipped_to_the_frame_and_never_too_small():
+    tracker = ROITracker(FRAME_SIZE)
+    tracker.update([(0, 0, 10, 10)])
+    x1, y1, x2, y2 = tracker.region()
+    assert (x1, y1) == (0, 0)
+    assert x2 >= main.ROI_MIN_FRACTION * 1280 / 2 and y2 >= main.ROI_MIN_FRACTION * 720 / 2
+
+
+def test_full_frame_when_the_region_would_cover_most_of_it():
+    tracker = ROITracker(FRAME_SIZE)
+    tracker.update([(100, 50, 1180, 670)])
+    assert tracker.region() is None
+
+
+def test_lost_bat_falls_back_to_the_full_frame():
+    tracker = ROITracker(FRAME_SIZE)
+    tracker.update([(500, 350, 540, 470)])
+    region = tracker.region()
+    for _ in range(main.ROI_LOST_FRAMES):
+        tracker.update([])
+    assert tracker.region() == region  # Short misses keep the region
+    tracker.update([])
+    assert tracker.region() is None
+
+
+def test_crop_detections_map_back_to_the_frame():
+    benchmark.install_stub_detectors(0, 0)  # The ball class is looked up from the ball model
+    bat = benchmark._Result(np.array([[10, 20, 30, 60, 0.9, 0]], dtype=np.float32))
+    keypoints = np.zeros((1, 17, 3), dtype=np.float32)
+    keypoints[0, 9] = (15, 25, 0.9)
+    pose = benchmark._Result(np.zeros((0, 6), dtype=np.float32), keypoints)
+    detections = extract_detections(bat, None, pose, offset=(400, 300))
+    assert detections["bat_boxes"].tolist() == [[410, 320, 430, 360]]
+    assert detections["keypoints"][0, 9].tolist() == pytest.approx([415, 325, 0.9])
+
+
+def test_roi_mode_finds_the_same_impacts(tmp_path, monkeypatch):
+    monkeypatch.setattr(main, "CALIBRATION_CACHE_PATH", str(tmp_path / "calibration_cache.json"))
+    benchmark.install_stub_detectors(0, 0)
+    path = str(tmp_path / "synthetic.mp4")
+    benchmark.make_synthetic_video(path, width=640, height=360, seconds=3.0)
+
+    def impacts(roi):
+        stats = main.analyze_video(path, str(tmp_path / "out.mp4"), roi=roi, output_mode="stats")
+        return [(impact["frame"], impact["location"]) for impact in stats["impacts"]]
+
+    full_frame = impacts(False)
+    assert full_frame
+    assert impacts(True) == full_frame
@@ -0,0 +1,102 @@
+import pytest
+
+from shots import ShotStore, parse_timestamp
+
+JUNE = parse_timestamp("2026-06-01")
+JULY = parse_timestamp("2026-07-01")
+
+
+def stats(*speeds):
+    return {"fps": 30.0, "total_frames": 300,
+            "impacts": [{"frame": 30 * (i + 1), "speed_kmh": speed} for i, speed in enumerate(speeds)]}
+
+
+@pytest.fixture
+def store(tmp_path):
+    store = ShotStore(str(tmp_path / "shots.db"))
+    store.record(stats(*range(1, 11)), player="asha", recorded_at=JUNE)  # 1..10 km/h
+    store.record(stats(50.0, 60.0), player="ben", recorded_at=JULY)
+    return store
+
+
+def test_percentiles_use_nearest_rank(store):
+    result = store.percentiles(player="asha", percentiles=(10, 50, 95, 100))
+    assert result["shots"] == 10
+    assert result["mean_kmh"] == 5.5
+    assert result["max_kmh"] == 10
+    assert result["percentiles"] == {"p10": 1, "p50": 5, "p95": 10, "p100": 10}
+
+
+def test_percentiles_follow_the_filters(store):
+    assert store.percentiles(since=JULY, percentiles=(50,))["percentiles"] == {"p50": 50.0}
+    assert store.percentiles(player="nobody") == {"shots": 0, "percentiles": {}}
+
+
+def test_percentiles_outside_the_range_are_refused(store):
+    with pytest.raises(ValueError):
+        store.percentiles(percentiles=(0,))
+
+
+def test_limits_are_clamped(store):
+    assert len(store.top_shots(limit=-1)) == 1  # Not SQLite's "no limit"
+    assert len(store.top_shots(limit=3)) == 3
+    assert store.leaderboard(limit=0)[0]["player"] == "ben"
+
+
+@pytest.fixture
+def shots_client(app_module, client, store, monkeypatch):
+    monkeypatch.setattr(app_module, "shot_store", store)
+    return client
+
+
+def test_leaderboard_endpoint(shots_client):
+    players = shots_client.get('/shots/leaderboard').json['leaderboard']
+    assert [(row['player'], row['rank'], row['shots']) for row in players] == [("ben", 1, 2), ("asha", 2, 10)]
+    shots = shots_client.get('/shots/leaderboard?by=shot&player=asha&limit=2').json['leaderboard']
+    assert [shot['speed_kmh'] for shot in shots] == [10, 9]
+
+
+@pytest.mark.parametrize("url", ['/shots/leaderboard?limit=-1', '/shots/leaderboard?limit=0', '/sessions?limit=-5',
+                                 '/shots/leaderboard?by=team', '/shots/percentiles?p=0',
+                                 '/shots/percentiles?since=yesterday', '/shots/trends?bucket=year'])
+def test_invalid_queries_are_refused(shots_client, url):
+    assert shots_client.get(url).status_code == 400
+
+
+def test_percentiles_endpoint(shots_client):
+    result = shots_client.get('/shots/percentiles?p=50,90&until=2026-06-30').json
+    assert result == {"shots": 10, "mean_kmh": 5.5, "max_kmh": 10, "percentiles": {"p50": 5, "p90": 9}}
+
+
+def test_trends_endpoint(shots_client):
+    trends = shots_client.get('/shots/trends?bucket=month').json['trends']
+    assert [(row['period'], row['shots'], row['max_speed_kmh']) for row in trends] == [("2026-06", 10, 10), ("2026-07", 2, 60.0)]
+
+
+def test_sessions_endpoint(shots_client):
+    sessions = shots_client.get('/sessions?limit=1').json['sessions']
+    assert [session['player'] for session in sessions] == ["ben"]
+    session = shots_client.get(f"/sessions/{sessions[0]['id']}").json
+    assert [impact['speed_kmh'] for impact in session['impacts']] == [50.0, 60.0]
+    assert shots_client.get('/sessions/0123abcd').status_code == 404
+
+
+def test_same_named_uploads_get_their_own_files(app_module):
+    first, second = app_module.upload_paths("video.mp4"), app_module.upload_paths("video.mp4")
+    assert first[0] != second[0]
+    assert first[1] != second[1]
+
+
+def test_each_analysis_job_records_its_own_session(app_module, store, monkeypatch):
+    monkeypatch.setattr(app_module, "shot_store", store)
+    monkeypatch.setattr(app_module, "TRACK_STORE", False)
+    monkeypatch.setattr(app_module, "analyze_video_parallel",
+                        lambda *args, **kwargs: dict(stats(70.0), output={"written": False}))
+    payload = {"input_path": "video.mp4", "output_filename": "video_processed.mp4", "video": "video.mp4"}
+
+    first = app_module.run_analysis_job(dict(payload, tags={"player": "cara"}), lambda *args: None, "job-1")
+    second = app_module.run_analysis_job(dict(payload, tags={"player": "dev"}), lambda *args: None, "job-2")
+    retried = app_module.run_analysis_job(dict(payload, tags={"player": "cara"}), lambda *args: None, "job-1")
+    assert first["session_id"] != second["session_id"]
+    assert retried["session_id"] == first["session_id"]
+    assert store.get_session(second["session_id"])["player"] == "dev"
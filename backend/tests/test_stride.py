@@ -0,0 +1,72 @@
+import numpy as np
+
+import main
+from main import AnalysisSession, StrideController
+
+
+def frame(square_at=None, width=320, height=180):
+    """A black frame, with a white 40 px square at `square_at` (x, y) if given."""
+    image = np.zeros((height, width, 3), dtype=np.uint8)
+    if square_at is not None:
+        x, y = square_at
+        image[y:y + 40, x:x + 40] = 255
+    return image
+
+
+def decoded(controller, frames):
+    """Feed `frames` through the reader's decode/observe loop and return the indices decoded."""
+    indices = []
+    for index, image in enumerate(frames):
+        if controller.should_decode(index):
+            controller.observe(index, image)
+            indices.append(index)
+    return indices
+
+
+def test_stride_one_decodes_every_frame():
+    assert decoded(StrideController(1), [frame()] * 5) == [0, 1, 2, 3, 4]
+
+
+def test_idle_video_is_decoded_at_the_stride():
+    assert decoded(StrideController(3), [frame()] * 10) == [0, 3, 6, 9]
+
+
+def test_motion_spike_holds_stride_one():
+    frames = [frame()] * 6 + [frame((100, 60))] * 40
+    indices = decoded(StrideController(3), frames)
+    assert indices[:4] == [0, 3, 6, 7]  # The square appears at frame 6
+    assert indices[3:3 + main.MOTION_HOLD_FRAMES] == list(range(7, 7 + main.MOTION_HOLD_FRAMES))
+    assert 6 + main.MOTION_HOLD_FRAMES + 2 not in indices  # Still again: back to the stride
+
+
+def test_motion_away_from_the_batsman_is_ignored():
+    controller = StrideController(3)
+    controller.focus = (40, 40)  # Top left; the motion is at the bottom right
+    frames = [frame()] * 6 + [frame((260, 130))] * 6
+    assert decoded(controller, frames) == [0, 3, 6, 9]
+
+
+def test_skipped_frames_are_interpolated_into_the_histories():
+    session = AnalysisSession(30.0, pixels_per_meter=100.0)
+
+    def detections(wrist_x):
+        keypoints = np.zeros((1, 17, 3), dtype=np.float32)
+        keypoints[0, 9] = (wrist_x, 300, 0.9)
+        return {
+            "bat_boxes": np.array([[90, 260, 110, 340]], dtype=np.float32),
+            "bat_conf": np.array([0.9], dtype=np.float32),
+            "ball_boxes": np.zeros((0, 4), dtype=np.float32),
+            "ball_conf": np.zeros(0, dtype=np.float32),
+            "keypoints": keypoints,
+        }
+
+    session.process_frame(detections(100))  # The bat track is confirmed from its second detection
+    session.process_frame(detections(100))
+    session.skip_frame()
+    session.skip_frame()
+    session.process_frame(detections(160))
+    frames, xy = session.left_wrist_history.arrays()
+    assert frames.tolist() == [2, 3, 4, 5]
+    assert xy[:, 0].tolist() == [100, 120, 140, 160]
+    assert session.processing_stats["frames_inferred"] == 3
+    assert session.final_stats()["inference_speedup"] == round(5 / 3, 2)
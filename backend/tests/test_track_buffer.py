@@ -0,0 +1,72 @@
+import math
+
+import numpy as np
+import pytest
+
+from main import AnalysisSession, Track
+
+
+def test_track_keeps_the_latest_samples_in_order():
+    track = Track(maxlen=3)
+    for frame in range(1, 6):
+        track.append(frame, (frame * 10, frame * 20))
+    frames, xy = track.arrays()
+    assert len(track) == 3
+    assert frames.tolist() == [3, 4, 5]
+    assert xy.tolist() == [[30, 60], [40, 80], [50, 100]]
+    assert xy.dtype == np.float32
+
+
+def test_track_copies_positions():
+    position = np.array([1.0, 2.0])
+    track = Track()
+    track.append(1, position)
+    position[:] = 0  # e.g. a keypoint buffer reused by the detector
+    assert track.arrays()[1].tolist() == [[1.0, 2.0]]
+
+
+def test_cleared_track_is_empty():
+    track = Track(maxlen=2)
+    for frame in range(3):
+        track.append(frame, (0, 0))
+    track.clear()
+    track.append(7, (1, 1))
+    frames, xy = track.arrays()
+    assert frames.tolist() == [7] and xy.tolist() == [[1, 1]]
+
+
+def test_peak_speed_is_the_fastest_step():
+    session = AnalysisSession(30.0, pixels_per_meter=100.0)
+    track = Track()
+    for frame, x in ((1, 0), (2, 10), (4, 70), (5, 80)):  # 10, 30 (over a two-frame gap), then 10 px/frame
+        track.append(frame, (x, 0))
+    assert session.calculate_peak_speed(track) == pytest.approx(30 * 30 / 100 * 3.6)
+
+
+def test_peak_speed_needs_two_samples_and_a_scale():
+    track = Track()
+    track.append(1, (0, 0))
+    assert AnalysisSession(30.0, pixels_per_meter=100.0).calculate_peak_speed(track) == 0
+    track.append(2, (3, 4))
+    assert AnalysisSession(30.0).calculate_peak_speed(track) == 0
+    assert AnalysisSession(30.0, pixels_per_meter=100.0).calculate_peak_speed(track) == pytest.approx(5 * 30 / 100 * 3.6)
+
+
+def test_impact_uses_the_closest_bat_and_ball_pair():
+    session = AnalysisSession(30.0, pixels_per_meter=100.0)
+    for frame, x in ((1, 0), (2, 20)):  # 21.6 km/h
+        session.bat_history.append(frame, (x, 0))
+    session.processing_stats["frame_count"] = 100
+    detected, distance = session.detect_impact([(500, 500), (100, 100)], [(900, 900), (103, 104)])
+    assert detected
+    assert distance == pytest.approx(5.0)
+    impact = session.processing_stats["impacts"][0]
+    assert impact["location"] == (100, 100)
+    assert impact["speed_kmh"] == pytest.approx(21.6)
+    assert len(session.bat_history) == 0  # Cleared so the same swing cannot trigger again
+
+
+def test_far_ball_is_not_an_impact():
+    session = AnalysisSession(30.0, pixels_per_meter=100.0)
+    detected, distance = session.detect_impact([(0, 0)], [(300, 400)])
+    assert not detected and distance == pytest.approx(math.hypot(300, 400))
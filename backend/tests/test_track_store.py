@@ -0,0 +1,123 @@
+import pathlib
+
+import numpy as np
+import pytest
+
+import benchmark
+import main
+from track_store import DetectionRecorder, merge_track_files, read_tracks, track_path_for
+
+META = {"fps": 30.0, "pixels_per_meter": 100.0, "calibration": {"source": "test"}}
+
+
+def detections(bats=(), balls=(), people=0):
+    keypoints = np.zeros((people, 17, 3), dtype=np.float32)
+    keypoints[:, 9] = (10, 20, 0.9)
+    keypoints[:, 10] = (30, 40, 0.8)
+    return {
+        "bat_boxes": np.array(bats, dtype=np.float32).reshape(-1, 4),
+        "bat_conf": np.full(len(bats), 0.9, dtype=np.float32),
+        "ball_boxes": np.array(balls, dtype=np.float32).reshape(-1, 4),
+        "ball_conf": np.full(len(balls), 0.5, dtype=np.float32),
+        "keypoints": keypoints,
+    }
+
+
+def save(path, frames, start_frame, end_frame, invocations):
+    recorder = DetectionRecorder()
+    for frame, frame_detections in frames:
+        recorder.add(frame, frame_detections)
+    recorder.save(str(path), start_frame=start_frame, end_frame=end_frame, model_invocations=invocations, **META)
+    return str(path)
+
+
+def test_recorded_detections_read_back_per_frame(tmp_path):
+    path = save(tmp_path / "clip.tracks.npz", [
+        (1, detections(bats=[(0, 0, 10, 40), (50, 0, 60, 40)], people=1)),
+        (3, detections(balls=[(5, 5, 9, 9)])),
+    ], 0, 4, {"bat": 2})
+    meta, frames = read_tracks(path)
+    frames = list(frames)
+    assert meta["end_frame"] == 4 and meta["model_invocations"] == {"bat": 2}
+    assert [frame for frame, _ in frames] == [1, 3]  # Frame 2 was skipped by the stride
+    first, second = frames[0][1], frames[1][1]
+    assert first["bat_boxes"].tolist() == [[0, 0, 10, 40], [50, 0, 60, 40]]
+    assert first["keypoints"][0, 9].tolist() == pytest.approx([10, 20, 0.9])
+    assert first["keypoints"][0, 10].tolist() == pytest.approx([30, 40, 0.8])
+    assert len(first["ball_boxes"]) == 0
+    assert second["ball_boxes"].tolist() == [[5, 5, 9, 9]] and len(second["keypoints"]) == 0
+
+
+def test_merged_segments_cover_the_whole_video(tmp_path):
+    first = save(tmp_path / "a.tracks.npz", [(1, detections(bats=[(0, 0, 10, 40)])), (2, detections())], 0, 2, {"bat": 2})
+    second = save(tmp_path / "b.tracks.npz", [(3, detections(balls=[(5, 5, 9, 9)]))], 2, 3, {"bat": 1, "ball": 1})
+    merge_track_files([first, second], str(tmp_path / "all.tracks.npz"))
+    meta, frames = read_tracks(str(tmp_path / "all.tracks.npz"))
+    frames = list(frames)
+    assert (meta["start_frame"], meta["end_frame"]) == (0, 3)
+    assert meta["model_invocations"] == {"bat": 3, "ball": 1}
+    assert [frame for frame, _ in frames] == [1, 2, 3]
+    assert frames[2][1]["ball_boxes"].tolist() == [[5, 5, 9, 9]]
+
+
+@pytest.fixture(scope="module")
+def analysed_clip(tmp_path_factory):
+    """A synthetic clip analysed with its detections saved: (stats, track file)."""
+    workdir = tmp_path_factory.mktemp("analysed")
+    cache_path = main.CALIBRATION_CACHE_PATH
+    main.CALIBRATION_CACHE_PATH = str(workdir / "calibration_cache.json")
+    try:
+        benchmark.install_stub_detectors(0, 0)
+        video = str(workdir / "clip.mp4")
+        benchmark.make_synthetic_video(video, width=640, height=360, seconds=4.0)
+        output = str(workdir / "clip_processed.mp4")
+        stats = main.analyze_video(video, output, output_mode="stats", track_path=track_path_for(output))
+    finally:
+        main.CALIBRATION_CACHE_PATH = cache_path
+    return stats, track_path_for(output)
+
+
+def test_reanalysis_with_the_defaults_reproduces_the_analysis(analysed_clip):
+    stats, track_file = analysed_clip
+    again = main.reanalyze(track_file)
+    assert stats["impacts"]
+    assert [(imp["frame"], imp["speed_kmh"]) for imp in again["impacts"]] == \
+        [(imp["frame"], imp["speed_kmh"]) for imp in stats["impacts"]]
+    assert again["total_frames"] == stats["total_frames"]
+    assert again["model_invocations"] == stats["model_invocations"]
+
+
+def test_reanalysis_params_override_the_defaults(analysed_clip):
+    again = main.reanalyze(analysed_clip[1], {"min_speed": 60, "max_speed": "200"})
+    assert again["impacts"] == []  # The synthetic swing peaks at ~34 km/h
+    assert again["reanalysis"]["params"]["min_speed"] == 60.0
+    assert again["reanalysis"]["params"]["max_speed"] == 200.0
+
+
+@pytest.mark.parametrize("params", [{"confidence": 0.5}, {"min_speed": "fast"}])
+def test_unknown_or_malformed_params_are_refused(analysed_clip, params):
+    with pytest.raises(ValueError):
+        main.reanalyze(analysed_clip[1], params)
+
+
+@pytest.fixture
+def track_url(app_module, analysed_clip, tmp_path, monkeypatch):
+    monkeypatch.setitem(app_module.app.config, 'OUTPUT_FOLDER', str(tmp_path))
+    (tmp_path / "clip_processed.tracks.npz").write_bytes(pathlib.Path(analysed_clip[1]).read_bytes())
+    (tmp_path / "clip_processed.mp4").write_bytes(b"not a track file")
+    return "/tracks/clip_processed.tracks.npz/reanalyze"
+
+
+def test_reanalyze_endpoint(client, analysed_clip, track_url):
+    response = client.post(track_url, json={"impact_cooldown_frames": 5})
+    assert response.status_code == 200
+    data = response.json['analysis_data']
+    assert len(data['impacts']) == len(analysed_clip[0]['impacts'])
+    assert data['reanalysis']['params']['impact_cooldown_frames'] == 5
+    assert client.post(track_url, json={"confidence": 0.5}).status_code == 400
+    assert client.post(track_url, json=[1, 2]).status_code == 400
+
+
+@pytest.mark.parametrize("filename", ["missing.tracks.npz", "clip_processed.mp4", "..%2Fclip.tracks.npz"])
+def test_reanalyze_endpoint_unknown_track_file(client, track_url, filename):
+    assert client.post(f"/tracks/{filename}/reanalyze", json={}).status_code == 404
@@ -0,0 +1,106 @@
+import numpy as np
+
+import benchmark
+import main
+from main import AnalysisSession
+from tracking import MultiObjectTracker
+
+
+def box(cx, cy, w=20, h=80):
+    return [cx - w / 2, cy - h / 2, cx + w / 2, cy + h / 2]
+
+
+def test_fast_swing_keeps_its_identity():
+    tracker = MultiObjectTracker(max_distance=100)
+    x, ids = 100.0, set()
+    for frame, step in enumerate([150, 170, 190, 210, 200, 180, 160], start=1):
+        x += step
+        (track,) = tracker.step(frame, [box(x, 300)])
+        ids.add(track.id)
+    assert len(ids) == 1
+
+
+def test_far_detection_starts_a_new_track():
+    tracker = MultiObjectTracker(max_distance=100)
+    (first,) = tracker.step(1, [box(100, 300)])
+    (second,) = tracker.step(2, [box(600, 300)])
+    assert first.id != second.id
+
+
+def detections(bat=None, ball=None):
+    def boxes(center, size):
+        return np.array([box(*center, *size)] if center else np.zeros((0, 4)), dtype=np.float32)
+    return {
+        "bat_boxes": boxes(bat, (20, 80)),
+        "bat_conf": np.full(1 if bat else 0, 0.9, dtype=np.float32),
+        "ball_boxes": boxes(ball, (10, 10)),
+        "ball_conf": np.full(1 if ball else 0, 0.9, dtype=np.float32),
+        "keypoints": np.zeros((0, 17, 3), dtype=np.float32),
+    }
+
+
+def run_swing(ball_frames):
+    """A bat swinging at ~43 km/h towards a ball that is only detected on `ball_frames`."""
+    session = AnalysisSession(30.0, pixels_per_meter=100.0)
+    for k in range(1, 13):
+        ball = (700 - 40 * k, 300) if k in ball_frames else None
+        session.process_frame(detections(bat=(100 + 40 * k, 300), ball=ball))
+    return session.processing_stats["impacts"]
+
+
+def test_detected_ball_reaching_the_bat_is_an_impact():
+    assert len(run_swing(range(1, 13))) == 1
+
+
+def test_coasting_ball_prediction_is_not_an_impact():
+    # The ball's predicted path would reach the bat at frame 7, but it was last seen at frame 5
+    assert run_swing(range(1, 6)) == []
+
+
+def test_primary_bat_switch_starts_a_fresh_history():
+    # A slow swing, then a second, stationary bat far away becomes the most confident detection
+    session = AnalysisSession(30.0, pixels_per_meter=100.0)
+    speeds = []
+    for k in range(1, 11):
+        swing, still = box(100 + 5 * k, 300), box(1000, 300)
+        bats = [swing, still] if k <= 5 else [still, swing]
+        annotations = session.process_frame({
+            "bat_boxes": np.array(bats, dtype=np.float32),
+            "bat_conf": np.array([0.9, 0.8], dtype=np.float32),
+            "ball_boxes": np.zeros((0, 4), dtype=np.float32),
+            "ball_conf": np.zeros(0, dtype=np.float32),
+            "keypoints": np.zeros((0, 17, 3), dtype=np.float32),
+        })
+        speeds.append(annotations["scoreboard"]["current_speed"])
+    assert max(speeds) < 10  # Not the ~900 px jump from one bat to the other
+
+
+benchmark_scene = benchmark.scene_geometry
+
+
+def fast_delivery(index, fps, width, height):
+    """The synthetic scene with a ball that comes in four times faster, crossing the dense zone within one batch."""
+    stump, bat, ball = benchmark_scene(index, fps, width, height)
+    phase = (index / fps % benchmark.SWING_PERIOD_SECONDS) / benchmark.SWING_PERIOD_SECONDS
+    if phase < 0.5:
+        ball = (int((0.5 + 3.2 * (0.5 - phase)) * width), ball[1])
+    return stump, bat, ball
+
+
+def test_fast_ball_is_detected_on_the_impact_frame(tmp_path, monkeypatch):
+    monkeypatch.setattr(main, "CALIBRATION_CACHE_PATH", str(tmp_path / "calibration_cache.json"))
+    monkeypatch.setattr(benchmark, "scene_geometry", fast_delivery)
+    benchmark.install_stub_detectors(0, 0)
+    path = str(tmp_path / "fast.mp4")
+    benchmark.make_synthetic_video(path, width=640, height=360, seconds=6.0)
+
+    def impacts():
+        stats = main.analyze_video(path, str(tmp_path / "out.mp4"), batch_size=8, output_mode="stats")
+        return [(impact["frame"], impact["speed_kmh"]) for impact in stats["impacts"]], stats["model_invocations"]["ball"]
+
+    monkeypatch.setattr(main, "BALL_DETECT_INTERVAL", 1)
+    every_frame, dense_calls = impacts()
+    monkeypatch.setattr(main, "BALL_DETECT_INTERVAL", 2)
+    sparse, sparse_calls = impacts()
+    assert sparse == every_frame
+    assert sparse_calls < dense_calls
@@ -0,0 +1,120 @@
+import hashlib
+import io
+
+import cv2
+import numpy as np
+import pytest
+
+from uploads import ResumableUploads, UploadRejected
+
+
+@pytest.fixture(scope="module")
+def video_bytes(tmp_path_factory):
+    path = tmp_path_factory.mktemp("video") / "clip.mp4"
+    out = cv2.VideoWriter(str(path), cv2.VideoWriter_fourcc(*'mp4v'), 30.0, (64, 48))
+    for i in range(15):
+        out.write(np.full((48, 64, 3), 10 * i, dtype=np.uint8))
+    out.release()
+    return path.read_bytes()
+
+
+class DroppedConnection(io.RawIOBase):
+    """A request body that breaks off after `data`."""
+
+    def __init__(self, data):
+        self.data = data
+
+    def read(self, size=-1):
+        if not self.data:
+            raise ConnectionResetError("client went away")
+        chunk, self.data = self.data[:size], self.data[size:]
+        return chunk
+
+
+def start_upload(client, size=None):
+    response = client.post('/uploads', json={'filename': 'net.mp4', 'size': size})
+    assert response.status_code == 201
+    assert response.json['offset'] == 0
+    return response.json['upload_url']
+
+
+def patch(client, url, offset, data):
+    return client.patch(url, data=data, headers={'Upload-Offset': str(offset)})
+
+
+def test_chunks_advance_the_offset(client):
+    url = start_upload(client)
+    response = patch(client, url, 0, b'a' * 1000)
+    assert response.status_code == 200
+    assert response.headers['Upload-Offset'] == '1000'
+    assert patch(client, url, 1000, b'b' * 500).json['offset'] == 1500
+    status = client.get(url)
+    assert status.json['offset'] == 1500
+    assert status.headers['Upload-Offset'] == '1500'
+    assert client.head(url).headers['Upload-Offset'] == '1500'
+
+
+def test_chunk_at_a_stale_offset_is_refused(client):
+    url = start_upload(client)
+    patch(client, url, 0, b'a' * 1000)
+    retried = patch(client, url, 0, b'a' * 1000)  # The first attempt did arrive
+    assert retried.status_code == 409
+    ahead = patch(client, url, 2000, b'c' * 10)
+    assert ahead.status_code == 409
+    assert client.get(url).json['offset'] == 1000
+
+
+def test_chunk_needs_an_offset(client):
+    url = start_upload(client)
+    assert client.patch(url, data=b'a').status_code == 400
+
+
+def test_unknown_upload(client):
+    assert client.get('/uploads/0123abcd').status_code == 404
+    assert patch(client, '/uploads/0123abcd', 0, b'a').status_code == 404
+
+
+def test_upload_past_its_declared_size_is_discarded(client):
+    url = start_upload(client, size=100)
+    assert patch(client, url, 0, b'a' * 150).status_code == 413
+    assert client.get(url).status_code == 404
+
+
+def test_incomplete_upload_cannot_be_completed(client):
+    url = start_upload(client, size=100)
+    patch(client, url, 0, b'a' * 60)
+    assert client.post(url + '/complete').status_code == 409
+    assert client.get(url).json['offset'] == 60
+
+
+def test_dropped_connection_keeps_the_bytes_received(tmp_path, video_bytes):
+    uploads = ResumableUploads(str(tmp_path))
+    upload_id = uploads.create('net.mp4', len(video_bytes))
+    half = len(video_bytes) // 2
+    with pytest.raises(ConnectionResetError):
+        uploads.append(upload_id, 0, DroppedConnection(video_bytes[:half]))
+    assert uploads.get(upload_id)['offset'] == half
+    assert uploads.append(upload_id, half, io.BytesIO(video_bytes[half:])) == len(video_bytes)
+
+
+def test_complete_moves_the_video_and_hashes_every_chunk(tmp_path, video_bytes):
+    uploads = ResumableUploads(str(tmp_path / 'resumable'))
+    upload_id = uploads.create('net.mp4', len(video_bytes))
+    offset = 0
+    for start in range(0, len(video_bytes), 4096):
+        offset = uploads.append(upload_id, offset, io.BytesIO(video_bytes[start:start + 4096]))
+    dest = tmp_path / 'net.mp4'
+    digest, info = uploads.complete(upload_id, str(dest))
+    assert digest == hashlib.sha256(video_bytes).hexdigest()
+    assert dest.read_bytes() == video_bytes
+    assert (info['width'], info['height'], info['frames']) == (64, 48, 15)
+    assert uploads.get(upload_id) is None
+
+
+def test_undecodable_upload_is_rejected_on_completion(tmp_path):
+    uploads = ResumableUploads(str(tmp_path))
+    upload_id = uploads.create('net.mp4')
+    uploads.append(upload_id, 0, io.BytesIO(b'not a video' * 100))
+    with pytest.raises(UploadRejected):
+        uploads.complete(upload_id, str(tmp_path / 'net.mp4'))
+    assert uploads.get(upload_id) is None
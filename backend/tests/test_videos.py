@@ -0,0 +1,60 @@
+import pytest
+
+VIDEO = bytes(range(256)) * 40  # 10 KiB
+
+
+@pytest.fixture
+def video(app_module, tmp_path, monkeypatch):
+    monkeypatch.setitem(app_module.app.config, 'OUTPUT_FOLDER', str(tmp_path))
+    (tmp_path / "clip_processed.mp4").write_bytes(VIDEO)
+    return "/videos/clip_processed.mp4"
+
+
+def test_full_response_advertises_ranges_and_caching(client, video):
+    response = client.get(video)
+    assert response.status_code == 200
+    assert response.data == VIDEO
+    assert response.headers['Accept-Ranges'] == 'bytes'
+    assert response.headers['ETag']
+    assert 'max-age=3600' in response.headers['Cache-Control']
+    assert 'attachment' not in response.headers.get('Content-Disposition', '')
+
+
+def test_range_request_returns_partial_content(client, video):
+    response = client.get(video, headers={'Range': 'bytes=100-199'})
+    assert response.status_code == 206
+    assert response.headers['Content-Range'] == f"bytes 100-199/{len(VIDEO)}"
+    assert response.data == VIDEO[100:200]
+
+
+def test_suffix_range_returns_the_tail(client, video):
+    response = client.get(video, headers={'Range': 'bytes=-50'})
+    assert response.status_code == 206
+    assert response.data == VIDEO[-50:]
+
+
+def test_unsatisfiable_range_is_refused(client, video):
+    response = client.get(video, headers={'Range': f"bytes={len(VIDEO)}-"})
+    assert response.status_code == 416
+
+
+def test_matching_etag_revalidates_without_a_body(client, video):
+    etag = client.get(video).headers['ETag']
+    response = client.get(video, headers={'If-None-Match': etag})
+    assert response.status_code == 304
+    assert response.data == b''
+
+
+def test_stale_if_range_sends_the_whole_file(client, video):
+    response = client.get(video, headers={'Range': 'bytes=0-9', 'If-Range': '"stale"'})
+    assert response.status_code == 200
+    assert response.data == VIDEO
+
+
+def test_download_is_sent_as_an_attachment(client, video):
+    response = client.get(video + "?download=1")
+    assert response.headers['Content-Disposition'].startswith('attachment')
+
+
+def test_missing_video_is_not_found(client, video):
+    assert client.get("/videos/missing.mp4").status_code == 404
@@ -0,0 +1,120 @@
+"""
+Detection track store: the raw per-frame detections of an analysis, saved as a
+compressed columnar .npz next to its output, so impacts and stats can be recomputed
+with other impact parameters (main.reanalyze) without running any model again.
+
+Only inferred frames are stored; frames the stride controller skipped are the gaps in
+`frames`. Each frame's variable number of bats, balls and people are flattened into
+one array per column, with a per-frame count column to split them again. Of the pose
+keypoints only the wrists are kept, as they are all the impact logic reads.
+"""
+import json
+import os
+
+import numpy as np
+
+TRACK_STORE = os.environ.get('ANALYSIS_TRACK_STORE', '1') == '1'  # Save a track file with every analysed video
+TRACK_FILE_SUFFIX = '.tracks.npz'
+TRACK_FILE_VERSION = 1
+WRIST_KEYPOINTS = (9, 10)  # COCO left and right wrist
+
+_COLUMNS = {  # name: (dtype, shape of one row)
+    "bat_boxes": (np.float32, (4,)),
+    "bat_conf": (np.float32, ()),
+    "ball_boxes": (np.float32, (4,)),
+    "ball_conf": (np.float32, ()),
+    "wrists": (np.float32, (len(WRIST_KEYPOINTS), 3)),
+}
+
+
+def track_path_for(output_path):
+    """The track file stored next to `output_path`."""
+    return os.path.splitext(output_path)[0] + TRACK_FILE_SUFFIX
+
+
+class DetectionRecorder:
+    """Collects each inferred frame's detections (as from main.extract_detections) for save()."""
+
+    def __init__(self):
+        self.frames = []
+        self.columns = {name: [] for name in _COLUMNS}
+
+    def __len__(self):
+        return len(self.frames)
+
+    def add(self, frame, detections):
+        keypoints = detections["keypoints"]
+        if keypoints.shape[0] and keypoints.shape[1] > max(WRIST_KEYPOINTS):
+            wrists = keypoints[:, list(WRIST_KEYPOINTS)]
+        else:
+            wrists = np.zeros((0,) + _COLUMNS["wrists"][1], dtype=np.float32)
+        self.frames.append(frame)
+        for name, rows in (("bat_boxes", detections["bat_boxes"]), ("bat_conf", detections["bat_conf"]),
+                           ("ball_boxes", detections["ball_boxes"]), ("ball_conf", detections["ball_conf"]),
+                           ("wrists", wrists)):
+            self.columns[name].append(rows)
+
+    def save(self, path, **meta):
+        """Write the track file atomically; `meta` must hold fps, pixels_per_meter, start_frame and end_frame."""
+        arrays = {"frames": np.asarray(self.frames, dtype=np.int64)}
+        for name, (dtype, row_shape) in _COLUMNS.items():
+            chunks = self.columns[name]
+            arrays[f"{name}_count"] = np.array([len(chunk) for chunk in chunks], dtype=np.int32)
+            arrays[name] = (np.concatenate(chunks).astype(dtype, copy=False) if chunks
+                            else np.zeros((0,) + row_shape, dtype=dtype))
+        _write(path, meta, arrays)
+
+
+def _write(path, meta, arrays):
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, 'wb') as f:
+        np.savez_compressed(f, meta=np.array(json.dumps(dict(meta, version=TRACK_FILE_VERSION))), **arrays)
+    os.replace(tmp_path, path)
+
+
+def _read(path):
+    with np.load(path, allow_pickle=False) as data:
+        meta = json.loads(str(data["meta"]))
+        arrays = {name: data[name] for name in data.files if name != "meta"}
+    if meta.get("version") != TRACK_FILE_VERSION:
+        raise ValueError(f"{path} is track file version {meta.get('version')}, expected {TRACK_FILE_VERSION}")
+    return meta, arrays
+
+
+def read_tracks(path):
+    """
+    Open a track file. Returns (meta, detections), where `detections` yields
+    (frame, detections) in frame order, in the form AnalysisSession.process_frame takes.
+    """
+    meta, arrays = _read(path)
+    split = {name: np.split(arrays[name], np.cumsum(arrays[f"{name}_count"])[:-1]) if len(arrays["frames"]) else []
+             for name in _COLUMNS}
+
+    def detections():
+        for i, frame in enumerate(arrays["frames"].tolist()):
+            wrists = split["wrists"][i]
+            keypoints = np.zeros((len(wrists), max(WRIST_KEYPOINTS) + 1, 3), dtype=np.float32)
+            keypoints[:, list(WRIST_KEYPOINTS)] = wrists
+            yield frame, {
+                "bat_boxes": split["bat_boxes"][i],
+                "bat_conf": split["bat_conf"][i],
+                "ball_boxes": split["ball_boxes"][i],
+                "ball_conf": split["ball_conf"][i],
+                "keypoints": keypoints,
+            }
+
+    return meta, detections()
+
+
+def merge_track_files(paths, output_path):
+    """Join the track files of consecutive video segments into one covering the whole video."""
+    parts = [_read(path) for path in paths]
+    metas = [meta for meta, _ in parts]
+    model_invocations = {}
+    for meta in metas:
+        for name, count in meta.get("model_invocations", {}).items():
+            model_invocations[name] = model_invocations.get(name, 0) + count
+    meta = dict(metas[0], start_frame=metas[0]["start_frame"], end_frame=metas[-1]["end_frame"], model_invocations=model_invocations)
+    meta.pop("version")
+    arrays = {name: np.concatenate([part[name] for _, part in parts]) for name in parts[0][1]}
+    _write(output_path, meta, arrays)
@@ -0,0 +1,175 @@
+"""
+Multi-object tracking for the bat and ball: one constant-velocity Kalman filter per
+object over its box centre, with greedy distance/IoU association of each frame's
+detections to the tracks' predicted positions.
+
+Tracks keep predicting through frames where their detector was skipped or missed,
+and are dropped once they have gone `max_age` frames without a detection.
+"""
+from collections import deque
+
+import numpy as np
+
+_H = np.array([[1, 0, 0, 0], [0, 1, 0, 0]], dtype=np.float64)  # Observes (x, y) of (x, y, vx, vy)
+
+
+def box_iou(a, b):
+    """Pairwise IoU between (N, 4) and (M, 4) xyxy arrays."""
+    if len(a) == 0 or len(b) == 0:
+        return np.zeros((len(a), len(b)))
+    x1 = np.maximum(a[:, None, 0], b[None, :, 0])
+    y1 = np.maximum(a[:, None, 1], b[None, :, 1])
+    x2 = np.minimum(a[:, None, 2], b[None, :, 2])
+    y2 = np.minimum(a[:, None, 3], b[None, :, 3])
+    inter = np.clip(x2 - x1, 0, None) * np.clip(y2 - y1, 0, None)
+    area_a = (a[:, 2] - a[:, 0]) * (a[:, 3] - a[:, 1])
+    area_b = (b[:, 2] - b[:, 0]) * (b[:, 3] - b[:, 1])
+    return inter / np.maximum(area_a[:, None] + area_b[None, :] - inter, 1e-9)
+
+
+class KalmanTrack:
+    """
+    Constant-velocity Kalman filter over a box centre. Time is measured in frames, so
+    velocity is in pixels per frame and gaps of several frames are predicted in one step.
+    `path` holds the filtered (frame, x, y) position after every detection.
+    """
+
+    def __init__(self, track_id, frame, box, process_noise, measurement_noise, path_len):
+        cx, cy = (box[0] + box[2]) / 2, (box[1] + box[3]) / 2
+        self.id = track_id
+        self.state = np.array([cx, cy, 0.0, 0.0])
+        # Position is as certain as a measurement; velocity is unknown until the second detection
+        self.covariance = np.diag([measurement_noise ** 2] * 2 + [(10 * measurement_noise) ** 2] * 2)
+        self.process_noise = process_noise
+        self.measurement_noise = measurement_noise
+        self.frame = frame  # Frame the state refers to
+        self.last_update = frame
+        self.hits = 1
+        self.box = np.asarray(box, dtype=np.float64)
+        self.path = deque([(frame, cx, cy)], maxlen=path_len)
+
+    @property
+    def position(self):
+        return float(self.state[0]), float(self.state[1])
+
+    @property
+    def velocity(self):
+        """Velocity in pixels per frame."""
+        return float(self.state[2]), float(self.state[3])
+
+    def predicted_box(self):
+        """The last detected box, moved to the current predicted centre."""
+        half_w, half_h = (self.box[2] - self.box[0]) / 2, (self.box[3] - self.box[1]) / 2
+        x, y = self.state[:2]
+        return np.array([x - half_w, y - half_h, x + half_w, y + half_h])
+
+    def predict(self, frame):
+        dt = frame - self.frame
+        if dt <= 0:
+            return
+        transition = np.array([[1, 0, dt, 0], [0, 1, 0, dt], [0, 0, 1, 0], [0, 0, 0, 1]], dtype=np.float64)
+        # Piecewise white-noise acceleration
+        q = self.process_noise ** 2
+        noise = q * np.array([
+            [dt ** 4 / 4, 0, dt ** 3 / 2, 0],
+            [0, dt ** 4 / 4, 0, dt ** 3 / 2],
+            [dt ** 3 / 2, 0, dt ** 2, 0],
+            [0, dt ** 3 / 2, 0, dt ** 2],
+        ])
+        self.state = transition @ self.state
+        self.covariance = transition @ self.covariance @ transition.T + noise
+        self.frame = frame
+
+    def update(self, box):
+        center = np.array([(box[0] + box[2]) / 2, (box[1] + box[3]) / 2])
+        innovation = center - _H @ self.state
+        innovation_cov = _H @ self.covariance @ _H.T + np.eye(2) * self.measurement_noise ** 2
+        gain = self.covariance @ _H.T @ np.linalg.inv(innovation_cov)
+        self.state = self.state + gain @ innovation
+        self.covariance = (np.eye(4) - gain @ _H) @ self.covariance
+        self.last_update = self.frame
+        self.hits += 1
+        self.box = np.asarray(box, dtype=np.float64)
+        self.path.append((self.frame, float(self.state[0]), float(self.state[1])))
+
+
+class MultiObjectTracker:
+    """
+    Tracks every detection of one object class. A detection is matched to the track
+    whose predicted centre is closest, if it lies within the track's gate or the boxes
+    overlap by at least `iou_threshold`. The gate is `max_distance` pixels, plus
+    `velocity_gate` times the distance the track covers between detections (so fast
+    swings, whose prediction errors grow with speed, keep their identity), and is
+    `tentative_gate` times wider for tracks with fewer than `min_hits` detections, whose
+    velocity is still unknown. Unmatched detections start new tracks. Tracks are kept on
+    their prediction for up to `max_age` frames without a detection; recently dropped
+    tracks stay in `retired`.
+    """
+
+    def __init__(self, max_distance, max_age=10, min_hits=2, iou_threshold=0.1, velocity_gate=0.5, tentative_gate=3.0,
+                 process_noise=2.0, measurement_noise=3.0, path_len=120):
+        self.max_distance = max_distance
+        self.max_age = max_age
+        self.min_hits = min_hits
+        self.iou_threshold = iou_threshold
+        self.velocity_gate = velocity_gate
+        self.tentative_gate = tentative_gate
+        self.process_noise = process_noise
+        self.measurement_noise = measurement_noise
+        self.path_len = path_len
+        self.tracks = []
+        self.retired = deque(maxlen=20)
+        self._next_id = 1
+
+    def step(self, frame, boxes):
+        """
+        Advance every track to `frame` and associate the frame's (N, 4) xyxy detections.
+        Returns the track for each detection, in detection order.
+        """
+        for track in self.tracks:
+            track.predict(frame)
+        boxes = np.asarray(boxes, dtype=np.float64).reshape(-1, 4)
+        assigned = [None] * len(boxes)
+
+        if self.tracks and len(boxes):
+            predicted = np.array([track.position for track in self.tracks])
+            centers = (boxes[:, :2] + boxes[:, 2:]) / 2
+            distance = np.linalg.norm(predicted[:, None, :] - centers[None, :, :], axis=2)
+            iou = box_iou(np.array([track.predicted_box() for track in self.tracks]), boxes)
+            cost = np.where((distance <= self._gates(frame)[:, None]) | (iou >= self.iou_threshold), distance, np.inf)
+            # Greedy: repeatedly take the closest remaining track/detection pair
+            while np.isfinite(cost).any():
+                t, d = np.unravel_index(np.argmin(cost), cost.shape)
+                self.tracks[t].update(boxes[d])
+                assigned[d] = self.tracks[t]
+                cost[t, :] = np.inf
+                cost[:, d] = np.inf
+
+        for d, box in enumerate(boxes):
+            if assigned[d] is None:
+                track = KalmanTrack(self._next_id, frame, box, self.process_noise, self.measurement_noise, self.path_len)
+                self._next_id += 1
+                self.tracks.append(track)
+                assigned[d] = track
+
+        alive = []
+        for track in self.tracks:
+            (alive if frame - track.last_update <= self.max_age else self.retired).append(track)
+        self.tracks = alive
+        return assigned
+
+    def _gates(self, frame):
+        """Association radius in pixels for each track at `frame`."""
+        gates = np.empty(len(self.tracks))
+        for i, track in enumerate(self.tracks):
+            travel = np.hypot(*track.velocity) * max(1, frame - track.last_update)
+            gates[i] = self.max_distance * (self.tentative_gate if track.hits < self.min_hits else 1) \
+                + self.velocity_gate * travel
+        return gates
+
+    def confirmed(self, tracks):
+        """The tracks among `tracks` (e.g. step()'s result) with at least `min_hits` detections."""
+        return [track for track in tracks if track.hits >= self.min_hits]
+
+    def all_tracks(self):
+        return list(self.retired) + self.tracks
@@ -0,0 +1,235 @@
+"""
+Upload ingestion: uploads are written straight to disk as they arrive, hashed on the
+way, and checked against the size and duration limits before any analysis is queued.
+
+Once PROBE_MIN_BYTES have arrived the container header is probed (codec, fps,
+resolution, duration), so an oversized or undecodable video is rejected mid-upload
+rather than after the whole body has been received. Containers whose index comes last
+(a plain MP4 with its moov at the end) cannot be probed early; they are checked once
+complete.
+
+Resumable uploads keep a `<id>.part` data file and a `<id>.json` record in the upload
+directory. Clients append chunks at the offset they last got back and ask for the
+current offset after a dropped connection, so state lives on disk and any worker can
+serve the next chunk.
+"""
+import fcntl
+import hashlib
+import json
+import os
+import time
+import uuid
+
+import cv2
+
+from result_cache import HASH_CHUNK_SIZE, file_digest
+
+UPLOAD_MAX_BYTES = int(os.environ.get('UPLOAD_MAX_BYTES', 2 * 1024 ** 3))
+# A batch request carries several videos, each still held to UPLOAD_MAX_BYTES
+BATCH_UPLOAD_MAX_BYTES = int(os.environ.get('BATCH_UPLOAD_MAX_BYTES', 4 * UPLOAD_MAX_BYTES))
+BATCH_MAX_VIDEOS = int(os.environ.get('BATCH_MAX_VIDEOS', 20))
+UPLOAD_MAX_SECONDS = float(os.environ.get('UPLOAD_MAX_SECONDS', 30 * 60))  # Longest video accepted
+UPLOAD_MAX_PIXELS = int(os.environ.get('UPLOAD_MAX_PIXELS', 3840 * 2160))  # Largest frame accepted
+PROBE_MIN_BYTES = 2 * 1024 * 1024  # Bytes received before the header is probed
+UPLOAD_EXPIRY_SECONDS = int(os.environ.get('UPLOAD_EXPIRY_SECONDS', 24 * 3600))  # Unfinished resumable uploads are dropped after this
+
+
+class UploadRejected(Exception):
+    """An upload that is refused; `status` is the HTTP status to answer with."""
+
+    def __init__(self, message, status=422):
+        super().__init__(message)
+        self.status = status
+
+
+def probe_video(path, partial=False):
+    """
+    Read the container header of `path` and check it against the limits. Returns
+    {codec, fps, width, height, frames, duration_seconds}. For an upload still arriving
+    (`partial`), returns None instead of rejecting when the header cannot be read yet.
+    """
+    cap = cv2.VideoCapture(path)
+    try:
+        if not cap.isOpened() or not cap.read()[0]:
+            if partial:
+                return None
+            raise UploadRejected('Could not decode the video; upload an H.264/MPEG-4 mp4, avi, mov or mkv file')
+        fourcc = int(cap.get(cv2.CAP_PROP_FOURCC))
+        fps = cap.get(cv2.CAP_PROP_FPS)
+        width, height = int(cap.get(cv2.CAP_PROP_FRAME_WIDTH)), int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
+        frames = max(0, int(cap.get(cv2.CAP_PROP_FRAME_COUNT)))
+    finally:
+        cap.release()
+
+    info = {
+        'codec': ''.join(chr((fourcc >> 8 * i) & 0xFF) for i in range(4)).strip('\x00 ') or None,
+        'fps': round(fps, 3),
+        'width': width,
+        'height': height,
+        'frames': frames,
+        'duration_seconds': round(frames / fps, 2) if fps > 0 and frames else None,
+    }
+    if fps <= 0 or width <= 0 or height <= 0:
+        raise UploadRejected('The video reports no frame rate or frame size')
+    if width * height > UPLOAD_MAX_PIXELS:
+        raise UploadRejected(f"Resolution {width}x{height} is above the {UPLOAD_MAX_PIXELS} pixel limit")
+    if info['duration_seconds'] and info['duration_seconds'] > UPLOAD_MAX_SECONDS:
+        raise UploadRejected(f"The video is {info['duration_seconds']:.0f}s long; the limit is {UPLOAD_MAX_SECONDS:.0f}s", 413)
+    return info
+
+
+class HashingWriter:
+    """
+    Writable file for an upload in flight: appends to `path`, hashes what it is given,
+    enforces UPLOAD_MAX_BYTES and probes the header once PROBE_MIN_BYTES have arrived.
+    A rejected upload's file is deleted before UploadRejected is raised.
+    """
+
+    def __init__(self, path, offset=0):
+        self.path = path
+        self.size = offset
+        self.probe = None
+        self._file = open(path, 'ab' if offset else 'wb')
+        self._hasher = hashlib.sha256() if not offset else None  # Resumed uploads are hashed on completion
+        self._probed = offset >= PROBE_MIN_BYTES
+
+    def write(self, data):
+        if self.size + len(data) > UPLOAD_MAX_BYTES:
+            self.discard()
+            raise UploadRejected(f"The upload is larger than {UPLOAD_MAX_BYTES} bytes", 413)
+        self._file.write(data)
+        if self._hasher:
+            self._hasher.update(data)
+        self.size += len(data)
+        if not self._probed and self.size >= PROBE_MIN_BYTES:
+            self._probed = True
+            self._file.flush()
+            try:
+                self.probe = probe_video(self.path, partial=True)
+            except UploadRejected:
+                self.discard()
+                raise
+        return len(data)
+
+    def copy_from(self, stream):
+        """Write everything readable from `stream`; returns the new size."""
+        for chunk in iter(lambda: stream.read(HASH_CHUNK_SIZE), b''):
+            self.write(chunk)
+        return self.size
+
+    def seek(self, offset, whence=0):
+        # Werkzeug rewinds file parts once parsed; the data is already on disk
+        self._file.flush()
+        return self.size
+
+    def hexdigest(self):
+        return self._hasher.hexdigest()
+
+    def close(self):
+        if not self._file.closed:
+            self._file.close()
+
+    def discard(self):
+        self.close()
+        if os.path.exists(self.path):
+            os.remove(self.path)
+
+
+class ResumableUploads:
+    """Chunked uploads that can be resumed from the last received byte (see module docstring)."""
+
+    def __init__(self, upload_dir):
+        self.upload_dir = upload_dir
+        os.makedirs(upload_dir, exist_ok=True)
+
+    def _paths(self, upload_id):
+        base = os.path.join(self.upload_dir, upload_id)
+        return f"{base}.part", f"{base}.json"
+
+    def create(self, filename, total_bytes=None):
+        """Start an upload of `filename`; `total_bytes`, if given, is checked now and on completion."""
+        if total_bytes is not None and total_bytes > UPLOAD_MAX_BYTES:
+            raise UploadRejected(f"The upload is larger than {UPLOAD_MAX_BYTES} bytes", 413)
+        self.expire()
+        upload_id = uuid.uuid4().hex
+        data_path, meta_path = self._paths(upload_id)
+        open(data_path, 'wb').close()
+        with open(meta_path, 'w') as f:
+            json.dump({'filename': filename, 'total_bytes': total_bytes, 'created': time.time()}, f)
+        return upload_id
+
+    def get(self, upload_id):
+        """The upload's record plus its received `offset`, or None for an unknown id."""
+        if not upload_id.isalnum():
+            return None
+        data_path, meta_path = self._paths(upload_id)
+        try:
+            with open(meta_path) as f:
+                meta = json.load(f)
+            meta['offset'] = os.path.getsize(data_path)
+        except (OSError, ValueError):
+            return None
+        return meta
+
+    def append(self, upload_id, offset, stream):
+        """
+        Append `stream` at `offset`, which must equal the bytes received so far (409
+        otherwise, e.g. a retried chunk that already arrived). Returns the new offset.
+        """
+        meta = self.get(upload_id)
+        if meta is None:
+            raise UploadRejected('Unknown upload', 404)
+        data_path, _ = self._paths(upload_id)
+        with open(data_path, 'ab') as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)  # One writer per upload, across worker processes
+            current = os.path.getsize(data_path)
+            if offset != current:
+                raise UploadRejected(f"Upload-Offset {offset} does not match the {current} bytes received", 409)
+            writer = HashingWriter(data_path, offset=current)
+            try:
+                size = writer.copy_from(stream)
+            except UploadRejected:
+                self.discard(upload_id)
+                raise
+            finally:
+                writer.close()
+        if meta['total_bytes'] is not None and size > meta['total_bytes']:
+            self.discard(upload_id)
+            raise UploadRejected(f"Received {size} bytes for an upload declared as {meta['total_bytes']}", 413)
+        return size
+
+    def complete(self, upload_id, dest_path):
+        """
+        Probe the finished upload, move it to `dest_path` and return (sha256, probe info).
+        A rejected upload is discarded.
+        """
+        meta = self.get(upload_id)
+        if meta is None:
+            raise UploadRejected('Unknown upload', 404)
+        if meta['total_bytes'] is not None and meta['offset'] != meta['total_bytes']:
+            raise UploadRejected(f"Only {meta['offset']} of {meta['total_bytes']} bytes have been received", 409)
+        data_path, meta_path = self._paths(upload_id)
+        try:
+            info = probe_video(data_path)
+        except UploadRejected:
+            self.discard(upload_id)
+            raise
+        os.replace(data_path, dest_path)
+        os.remove(meta_path)
+        return file_digest(dest_path), info
+
+    def discard(self, upload_id):
+        for path in self._paths(upload_id):
+            if os.path.exists(path):
+                os.remove(path)
+
+    def expire(self):
+        """Drop resumable uploads untouched for UPLOAD_EXPIRY_SECONDS."""
+        cutoff = time.time() - UPLOAD_EXPIRY_SECONDS
+        for name in os.listdir(self.upload_dir):
+            if not name.endswith('.json'):
+                continue
+            upload_id = name[:-len('.json')]
+            touched = [os.path.getmtime(path) for path in self._paths(upload_id) if os.path.exists(path)]
+            if touched and max(touched) < cutoff:
+                self.discard(upload_id)
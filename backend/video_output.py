@@ -0,0 +1,105 @@
+"""
+Writers for the annotated output videos.
+
+With ffmpeg installed, frames are piped to an ffmpeg process that encodes H.264 into a
+fragmented MP4 (an empty moov up front, then a fragment per keyframe), which players
+can start on while it is still being written and which is encoded outside this
+process. Without ffmpeg, OpenCV's mp4v writer is used; its moov lands at the end of
+the file, so the file is only playable once complete.
+"""
+import os
+import shutil
+import subprocess
+
+import cv2
+
+VIDEO_WRITER = os.environ.get('ANALYSIS_VIDEO_WRITER', 'auto')  # "ffmpeg", "opencv", or "auto" (ffmpeg when installed)
+FFMPEG_PRESET = os.environ.get('ANALYSIS_FFMPEG_PRESET', 'veryfast')
+FRAGMENT_SECONDS = 1  # Keyframe (and so fragment) interval
+FRAGMENTED_MOVFLAGS = 'frag_keyframe+empty_moov+default_base_moof'
+
+
+def ffmpeg_path():
+    return shutil.which('ffmpeg')
+
+
+def progressive_output():
+    """Whether new output videos can be played while they are being written."""
+    return VIDEO_WRITER == 'ffmpeg' or (VIDEO_WRITER == 'auto' and ffmpeg_path() is not None)
+
+
+class FfmpegWriter:
+    """cv2.VideoWriter stand-in that pipes raw BGR frames to ffmpeg for a fragmented H.264 MP4."""
+
+    def __init__(self, path, fps, frame_size):
+        ffmpeg = ffmpeg_path()
+        if ffmpeg is None:
+            raise RuntimeError("ANALYSIS_VIDEO_WRITER=ffmpeg, but ffmpeg is not installed")
+        fps = fps or 30.0
+        self.path = path
+        self._process = subprocess.Popen([
+            ffmpeg, '-y', '-loglevel', 'error',
+            '-f', 'rawvideo', '-pix_fmt', 'bgr24', '-s', f"{frame_size[0]}x{frame_size[1]}", '-r', f"{fps}", '-i', '-',
+            '-c:v', 'libx264', '-preset', FFMPEG_PRESET, '-pix_fmt', 'yuv420p',
+            '-g', str(max(1, int(round(fps * FRAGMENT_SECONDS)))),
+            '-movflags', FRAGMENTED_MOVFLAGS, '-f', 'mp4', path,
+        ], stdin=subprocess.PIPE)
+
+    def isOpened(self):
+        return self._process.poll() is None
+
+    def write(self, frame):
+        self._process.stdin.write(frame.data if frame.flags.c_contiguous else frame.tobytes())
+
+    def release(self):
+        if self._process.stdin.closed:
+            return
+        try:
+            self._process.stdin.close()
+        except BrokenPipeError:
+            pass
+        if self._process.wait() != 0:
+            print(f"ffmpeg exited with status {self._process.returncode} while writing {self.path}")
+
+
+class OpenCVWriter:
+    """OpenCV's mp4v writer; on release the file is remuxed for fast start when ffmpeg is available."""
+
+    def __init__(self, path, fps, frame_size):
+        self.path = path
+        self._writer = cv2.VideoWriter(path, cv2.VideoWriter_fourcc(*'mp4v'), fps, frame_size)
+        self._released = False
+
+    def isOpened(self):
+        return self._writer.isOpened()
+
+    def write(self, frame):
+        self._writer.write(frame)
+
+    def release(self):
+        if self._released:
+            return
+        self._released = True
+        self._writer.release()
+        if ffmpeg_path() and os.path.exists(self.path):
+            faststart(self.path)
+
+
+def faststart(path):
+    """Move the moov atom of a finished MP4 to the front (a stream copy), so playback can start before the download ends."""
+    tmp_path = f"{path}.faststart.mp4"
+    try:
+        subprocess.run([ffmpeg_path(), '-y', '-loglevel', 'error', '-i', path, '-c', 'copy',
+                        '-movflags', '+faststart', tmp_path], check=True)
+        os.replace(tmp_path, path)
+    except (OSError, subprocess.CalledProcessError) as e:
+        print(f"Could not remux {path} for fast start: {e}")
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+
+def open_video_writer(path, fps, frame_size):
+    """Open the configured writer (see VIDEO_WRITER) for `path`."""
+    if progressive_output():
+        return FfmpegWriter(path, fps, frame_size)
+    return OpenCVWriter(path, fps, frame_size)